@@ -7,7 +7,7 @@ import argparse
 from argparse import RawTextHelpFormatter
 from kale.processors import NotebookProcessor
 from kale.compiler import Compiler
-from kale.common import kfputils
+from kale.common import kfputils, profutils
 
 ARGS_DESC = """
 KALE: Kubeflow Automated pipeLines Engine\n
@@ -48,6 +48,11 @@ def main():
     general_group.add_argument('--run_pipeline', action='store_const',
                                const=True)
     general_group.add_argument('--debug', action='store_true')
+    general_group.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report the time spent in every phase of the compilation.',
+    )
     general_group.add_argument(
         '--dev',
         action='store_true',
@@ -99,6 +104,9 @@ def main():
         if args.devpi_simple_url:
             os.environ["KALE_DEVPI_SIMPLE_URL"] = args.devpi_simple_url
 
+    if args.profile:
+        profutils.set_enabled(True)
+
     # get the notebook metadata args group
     mt_overrides_group = next(
         filter(lambda x: x.title == 'Notebook Metadata Overrides',
@@ -116,6 +124,8 @@ def main():
 
     pipeline_package_path = kfputils.compile_pipeline(dsl_script_path,
                                                       pipeline_name)
+    if profutils.is_enabled():
+        print(f"Compilation profile:\n{profutils.format_report()}")
     if args.upload_pipeline or args.run_pipeline:
         pipeline_id, version_id = kfputils.upload_pipeline(
             pipeline_package_path=pipeline_package_path,
@@ -3,15 +3,17 @@
 
 import re
 import ast
+import json
+import math
 import astor
 import types
 import inspect
 
 from collections import deque
 from functools import lru_cache
-from typing import Callable, Dict, List
+from typing import Callable, Dict, List, Iterable, Optional
 
-from kale.common import utils
+from kale.common import utils, scopeutils
 
 
 def walk(node, stop_at=tuple(), ignore=tuple()):
@@ -39,6 +41,13 @@ def walk(node, stop_at=tuple(), ignore=tuple()):
         yield node
 
 
+def _parse(code):
+    """Parse `code`, unless it is an already parsed tree."""
+    if isinstance(code, ast.AST):
+        return code
+    return ast.parse(code)
+
+
 def get_list_tuple_names(node):
     """Get all names of a tuple or list. Recursive method.
 
@@ -70,29 +79,29 @@ def get_marshal_candidates(code):
     | A | --> | B | --> | C |
     +---+     +---+     +---+
 
-    When C runs the PyFlakes report on its source code, `x` is detected as a
+    When C analyzes the scopes of its source code, `x` is detected as a
     missing variable. Then C runs `get_marshal_candidates` on its ancestors,
     in order, starting from B. All the marshal candidates found in B that match
     any of the missing C's names, as set as B's `outs`.
 
-    Ast nodes that become candidates:
-        - ast.Name
-        - ast.Import
-        - ast.ImportFrom
-        - ast.Tuple
+    The candidates are the names a step binds or uses in its module scope,
+    including the free names of its comprehensions and lambdas. Used names
+    are candidates too, as the step might have modified the objects they
+    refer to.
 
-    Ast nodes that create local contexts must be excluded from the search, as
-    they can crete local variables that alias global ones. These nodes include
-    ast.FunctionDef, ast.ClassDef, context manager names and list and dict
-    comprehensions variables.
+    Names that are local to other scopes are excluded, as they can alias
+    global ones: the names defined in function and class bodies, the
+    variables of comprehensions and lambdas, and the aliases of exception
+    handlers (which are deleted at the end of the handler). For example, a
+    function may define a variable x that is aliasing a global variable x,
+    and we don't want to marshal it in that step, but from the step that
+    defines the global x.
 
     Args:
         code (str): multiple string representing Python code
 
     Returns (list(str)): a list of names
     """
-    names = set()
-
     # Comment IPython magic commands.
     # Note #1: This is needed to correctly parse the code using AST, as it does
     #  not understand IPython magic commands.
@@ -105,35 +114,219 @@ def get_marshal_candidates(code):
     # Note #3: Magic commands are preserved in the resulting Python executable,
     #  they are commented just here in order to make AST run.
     commented_code = utils.comment_magic_commands(code)
-    # need to exclude all the nodes that mights *define* variables in a local
-    # scope. For example, a function may define a variable x that is aliasing
-    # a global variable x, and we don't want to marshal it in that step, but
-    # from the step that defines the global x.
-    # TODO: Search for all possible python nodes that define local vars.
-    #  List comprehensions ([i for i in list])
-    #  Dict comprehensions
-    #  Exception handling?
-    #  Decorators?
-    #  Context manager (just the alias)
-    contexts = (ast.FunctionDef, ast.ClassDef, )
-    tree = ast.parse(commented_code)
-    for block in tree.body:
-        for node in walk(block, stop_at=contexts):
-            if isinstance(node, contexts):
-                names.add(node.name)
-            if isinstance(node, (ast.Name,)):
-                names.add(node.id)
-            if isinstance(node, (ast.Import, ast.ImportFrom,)):
-                for _n in node.names:
-                    if _n.asname is None:
-                        names.add(_n.name)
-                    else:
-                        names.add(_n.asname)
-            if isinstance(node, (ast.Tuple, ast.List)):
-                names.update(get_list_tuple_names(node))
+    analysis = scopeutils.analyze_scopes(commented_code)
+    names = analysis.defined | analysis.referenced
     return names
 
 
+# Builtins that can access variables by name, hiding their usages
+_DYNAMIC_SCOPE_FNS = ("eval", "exec", "globals", "locals", "vars")
+
+
+def get_column_projections(code: str,
+                           names: Iterable[str]) -> Dict[str, List[str]]:
+    """Find the columns of data frames a piece of code needs.
+
+    A variable can be loaded partially when the code accesses it exclusively
+    through literal column subscripts: `df["a"]` or `df[["a", "b"]]`. Any
+    other usage (attribute access, function arguments, assignments to its
+    columns, ...) might need the whole object, so the variable is left out.
+    Code that can access variables by name (`eval`, `globals`, the
+    `__main__` module, ...) needs all of them in full.
+
+    Note that functions defined elsewhere can use the variables too, so the
+    free variables of the functions the code can call must be left out of
+    `names` (see `kale.compiler.Compiler._get_input_columns`).
+
+    E.g.:
+
+    ```
+    x = df["a"] + df[["b", "c"]].sum(axis=1)
+    print(df2.shape, df2["a"])
+    ```
+
+    Will produce, for names `df` and `df2`:
+
+    ```
+    "df" -> ["a", "b", "c"]
+    ```
+
+    Args:
+        code: Python source code
+        names: The variables to look for
+
+    Returns (dict): A dict mapping variables to the sorted column names
+    """
+    names = set(names)
+    tree = ast.parse(utils.comment_magic_commands(code))
+    # magic commands are commented out, so their usages are invisible to ast
+    magic_lines = re.findall(r"^\s*%.*$", code, re.MULTILINE)
+    columns = {name: set() for name in names
+               if not any(re.search(r"\b%s\b" % re.escape(name), line)
+                          for line in magic_lines)}
+    parents = {child: node for node in ast.walk(tree)
+               for child in ast.iter_child_nodes(node)}
+
+    def _is_str(node):
+        return isinstance(node, ast.Constant) and isinstance(node.value, str)
+
+    def _literal_columns(node):
+        if _is_str(node):
+            return [node.value]
+        if (isinstance(node, ast.List) and node.elts
+                and all(_is_str(e) for e in node.elts)):
+            return [e.value for e in node.elts]
+        return None
+
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id in _DYNAMIC_SCOPE_FNS):
+            return {}
+        if _accesses_main_module(node):
+            return {}
+        if not isinstance(node, ast.Name) or node.id not in columns:
+            continue
+        parent = parents.get(node)
+        if isinstance(node.ctx, ast.Store):
+            if isinstance(parent, ast.AugAssign):
+                # `df += 1` reads the whole object
+                del columns[node.id]
+            continue
+        if isinstance(node.ctx, ast.Del):
+            continue
+        subscript = (isinstance(parent, ast.Subscript)
+                     and parent.value is node
+                     and isinstance(parent.ctx, ast.Load))
+        cols = _literal_columns(parent.slice) if subscript else None
+        if cols is None:
+            del columns[node.id]
+        else:
+            columns[node.id].update(cols)
+    return {name: sorted(cols) for name, cols in columns.items() if cols}
+
+
+def _accesses_main_module(node: ast.AST) -> bool:
+    """Whether a node accesses the `__main__` module, i.e. the globals."""
+    if isinstance(node, ast.Import):
+        return any(alias.name == "__main__" for alias in node.names)
+    if isinstance(node, ast.ImportFrom):
+        return node.module == "__main__"
+    # e.g., `sys.modules["__main__"]`
+    return isinstance(node, ast.Attribute) and node.attr == "modules"
+
+
+# The types of the values `get_value_types` looks for
+_VALUE_TYPES = (bool, int, float, str)
+
+
+def get_value_types(code: str, names: Iterable[str],
+                    max_size: int = 1024) -> Dict[str, Optional[str]]:
+    """Find the variables a piece of code binds only to small literals.
+
+    A variable holds a small value when every binding of the variable is a
+    module level assignment of a literal `bool`, `int`, (finite) `float` or
+    `str`,
+    all of the same type, whose JSON representation is at most `max_size`
+    bytes long. Such values are immutable, so usages of the variable cannot
+    change them.
+
+    E.g.:
+
+    ```
+    lr = 0.1
+    if fast:
+        lr = 0.5
+    name = "model"
+    name = name.upper()
+    ```
+
+    Will produce, for names `lr` and `name`:
+
+    ```
+    "lr" -> "float"
+    "name" -> None
+    ```
+
+    Args:
+        code: Python source code
+        names: The variables to look for
+        max_size: The maximum size of the values, in bytes
+
+    Returns (dict): A dict mapping every bound variable to the type of its
+        values, or to None if it is not bound only to small literals.
+        Variables that the code does not bind are left out.
+    """
+    names = set(names)
+    tree = ast.parse(utils.comment_magic_commands(code))
+    # magic commands are commented out, so their bindings are invisible to
+    # ast
+    magic_lines = re.findall(r"^\s*%.*$", code, re.MULTILINE)
+    types = {name: None for name in names
+             if any(re.search(r"\b%s\b" % re.escape(name), line)
+                    for line in magic_lines)}
+    scopes = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef,
+              ast.Lambda)
+    module_nodes = set(walk(tree, stop_at=scopes))
+
+    def _value_type(node):
+        if not (isinstance(node, (ast.Assign, ast.AnnAssign))
+                and node in module_nodes and node.value is not None):
+            return None
+        try:
+            value = ast.literal_eval(node.value)
+        except ValueError:
+            return None
+        if (type(value) not in _VALUE_TYPES
+                or (isinstance(value, float) and not math.isfinite(value))
+                or len(json.dumps(value)) > max_size):
+            return None
+        return type(value).__name__
+
+    # the names bound by assignments, already accounted for
+    assigned = set()
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id in _DYNAMIC_SCOPE_FNS):
+            return {name: None for name in names}
+        if isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = (node.targets if isinstance(node, ast.Assign)
+                       else [node.target])
+            value_type = (_value_type(node) if len(targets) == 1
+                          and isinstance(targets[0], ast.Name) else None)
+            for target in targets:
+                for n in ast.walk(target):
+                    if isinstance(n, ast.Name) and n.id in names:
+                        assigned.add(n)
+                        _type = types.setdefault(n.id, value_type)
+                        if _type != value_type:
+                            types[n.id] = None
+            continue
+        if isinstance(node, ast.Name):
+            if node in assigned:
+                continue
+            bound = isinstance(node.ctx, (ast.Store, ast.Del))
+            name = node.id
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef,
+                               ast.ClassDef)):
+            bound, name = True, node.name
+        elif isinstance(node, ast.ExceptHandler):
+            bound, name = node.name is not None, node.name
+        elif isinstance(node, ast.alias):
+            bound = True
+            name = node.asname or node.name.split(".")[0]
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            for name in node.names:
+                if name in names:
+                    types[name] = None
+            continue
+        else:
+            continue
+        if bound and name in names:
+            # any other binding (augmented assignments, loops, imports, ...)
+            types[name] = None
+    return types
+
+
 def parse_functions(code):
     """Parse all the global functions present in the input code.
 
@@ -143,12 +336,13 @@ def parse_functions(code):
     parsing so that class functions are ignored.
 
     Args:
-        code (str): Multiline string representing Python code
+        code (str): Multiline string representing Python code, or its
+            parsed tree
 
     Returns (dict): A dictionary [fn_name] -> function_source
     """
     fns = dict()
-    tree = ast.parse(code)
+    tree = _parse(code)
     for block in tree.body:
         for node in walk(block,
                          stop_at=(ast.FunctionDef,),
@@ -179,12 +373,13 @@ def get_function_calls(code):
     This is guaranteed to be a 'simple' function call (first example).
 
     Args:
-        code (str): Multiline string representing Python code
+        code (str): Multiline string representing Python code, or its
+            parsed tree
 
     Returns (list(str)): List of function names
     """
     fns = set()
-    tree = ast.parse(code)
+    tree = _parse(code)
     for block in tree.body:
         for node in walk(block):
             # a function call. We check the attribute func to be ast.Name
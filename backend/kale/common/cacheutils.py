@@ -0,0 +1,127 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2019–2025 The Kale Contributors.
+
+import os
+import json
+import hashlib
+import logging
+
+from types import ModuleType
+from typing import Any, Optional
+from functools import lru_cache
+
+from kale import __version__ as KALE_VERSION
+from kale.common import utils
+
+log = logging.getLogger(__name__)
+
+# Bump to invalidate the entries written by previous versions of the cache
+CACHE_VERSION = 1
+# Number of entries kept in every namespace by `prune`
+MAX_ENTRIES = 2048
+
+
+def get_cache_dir() -> Optional[str]:
+    """Get the folder of the compilation cache.
+
+    Compiling a notebook analyzes the source of every step and formats the
+    code generated for every step. Users usually edit a few cells between
+    two compilations, so most of these results can be reused. They are
+    stored in this folder, keyed by a hash of everything they depend on
+    (e.g. the step's source code).
+
+    The cache is stored in `.kale/cache` by default, or in the folder set by
+    the `KALE_COMPILE_CACHE_DIR` environment variable. Set
+    `KALE_COMPILE_CACHE=false` to disable it.
+
+    Returns: The path to the folder, or None if the cache is disabled
+    """
+    if not utils.env_flag("KALE_COMPILE_CACHE", default=True):
+        return None
+    return (os.getenv("KALE_COMPILE_CACHE_DIR")
+            or os.path.join(os.getcwd(), ".kale", "cache"))
+
+
+@lru_cache(maxsize=None)
+def fingerprint(*modules: ModuleType) -> str:
+    """Compute a digest of the source code of some modules.
+
+    Results computed by these modules can be keyed by their fingerprint, so
+    that changing the modules invalidates them.
+    """
+    digest = hashlib.sha256()
+    for module in modules:
+        with open(module.__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def compute_key(*parts: Any) -> str:
+    """Compute the cache key of a result from everything it depends on.
+
+    Args:
+        parts: JSON serializable values
+    """
+    payload = json.dumps([CACHE_VERSION, KALE_VERSION, *parts],
+                         sort_keys=True, default=repr)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _get_entry_path(namespace: str, key: str) -> Optional[str]:
+    cache_dir = get_cache_dir()
+    if not cache_dir:
+        return None
+    return os.path.join(cache_dir, namespace, key + ".json")
+
+
+def load(namespace: str, key: str) -> Optional[Any]:
+    """Get a cached result, or None if it is not cached."""
+    path = _get_entry_path(namespace, key)
+    if not path:
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log.debug("Could not read cache entry %s: %s", path, e)
+        return None
+
+
+def store(namespace: str, key: str, value: Any):
+    """Cache a JSON serializable result.
+
+    The entry is written atomically, so concurrent compilations either see
+    a complete entry or none. Failing to write the cache is not an error.
+    """
+    path = _get_entry_path(namespace, key)
+    if not path:
+        return
+    tmp_path = "%s.tmp-%s" % (path, utils.random_string())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        log.debug("Could not write cache entry %s: %s", path, e)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def prune(namespace: str, max_entries: int = MAX_ENTRIES):
+    """Remove the least recently written entries of a namespace."""
+    cache_dir = get_cache_dir()
+    if not cache_dir:
+        return
+    try:
+        with os.scandir(os.path.join(cache_dir, namespace)) as it:
+            entries = [e for e in it if e.name.endswith(".json")]
+        if len(entries) <= max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - max_entries]:
+            os.remove(entry.path)
+    except OSError as e:
+        log.debug("Could not prune cache namespace %s: %s", namespace, e)
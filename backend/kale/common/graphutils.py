@@ -3,6 +3,9 @@
 
 import networkx as nx
 
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, List
+
 
 def get_ordered_ancestors(g: nx.DiGraph, node):
     """Get a list of ancestors ordered by DAG layers.
@@ -39,7 +42,9 @@ def get_ordered_ancestors(g: nx.DiGraph, node):
     layer, ['B'] the second and ['A'] the third.
 
     This all comes down to performing a reversed breadth-first search, avoiding
-    duplicates in the resulting list of ancestors.
+    duplicates in the resulting list of ancestors. The search runs in linear
+    time in the number of edges between the ancestors. Use `AncestorIndex` to
+    get the ancestors of many nodes of the same graph.
 
     Args:
          g (nx.DiGraph): A DAG representing a pipeline
@@ -47,22 +52,61 @@ def get_ordered_ancestors(g: nx.DiGraph, node):
 
     Returns (list): A list of ancestors, ordered by DAG layers.
     """
+    # sort ancestors for a deterministic result
+    return _layered_bfs(node, lambda n: sorted(g.predecessors(n)))
+
+
+def _layered_bfs(node: Hashable,
+                 get_preds: Callable[[Hashable], List[Any]]) -> List[Any]:
     # list of ancestors, unique and ordered by layers
     ancs = list()
-    # used as queue
-    q = [node]
-
+    seen = set()
+    q = deque([node])
     while q:
-        cur = q.pop(0)
-        # sort ancestors for a deterministic result
-        preds = sorted(list(g.predecessors(cur)))
-        for p in preds:
-            if p not in ancs:
+        cur = q.popleft()
+        for p in get_preds(cur):
+            if p not in seen:
+                seen.add(p)
                 ancs.append(p)
                 q.append(p)
     return ancs
 
 
+class AncestorIndex(object):
+    """The ordered ancestors of the nodes of a DAG, computed on demand.
+
+    Traversing a pipeline usually requires the ancestors of every step, some
+    of them many times. The index computes the sorted predecessors of every
+    node and the ancestors of every node at most once.
+
+    The index does not track changes to the graph: create a new one after
+    adding or removing nodes and edges.
+    """
+
+    def __init__(self, g: nx.DiGraph):
+        """Create an index over the DAG `g`."""
+        self.g = g
+        self._preds: Dict[Hashable, List[Any]] = dict()
+        self._ancestors: Dict[Hashable, List[Any]] = dict()
+
+    def _get_preds(self, node: Hashable) -> List[Any]:
+        preds = self._preds.get(node)
+        if preds is None:
+            preds = self._preds[node] = sorted(self.g.predecessors(node))
+        return preds
+
+    def get_ordered_ancestors(self, node: Hashable) -> List[Any]:
+        """Get a list of ancestors ordered by DAG layers.
+
+        See `graphutils.get_ordered_ancestors`.
+        """
+        ancs = self._ancestors.get(node)
+        if ancs is None:
+            ancs = self._ancestors[node] = _layered_bfs(node,
+                                                        self._get_preds)
+        return list(ancs)
+
+
 def get_leaf_nodes(g: nx.DiGraph):
     """Get the list of leaf nodes of a DAG.
 
@@ -75,3 +119,41 @@ def get_leaf_nodes(g: nx.DiGraph):
     Returns (list): A list of leaf nodes.
     """
     return [x for x in g.nodes() if g.out_degree(x) == 0]
+
+
+def get_linear_chains(g: nx.DiGraph,
+                      can_join: Callable[[Hashable, Hashable], bool] = None
+                      ) -> List[List[Hashable]]:
+    """Get the maximal linear chains of a DAG.
+
+    A chain is a path `n1 -> n2 -> ... -> nk` where every node but the last
+    has just one child and every node but the first has just one parent.
+    Such nodes can be merged without changing the dependencies of the rest
+    of the graph.
+
+    Args:
+        g (nx.DiGraph): A DAG
+        can_join: Optional predicate that tells whether an edge `(u, v)` can
+            be part of a chain
+
+    Returns (list): The chains of at least two nodes, in topological order
+    """
+    def _joins(u, v):
+        return (g.out_degree(u) == 1 and g.in_degree(v) == 1
+                and (can_join is None or can_join(u, v)))
+
+    chains = list()
+    for node in nx.topological_sort(g):
+        preds = list(g.predecessors(node))
+        # the node continues the chain of its parent
+        if len(preds) == 1 and _joins(preds[0], node):
+            continue
+        chain = [node]
+        while g.out_degree(chain[-1]) == 1:
+            child = next(iter(g.successors(chain[-1])))
+            if not _joins(chain[-1], child):
+                break
+            chain.append(child)
+        if len(chain) > 1:
+            chains.append(chain)
+    return chains
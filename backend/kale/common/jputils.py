@@ -1,22 +1,34 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright (c) 2019–2025 The Kale Contributors.
 
+import io
 import os
 import re
 import sys
-import time
 import json
-import signal
+import queue
+import atexit
 import logging
+import contextlib
+import importlib.util
 import nbformat
 import requests
 import threading
 import ipykernel
 
 from queue import Empty
+from typing import Dict, List, Optional, Tuple
+from traitlets import Type
+from traitlets.config import Config
+from jupyter_core.utils import run_sync
+from IPython.core.displayhook import DisplayHook
+from IPython.core.displaypub import DisplayPublisher
+from IPython.core.interactiveshell import InteractiveShell
 from jupyter_server import serverapp
+from jupyter_client.manager import KernelManager
+from jupyter_client.client import KernelClient
 from jupyter_client.kernelspec import get_kernel_spec
-from kale.common.utils import remove_ansi_color_sequences
+from kale.common.utils import env_flag, remove_ansi_color_sequences
 from nbconvert.preprocessors.execute import ExecutePreprocessor
 
 from packaging import version as pkg_version
@@ -91,9 +103,15 @@ JAVASCRIPT_HTML_TEMPLATE = '''
 </script>
 '''
 
+# Seconds to wait for a new kernel to reply to its first request
+KERNEL_STARTUP_TIMEOUT = 60
+# Outcomes of the messages of a kernel, see `_handle_kernel_message`
+_MESSAGE_ERROR = "error"
+_MESSAGE_EXIT = "exit"
+
 
 class KaleKernelException(Exception):
-    """Raised when signal_handler receives a signal from capture_streams."""
+    """Raised when the user code running in a kernel fails."""
     pass
 
 
@@ -175,71 +193,264 @@ def process_outputs(cells):
     return html_artifact
 
 
-async def capture_streams(kc, exit_on_error=False):
-    """Capture stream and error outputs from a kernel connection.
+def _handle_kernel_message(msg) -> Optional[str]:
+    """Write the stream and error outputs of a kernel message.
+
+    Returns: `_MESSAGE_ERROR` if the kernel reported an error,
+        `_MESSAGE_EXIT` if the user code asked to exit (see
+        `kale.common.utils.graceful_exit`), None otherwise
+    """
+    msg_type = msg['header']['msg_type']
+    content = msg['content']
+    if msg_type == 'stream':  # stdout or stderr
+        if content['name'] == 'stdout':
+            sys.stdout.write(content['text'])
+        elif content['name'] == 'stderr':
+            sys.stderr.write(content['text'])
+        else:
+            raise NotImplementedError("stream message content name not"
+                                      " recognized: {}"
+                                      .format(content['name']))
+    if msg_type == 'error':  # error and exceptions
+        # traceback is a list of strings (jupyter protocol spec)
+        if content['ename'] == KaleGracefulExit.__name__:
+            log.error("Received a %s exception. Exiting..." %
+                      KaleGracefulExit.__name__)
+            return _MESSAGE_EXIT
+        traceback = map(remove_ansi_color_sequences, content['traceback'])
+        sys.stderr.write('\n'.join(traceback) + '\n')
+        return _MESSAGE_ERROR
+    return None
 
-    Get messages from the iopub channel of the `kc` kernel connection
-    and write to stdout or stderr any message of type `stream`.
-    Capture and exit when receiving an `error` message or when the message
-    queue is done.
 
-    Args:
-        kc: kernel connection
-        exit_on_error (bool): True to call sys.exit() when the kernel sends
-            an error message.
+Kernel = Tuple[KernelManager, KernelClient]
+
+
+class KernelPool(object):
+    """A pool of started kernels, ready to run code.
+
+    Starting a kernel takes about a second, which dominates the run time of
+    short steps. The pool keeps `size` kernels warm, starting them in the
+    background, so that `acquire` returns immediately.
+
+    By default every kernel runs the code of a single step and is shut down
+    when released, so steps do not share any state. When `reuse` is True,
+    released kernels go back to the pool after resetting their namespace
+    (`%reset -f`). This saves starting new kernels, but modules imported
+    and state kept outside the user namespace (e.g. the working directory)
+    leak from one step to the next.
     """
-    while True:
+
+    def __init__(self, kernel_name: str = 'python3', size: int = 0,
+                 reuse: bool = False, config: Config = None,
+                 extra_arguments: List[str] = None):
+        self.kernel_name = kernel_name
+        self.size = size
+        self.reuse = reuse
+        # the configuration of the kernel managers and the extra arguments
+        # of the kernels, as set for `ExecutePreprocessor`
+        self.config = config
+        self.extra_arguments = extra_arguments or list()
+        self._idle: "queue.Queue[Kernel]" = queue.Queue()
+        self._starting = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _start_kernel(self) -> Kernel:
+        km = KernelManager(kernel_name=self.kernel_name, config=self.config)
+        km.start_kernel(extra_arguments=self.extra_arguments)
+        kc = km.client()
+        kc.start_channels()
         try:
-            msg = await kc.iopub_channel.get_msg()
+            kc.wait_for_ready(timeout=KERNEL_STARTUP_TIMEOUT)
+        except RuntimeError:
+            kc.stop_channels()
+            km.shutdown_kernel(now=True)
+            raise
+        kc.allow_stdin = False
+        return km, kc
+
+    def _start_in_background(self):
+        def _target():
+            try:
+                kernel = self._start_kernel()
+            except Exception as e:
+                log.warning("Could not start a %s kernel: %s",
+                            self.kernel_name, e)
+                return
+            finally:
+                with self._lock:
+                    self._starting -= 1
+            if self._closed:
+                self._shutdown_kernel(kernel)
+            else:
+                self._idle.put(kernel)
+
+        with self._lock:
+            self._starting += 1
+        threading.Thread(target=_target, daemon=True).start()
+
+    def _replenish(self):
+        with self._lock:
+            missing = self.size - self._idle.qsize() - self._starting
+        for _ in range(max(missing, 0)):
+            self._start_in_background()
+
+    def acquire(self) -> Kernel:
+        """Get a kernel, ready to run code.
+
+        Returns an idle kernel of the pool, waits for a kernel that is
+        already starting or, as a last resort, starts a new one.
+        """
+        try:
+            kernel = self._idle.get_nowait()
         except Empty:
-            print("The Kale kernel stream watcher thread raised an Empty"
-                  " exception, exiting...")
+            kernel = None
+            if self._starting:
+                try:
+                    kernel = self._idle.get(timeout=KERNEL_STARTUP_TIMEOUT)
+                except Empty:
+                    pass
+        if kernel is None:
+            kernel = self._start_kernel()
+        self._replenish()
+        return kernel
+
+    def release(self, kernel: Kernel, healthy: bool = True):
+        """Give back a kernel to the pool.
+
+        Args:
+            kernel: A kernel returned by `acquire`
+            healthy: False if the code run by the kernel failed. Such kernels
+                are never reused.
+        """
+        if (self.reuse and healthy and not self._closed
+                and self._reset_kernel(kernel)):
+            self._idle.put(kernel)
             return
+        threading.Thread(target=self._shutdown_kernel, args=(kernel,),
+                         daemon=True).start()
+
+    def shutdown(self):
+        """Shut down the idle kernels and stop starting new ones."""
+        self._closed = True
+        while True:
+            try:
+                self._shutdown_kernel(self._idle.get_nowait())
+            except Empty:
+                return
+
+    @staticmethod
+    def _reset_kernel(kernel: Kernel) -> bool:
+        km, kc = kernel
+        if not km.is_alive():
+            return False
+        try:
+            reply = kc.execute_interactive(
+                "%reset -f", silent=True, store_history=False,
+                timeout=KERNEL_STARTUP_TIMEOUT, output_hook=lambda _: None)
+        except (TimeoutError, RuntimeError) as e:
+            log.warning("Could not reset the kernel: %s", e)
+            return False
+        return reply['content']['status'] == 'ok'
+
+    @staticmethod
+    def _shutdown_kernel(kernel: Kernel):
+        km, kc = kernel
+        try:
+            kc.stop_channels()
+            km.shutdown_kernel(now=True)
+        except Exception as e:
+            log.warning("Could not shut down the kernel: %s", e)
+
+
+_kernel_pools: Dict[str, KernelPool] = dict()
+_kernel_pools_lock = threading.Lock()
 
-        msg_type = msg['header']['msg_type']
-        content = msg['content']
-        if msg_type == 'stream':  # stdout or stderr
-            if content['name'] == 'stdout':
-                sys.stdout.write(content['text'])
-            elif content['name'] == 'stderr':
-                sys.stderr.write(content['text'])
-            else:
-                raise NotImplementedError("stream message content name not"
-                                          " recognized: {}"
-                                          .format(content['name']))
-        if msg_type == 'error':  # error and exceptions
-            # traceback is a list of strings (jupyter protocol spec)
-            if content['ename'] == KaleGracefulExit.__name__:
-                log.error("Received a %s exception. Exiting..." %
-                          KaleGracefulExit.__name__)
-                os.kill(os.getpid(), signal.SIGUSR1)
-            else:
-                traceback = map(remove_ansi_color_sequences,
-                                content['traceback'])
-                sys.stderr.write('\n'.join(traceback) + '\n')
-                if exit_on_error:
-                    # when receiving an error from the kernel, we don't want
-                    # to just print the exception to stderr, otherwise the
-                    # pipeline step would complete successfully.
-                    # kill sends the signal to the specific pid (main thread)
-                    os.kill(os.getpid(), signal.SIGUSR1)
-
-
-def run_code(source: tuple, kernel_name='python3'):
-    """Run code blocks inside a jupyter kernel.
+
+def get_kernel_pool(kernel_name: str = 'python3', config: Config = None,
+                    extra_arguments: List[str] = None) -> KernelPool:
+    """Get the kernel pool used by `run_code` for a kernel spec.
+
+    The size of the pool is set with the `KALE_KERNEL_POOL_SIZE` environment
+    variable (0 by default: no kernels are kept warm) and reusing kernels
+    is enabled with the `KALE_KERNEL_REUSE` environment variable. See
+    `KernelPool`.
 
     Args:
-        source (tuple): source code blocks
-        kernel_name: name of the kernel (form the kernel spec) to be created
+        kernel_name: The name of the kernel spec
+        config: The configuration of the kernel managers, used when the
+            pool is created
+        extra_arguments: The extra arguments of the kernels, used when the
+            pool is created
     """
-    log.info("%s Running user code... %s", "-" * 10, "-" * 10)
-    log.newline(lines=3)
+    with _kernel_pools_lock:
+        if kernel_name not in _kernel_pools:
+            _kernel_pools[kernel_name] = KernelPool(
+                kernel_name,
+                size=int(os.getenv("KALE_KERNEL_POOL_SIZE") or 0),
+                reuse=env_flag("KALE_KERNEL_REUSE"),
+                config=config, extra_arguments=extra_arguments)
+        return _kernel_pools[kernel_name]
+
+
+@atexit.register
+def _shutdown_kernel_pools():
+    with _kernel_pools_lock:
+        for pool in _kernel_pools.values():
+            pool.shutdown()
+
+
+class _KaleExecutePreprocessor(ExecutePreprocessor):
+    """Run the cells in a started kernel, streaming their outputs.
+
+    The cells' outputs are written to stdout and stderr as soon as the
+    kernel sends them, and the first error stops the execution. The
+    preprocessor waits for the kernel to go idle after every cell, so all
+    the outputs are written when `preprocess` returns.
+    """
+
+    kernel_client: Optional[KernelClient] = None
+
+    async def async_start_new_kernel_client(self):
+        """Use the client of the pooled kernel, which is already ready."""
+        if self.kernel_client is None:
+            return await super().async_start_new_kernel_client()
+        self.kc = self.kernel_client
+        return self.kc
+
+    start_new_kernel_client = run_sync(async_start_new_kernel_client)
+
+    def output(self, outs, msg, display_id, cell_index):
+        """Write the stream and error outputs and record all of them."""
+        result = super().output(outs, msg, display_id, cell_index)
+        if _handle_kernel_message(msg) is not None:
+            raise KaleKernelException()
+        return result
+
+
+def _check_ipython_version():
     import IPython
     if pkg_version.parse(IPython.__version__) < pkg_version.parse('7.6.0'):
         raise RuntimeError("IPython version {} not supported."
                            " Kale requires at least version 7.6.0."
                            .format(IPython.__version__))
 
+
+def run_code(source: tuple, kernel_name='python3',
+             pool: KernelPool = None):
+    """Run code blocks inside a jupyter kernel.
+
+    Args:
+        source (tuple): source code blocks
+        kernel_name: name of the kernel (form the kernel spec) to be created
+        pool: the pool to get the kernel from. Defaults to the pool returned
+            by `get_kernel_pool`.
+    """
+    log.info("%s Running user code... %s", "-" * 10, "-" * 10)
+    log.newline(lines=3)
+    _check_ipython_version()
+
     # new notebook
     spec = get_kernel_spec(kernel_name)
     notebook = nbformat.v4.new_notebook(metadata={
@@ -256,47 +467,183 @@ def run_code(source: tuple, kernel_name='python3'):
     resources = {}
     # cwd: If supplied, the kernel will run in this directory
     # resources['metadata'] = {'path': cwd}
-    ep = ExecutePreprocessor(**jupyter_execute_kwargs)
-    km = ep.kernel_manager_class(kernel_name=kernel_name, config=ep.config)
-    # start_kernel supports several additional arguments via **kw
-    km.start_kernel(extra_arguments=ep.extra_arguments)
-    kc = km.client()
-    kc.start_channels()
+    ep = _KaleExecutePreprocessor(**jupyter_execute_kwargs)
+    pool = pool or get_kernel_pool(kernel_name, config=ep.config,
+                                   extra_arguments=ep.extra_arguments)
+    kernel = pool.acquire()
+    km, ep.kernel_client = kernel
+    healthy = False
     try:
-        kc.wait_for_ready(timeout=60)
-    except RuntimeError:
-        kc.stop_channels()
-        raise
-    kc.allow_stdin = False
-
-    def signal_handler(_signal, _frame):
-        raise KaleKernelException()
-
-    # this signal is used by the thread in case an error message is received
-    # by the kernel. Running sys.exit() inside the thread would terminate
-    # just the thread itself, not the main process. Calling os._exit() can be
-    # dangerous as the process is killed instantly (files and connections are
-    # not closed, for example). With a signal we can capture the ExitCommand
-    # exception from the main process and exit gracefully.
-    signal.signal(signal.SIGUSR1, signal_handler)
-    # start separate thread in to capture and print stdout, stderr, errors.
-    # daemon mode will make the watcher thread die when the main one returns.
-    x = threading.Thread(target=capture_streams, args=(kc, True,), daemon=True)
-    x.start()
-
-    try:
-        # start preprocessor: run each code cell and capture the output
+        # start preprocessor: run each code cell and capture the output. The
+        # outputs are streamed as they arrive and an error in the user code
+        # raises KaleKernelException.
         ep.preprocess(notebook, resources, km=km)
+        healthy = True
     except KaleKernelException:
         sys.stdout.flush()
         log.newline(lines=3)
         log.error("%s Failed to run user code %s", "-" * 10, "-" * 10)
         # exit gracefully with error
         sys.exit(-1)
-    # Give some time to the stream watcher thread to receive all messages from
-    # the kernel before shutting down.
-    time.sleep(1)
-    km.shutdown_kernel()
+    finally:
+        pool.release(kernel, healthy=healthy)
+
+    result = process_outputs(notebook.cells)
+    sys.stdout.flush()
+    log.newline(lines=3)
+    log.info("%s Successfully ran user code %s", "-" * 10, "-" * 10)
+    return result
+
+
+class _InProcessDisplayPublisher(DisplayPublisher):
+    """Record the rich outputs of a cell, like a kernel would send them."""
+
+    def publish(self, data, metadata=None, source=None, *, transient=None,
+                update=False, **kwargs):
+        """Record a `display_data` output."""
+        self.shell.kale_outputs.append(nbformat.v4.new_output(
+            "display_data", data=data, metadata=metadata or {}))
+
+    def clear_output(self, wait=False):
+        """Discard the outputs of the cell recorded so far."""
+        del self.shell.kale_outputs[:]
+
+
+class _InProcessDisplayHook(DisplayHook):
+    """Record the result of a cell, like a kernel would send it."""
+
+    def write_output_prompt(self):
+        """Do not write any prompt, results are not printed."""
+
+    def write_format_data(self, format_dict, md_dict=None):
+        """Record an `execute_result` output."""
+        self.shell.kale_outputs.append(nbformat.v4.new_output(
+            "execute_result", data=format_dict, metadata=md_dict or {},
+            execution_count=self.prompt_count))
+
+
+class _InProcessShell(InteractiveShell):
+    """An IPython shell that records the outputs of the cells it runs.
+
+    The outputs are recorded in `kale_outputs` as notebook outputs, so they
+    can be rendered by `process_outputs`.
+    """
+
+    display_pub_class = Type(_InProcessDisplayPublisher)
+    displayhook_class = Type(_InProcessDisplayHook)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.kale_outputs: List = list()
+        # the error of the last cell, as a kernel would send it
+        self.kale_error_msg = None
+
+    def _showtraceback(self, etype, evalue, stb):
+        content = {"ename": etype.__name__, "evalue": str(evalue),
+                   "traceback": stb}
+        self.kale_outputs.append(
+            nbformat.v4.new_output("error", **content))
+        self.kale_error_msg = {"header": {"msg_type": "error"},
+                               "content": content}
+
+
+class _InProcessStream(io.TextIOBase):
+    """Write to a stream and record the text as a `stream` output."""
+
+    def __init__(self, shell: _InProcessShell, name: str, stream):
+        self._shell = shell
+        self._name = name
+        self._stream = stream
+
+    def write(self, text):
+        """Write to the stream and record the text."""
+        if not text:
+            return 0
+        self._stream.write(text)
+        outputs = self._shell.kale_outputs
+        if (outputs and outputs[-1].output_type == "stream"
+                and outputs[-1].name == self._name):
+            outputs[-1].text += text
+        else:
+            outputs.append(nbformat.v4.new_output(
+                "stream", name=self._name, text=text))
+        return len(text)
+
+    def flush(self):
+        """Flush the stream."""
+        self._stream.flush()
+
+    def writable(self):
+        """Whether the stream is writable."""
+        return True
+
+
+@contextlib.contextmanager
+def _in_process_shell():
+    """Create a shell with a fresh namespace for a single run."""
+    config = Config()
+    config.HistoryManager.enabled = False
+    # The shell is the global IPython instance, so that `get_ipython()`
+    # works in the user code, unless we are already inside IPython
+    singleton = not InteractiveShell.initialized()
+    shell = (_InProcessShell.instance(config=config) if singleton
+             else _InProcessShell(config=config))
+    try:
+        yield shell
+    finally:
+        shell.atexit_operations()
+        atexit.unregister(shell.atexit_operations)
+        if singleton:
+            _InProcessShell.clear_instance()
+
+
+def run_code_in_process(source: tuple):
+    """Run code blocks in this process, without a jupyter kernel.
+
+    The code blocks run in the fresh namespace of an IPython shell, which
+    handles magics as a kernel would. Starting a kernel process and sending
+    every cell and output through ZMQ costs seconds, which dominates the
+    run time of short steps, while the shell is created in milliseconds.
+
+    Unlike with `run_code`, the user code shares the process with the step,
+    e.g. it can not be interrupted or restarted, and changes to `sys` or to
+    the working directory outlive it.
+
+    Args:
+        source (tuple): source code blocks
+
+    Returns: the HTML report of the blocks' outputs, see `process_outputs`
+    """
+    log.info("%s Running user code... %s", "-" * 10, "-" * 10)
+    log.newline(lines=3)
+    _check_ipython_version()
+
+    notebook = nbformat.v4.new_notebook()
+    notebook.cells = [nbformat.v4.new_code_cell(s) for s in source]
+    # render the matplotlib figures as the inline backend of a kernel does
+    if importlib.util.find_spec("matplotlib_inline"):
+        os.environ.setdefault(
+            "MPLBACKEND", "module://matplotlib_inline.backend_inline")
+
+    with _in_process_shell() as shell:
+        for cell in notebook.cells:
+            shell.kale_outputs = cell.outputs
+            shell.kale_error_msg = None
+            with contextlib.redirect_stdout(
+                    _InProcessStream(shell, "stdout", sys.stdout)), \
+                    contextlib.redirect_stderr(
+                        _InProcessStream(shell, "stderr", sys.stderr)):
+                result = shell.run_cell(cell.source, store_history=True)
+            cell.execution_count = result.execution_count
+            if result.success:
+                continue
+            if shell.kale_error_msg is not None:
+                _handle_kernel_message(shell.kale_error_msg)
+            sys.stdout.flush()
+            log.newline(lines=3)
+            log.error("%s Failed to run user code %s", "-" * 10, "-" * 10)
+            # exit gracefully with error
+            sys.exit(-1)
 
     result = process_outputs(notebook.cells)
     sys.stdout.flush()
@@ -15,7 +15,7 @@ from typing import Tuple, Any
 from functools import lru_cache
 
 from kfp.compiler import Compiler
-from kale.common import utils, podutils, workflowutils
+from kale.common import utils, podutils, profutils, workflowutils
 
 
 KFP_RUN_ID_LABEL_KEY = "pipeline/runid"
@@ -92,6 +92,7 @@ def get_pipeline_version_id(version_name: str, pipeline_id: str,
     return version_id
 
 
+@profutils.profiled("kfp compile")
 def compile_pipeline(pipeline_source: str, pipeline_name: str) -> str:
     """Read in the generated python script and compile it to a KFP package."""
     # create a tmp folder
@@ -276,12 +277,14 @@ def update_uimetadata(artifact_name,
     log.info("Artifact successfully added")
 
 
-def generate_mlpipeline_metrics(metrics):
+def generate_mlpipeline_metrics(metrics, merge=False):
     """Generate a KFP_UI_METRICS_FILE_PATH file.
 
     Args:
         metrics (dict): a dictionary where the key is the metric name and the
             value is its value.
+        merge (bool): keep the metrics already written to the file, unless
+            they are overridden by `metrics`.
     """
     metadata = list()
     for name, value in metrics.items():
@@ -305,10 +308,31 @@ def generate_mlpipeline_metrics(metrics):
         log.exception("Writing to '%s' failed. This step will not be able to"
                       " show metrics in the KFP UI.", KFP_UI_METRICS_FILE_PATH)
         return
+    if merge and os.path.exists(KFP_UI_METRICS_FILE_PATH):
+        names = {m['name'] for m in metadata}
+        with open(KFP_UI_METRICS_FILE_PATH) as f:
+            existing = json.load(f).get('metrics', [])
+        metadata = [m for m in existing if m['name'] not in names] + metadata
     with open(KFP_UI_METRICS_FILE_PATH, 'w') as f:
         json.dump({'metrics': metadata}, f)
 
 
+def write_output_parameter(value, path: str):
+    """Write the value of a KFP output parameter.
+
+    KFP reads the parameter from the file at `path`, the path of an
+    `OutputPath` argument of the component, and parses it according to the
+    parameter's type.
+
+    Args:
+        value: a `bool`, `int`, `float` or `str`
+        path: the path to write the value to
+    """
+    utils.ensure_or_create_dir(path)
+    with open(path, "w") as f:
+        f.write(value if isinstance(value, str) else json.dumps(value))
+
+
 def get_experiment_from_run_id(run_id: str):
     """Retrieve the experiment in which a run belongs.
 
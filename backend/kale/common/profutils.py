@@ -0,0 +1,120 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2019–2025 The Kale Contributors.
+
+import time
+import functools
+import threading
+import contextlib
+
+from typing import Any, Callable, Dict, Iterator, List
+
+from kale.common import utils
+
+__ENABLED = utils.env_flag("KALE_PROFILE")
+
+_timings: Dict[str, Dict[str, Any]] = dict()
+_timings_lock = threading.Lock()
+# The phases running in the current thread, outermost first. Each entry is
+# `[name, time spent in nested phases]`.
+_stack = threading.local()
+
+
+def set_enabled(enabled: bool = True):
+    """Enable or disable the profiling of the compilation phases.
+
+    When enabled, the time spent in every phase of the notebook to DSL path
+    (reading the notebook, parsing its tags, analyzing the steps, ...) is
+    accumulated and can be printed with `format_report`.
+
+    The default value can be set with the `KALE_PROFILE` environment
+    variable.
+    """
+    global __ENABLED
+    __ENABLED = enabled
+
+
+def is_enabled() -> bool:
+    """Whether the compilation phases are profiled."""
+    global __ENABLED  # noqa: F824
+    return __ENABLED
+
+
+def get_timings() -> Dict[str, Dict[str, Any]]:
+    """Get the timings collected so far.
+
+    Returns: A dict mapping every phase to the number of times it ran
+        (`calls`), the total time spent in it (`total`) and the time spent
+        in it but not in its nested phases (`self`)
+    """
+    with _timings_lock:
+        return {name: dict(t) for name, t in _timings.items()}
+
+
+def reset():
+    """Discard the timings collected so far."""
+    with _timings_lock:
+        _timings.clear()
+
+
+@contextlib.contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Account the time spent in the block to a phase.
+
+    Phases can be nested: the time of a nested phase is also part of the
+    `total` time of the enclosing one, but not of its `self` time.
+    """
+    if not is_enabled():
+        yield
+        return
+    stack = getattr(_stack, "phases", None)
+    if stack is None:
+        stack = _stack.phases = list()
+    entry = [name, 0.]
+    stack.append(entry)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stack.pop()
+        if stack:
+            stack[-1][1] += elapsed
+        with _timings_lock:
+            timing = _timings.setdefault(
+                name, {"calls": 0, "total": 0., "self": 0.})
+            timing["calls"] += 1
+            timing["total"] += elapsed
+            timing["self"] += elapsed - entry[1]
+
+
+def profiled(name: str) -> Callable:
+    """Decorate a function to account the time spent in it to a phase."""
+    def _decorator(fn):
+        @functools.wraps(fn)
+        def _wrapper(*args, **kwargs):
+            if not is_enabled():
+                return fn(*args, **kwargs)
+            with phase(name):
+                return fn(*args, **kwargs)
+        return _wrapper
+    return _decorator
+
+
+def format_report(timings: Dict[str, Dict[str, Any]] = None) -> str:
+    """Format the timings as a table, slowest phase first.
+
+    The `self` times of the phases add up to the profiled time, so their
+    percentages tell where the time goes.
+    """
+    if timings is None:
+        timings = get_timings()
+    total = sum(t["self"] for t in timings.values())
+    lines: List[str] = ["%-24s %6s %10s %10s %6s"
+                        % ("phase", "calls", "total (s)", "self (s)", "%")]
+    for name, t in sorted(timings.items(), key=lambda x: -x[1]["self"]):
+        lines.append("%-24s %6d %10.3f %10.3f %5.1f%%"
+                     % (name, t["calls"], t["total"], t["self"],
+                        100 * t["self"] / total if total else 0.))
+    lines.append("%-24s %6s %10s %10.3f %5.1f%%"
+                 % ("total", "", "", total, 100. if total else 0.))
+    return "\n".join(lines)
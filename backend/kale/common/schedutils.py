@@ -0,0 +1,252 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2019–2025 The Kale Contributors.
+
+"""Run the steps of a pipeline locally, in parallel."""
+
+import os
+import sys
+import logging
+import threading
+import contextlib
+import multiprocessing
+
+from typing import Dict, Iterator, List, Optional
+from concurrent import futures
+
+from kale.common import podutils
+
+log = logging.getLogger(__name__)
+
+# Folder where the logs of every step of a local run are written
+LOGS_DIR = os.path.join(".kale", "logs")
+
+# The pipeline of the running local run, inherited by the forked workers
+_pipeline = None
+
+
+def get_max_workers() -> int:
+    """Get the number of steps a local run executes at the same time.
+
+    Defaults to the number of CPUs and can be set with the
+    `KALE_LOCAL_WORKERS` environment variable.
+    """
+    return int(os.getenv("KALE_LOCAL_WORKERS") or os.cpu_count() or 1)
+
+
+def parse_k8s_cpu(cpu: str) -> float:
+    """Parse a K8s CPU quantity (e.g. `2`, `0.5`, `500m`) to a number."""
+    try:
+        if cpu.endswith("m"):
+            return float(cpu[:-1]) / 1000
+        return float(cpu)
+    except ValueError:
+        raise ValueError("Could not parse Kubernetes CPU: {}".format(cpu))
+
+
+def _get_total_memory() -> Optional[int]:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def get_budget() -> Dict[str, float]:
+    """Get the resources the steps of a local run can use at the same time.
+
+    The budget is all the CPUs and memory of the machine, unless set with
+    the `KALE_LOCAL_CPU` (e.g. `4`, `1500m`) and `KALE_LOCAL_MEMORY` (e.g.
+    `8Gi`) environment variables.
+
+    Returns: A dict with the `cpu` and `memory` (in bytes) budgets. A
+        resource is left out when its budget is unknown.
+    """
+    budget = {"cpu": float(os.cpu_count() or 1)}
+    if os.getenv("KALE_LOCAL_CPU"):
+        budget["cpu"] = parse_k8s_cpu(os.getenv("KALE_LOCAL_CPU"))
+    memory = _get_total_memory()
+    if os.getenv("KALE_LOCAL_MEMORY"):
+        memory = podutils.parse_k8s_size(os.getenv("KALE_LOCAL_MEMORY"))
+    if memory:
+        budget["memory"] = float(memory)
+    return budget
+
+
+def get_step_resources(step, budget: Dict[str, float]) -> Dict[str, float]:
+    """Get the resources a step reserves out of the budget.
+
+    A step reserves the `cpu` and `memory` of its `limits`, and one CPU when
+    it does not set a CPU limit. A step that needs more than the whole
+    budget reserves all of it, so that it runs alone instead of never.
+    """
+    limits = step.config.limits or dict()
+    resources = {"cpu": 1.}
+    try:
+        if "cpu" in limits:
+            resources["cpu"] = parse_k8s_cpu(str(limits["cpu"]))
+        if "memory" in limits:
+            resources["memory"] = float(
+                podutils.parse_k8s_size(str(limits["memory"])))
+    except ValueError as e:
+        log.warning("Ignoring the limits of step '%s': %s", step.name, e)
+    return {name: min(value, budget[name])
+            for name, value in resources.items() if name in budget}
+
+
+def _get_stream_handlers() -> List[logging.StreamHandler]:
+    loggers = [logging.getLogger()] + [
+        logger for logger in logging.Logger.manager.loggerDict.values()
+        if isinstance(logger, logging.Logger)]
+    return [handler for logger in loggers for handler in logger.handlers
+            if isinstance(handler, logging.StreamHandler)]
+
+
+@contextlib.contextmanager
+def _stream_output(step_name: str) -> Iterator[None]:
+    """Stream the output of a step, prefixed with its name, and log it.
+
+    The file descriptors of the standard output and error are redirected,
+    so that the output of subprocesses and extensions is captured too. The
+    Python streams (and the logging handlers writing to them) are bound to
+    the redirected descriptors, in case they were replaced (e.g. in a
+    notebook).
+    """
+    os.makedirs(LOGS_DIR, exist_ok=True)
+    read_fd, write_fd = os.pipe()
+    stdout_fd = os.dup(1)
+    prefix = ("[%s] " % step_name).encode()
+
+    def _pump():
+        with open(os.path.join(LOGS_DIR, step_name + ".log"), "wb") as f, \
+                os.fdopen(read_fd, "rb") as pipe:
+            for line in pipe:
+                f.write(line)
+                os.write(stdout_fd, prefix + line)
+
+    pump = threading.Thread(target=_pump, daemon=True)
+    pump.start()
+    saved_fds = [os.dup(1), os.dup(2)]
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(write_fd, 1)
+    os.dup2(write_fd, 2)
+    os.close(write_fd)
+    streams = (sys.stdout, sys.stderr)
+    sys.stdout = open(1, "w", buffering=1, closefd=False)
+    sys.stderr = open(2, "w", buffering=1, closefd=False)
+    handlers = [(h, h.stream) for h in _get_stream_handlers()
+                if h.stream in streams]
+    for handler, stream in handlers:
+        handler.setStream(
+            sys.stdout if stream is streams[0] else sys.stderr)
+    try:
+        yield
+    finally:
+        for handler, stream in handlers:
+            handler.setStream(stream)
+        sys.stdout.close()
+        sys.stderr.close()
+        sys.stdout, sys.stderr = streams
+        os.dup2(saved_fds[0], 1)
+        os.dup2(saved_fds[1], 2)
+        for fd in saved_fds:
+            os.close(fd)
+        # the pipe is closed, the pump reaches the end of the output
+        pump.join()
+        os.close(stdout_fd)
+
+
+def _run_step(step_name: str, pipeline_parameters):
+    """Run a step of `_pipeline` in a worker process."""
+    with _stream_output(step_name):
+        _pipeline.get_step(step_name).run(pipeline_parameters)
+
+
+def run_pipeline(pipeline, max_workers: int = None,
+                 budget: Dict[str, float] = None):
+    """Run the steps of a pipeline locally.
+
+    Every step runs in a process of a pool as soon as its parents are done,
+    so independent branches run at the same time. A step starts only when
+    the resources it reserves (see `get_step_resources`) fit in what is left
+    of the budget. The output of every step is streamed with the step's name
+    as prefix and written to `.kale/logs/<step>.log`.
+
+    When a step fails, no more steps are started and the error is raised
+    once the running steps are done.
+
+    With a single worker, or on platforms that cannot fork, the steps run
+    one after the other in this process, in topological order.
+
+    Args:
+        pipeline (Pipeline): The pipeline to run
+        max_workers: The number of steps running at the same time. Defaults
+            to `get_max_workers()`
+        budget: The resources of the steps running at the same time.
+            Defaults to `get_budget()`
+    """
+    global _pipeline
+
+    max_workers = max_workers or get_max_workers()
+    if (max_workers == 1
+            or "fork" not in multiprocessing.get_all_start_methods()):
+        for step in pipeline.steps:
+            step.run(pipeline.pipeline_parameters)
+        return
+
+    budget = budget or get_budget()
+    resources = {step.name: get_step_resources(step, budget)
+                 for step in pipeline.steps}
+    available = dict(budget)
+    steps_names = pipeline.steps_names
+    # the position of every step in the topological order
+    order = {name: i for i, name in enumerate(steps_names)}
+    parents_left = {name: pipeline.in_degree(name) for name in steps_names}
+    ready = [name for name in steps_names if not parents_left[name]]
+    running = dict()
+    error = None
+
+    def _fits(name):
+        return all(available[k] - v >= -1e-9
+                   for k, v in resources[name].items())
+
+    _pipeline = pipeline
+    try:
+        with futures.ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("fork")) as pool:
+            while running or (ready and error is None):
+                # start the ready steps, in topological order, as long as
+                # there are free workers and resources
+                for name in list(ready):
+                    if error is not None or len(running) >= max_workers:
+                        break
+                    if not _fits(name):
+                        continue
+                    ready.remove(name)
+                    for k, v in resources[name].items():
+                        available[k] -= v
+                    log.info("Starting step '%s'", name)
+                    future = pool.submit(_run_step, name,
+                                         pipeline.pipeline_parameters)
+                    running[future] = name
+                done, _ = futures.wait(
+                    running, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    for k, v in resources[name].items():
+                        available[k] += v
+                    if future.exception() is not None:
+                        log.error("Step '%s' failed: %s", name,
+                                  future.exception())
+                        error = error or future.exception()
+                        continue
+                    for child in pipeline.successors(name):
+                        parents_left[child] -= 1
+                        if not parents_left[child]:
+                            ready.append(child)
+                    # keep starting the steps in topological order
+                    ready.sort(key=order.__getitem__)
+    finally:
+        _pipeline = None
+    if error is not None:
+        raise error
@@ -0,0 +1,490 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2019–2025 The Kale Contributors.
+
+import ast
+import builtins
+
+from functools import lru_cache
+from typing import List, Optional, Set, Tuple, Union
+
+BUILTINS = frozenset(dir(builtins)) | {
+    "__file__", "__builtins__", "__annotations__", "WindowsError"}
+
+MODULE = "module"
+CLASS = "class"
+FUNCTION = "function"
+LAMBDA = "lambda"
+COMPREHENSION = "comprehension"
+
+
+class Scope(object):
+    """A Python scope and the names bound in it."""
+
+    def __init__(self, kind: str, parent: Optional["Scope"] = None):
+        self.kind = kind
+        self.parent = parent
+        self.bindings: Set[str] = set()
+        # names declared `global` or `nonlocal`, which are not local
+        self.not_local: Set[str] = set()
+        self.star_import = False
+
+    def chain(self):
+        """Iterate over this scope and the scopes enclosing it."""
+        scope = self
+        while scope:
+            yield scope
+            scope = scope.parent
+
+
+class ScopeAnalysis(object):
+    """The names a piece of code defines, references and misses.
+
+    Attributes:
+        defined: The names bound in the module scope
+        referenced: The names used in the module scope, including the free
+            names of its comprehensions and lambdas, but not the ones used
+            in function and class bodies
+        undefined: The names that are used, but neither defined by the code
+            (at the point they are used), nor builtins
+        star_import: Whether the module has star imports, which can define
+            any name
+    """
+
+    def __init__(self, defined: Set[str], referenced: Set[str],
+                 undefined: Set[str], star_import: bool = False):
+        self.defined = defined
+        self.referenced = referenced
+        self.undefined = undefined
+        self.star_import = star_import
+
+
+class _ScopeAnalyzer(ast.NodeVisitor):
+    """Resolve every name of a module to the scope that binds it.
+
+    The analysis follows Python's scoping rules:
+
+    * Module and class bodies are analyzed in order: a name is defined if it
+      was bound by a previous statement.
+    * Function (and lambda) bodies run after the module, so they can use any
+      name bound by the module. The names they bind anywhere in their body
+      are local. Class scopes are not visible from methods.
+    * Comprehensions have their own scope, except for their first iterable,
+      which is evaluated in the enclosing scope. Walrus targets are bound in
+      the enclosing scope.
+    * `except ... as e:` aliases are bound just in their handler.
+    * Names used in a `try` body guarded by `except NameError` are expected
+      to be possibly missing and are not reported.
+    * Modules with star imports can define any name, so names that can not
+      be resolved are not reported.
+    * Names declared `global` in functions are considered defined by the
+      module, as the functions might be called before the names are used.
+    * `del x` statements in module and class bodies unbind `x`. Deletions
+      nested in other statements (e.g. `if`, loops) or in function bodies
+      might not run, or not before the name is used, so they are not
+      tracked.
+    """
+
+    def __init__(self):
+        self.module = Scope(MODULE)
+        self.scope = self.module
+        self.referenced: Set[str] = set()
+        self.undefined: Set[str] = set()
+        self._deferred: List[Tuple[ast.AST, Scope]] = list()
+        self._name_error_guards = 0
+        # exception aliases unbound at the end of their handler
+        self._aliases: Set[str] = set()
+        # `del` statements that always run when their body runs
+        self._unconditional_deletes: Set[int] = set()
+
+    def analyze(self, tree: ast.AST) -> ScopeAnalysis:
+        """Analyze a parsed module."""
+        # functions can define global names, and they might be called before
+        # the names are used
+        self.module.bindings.update(
+            name for node in ast.walk(tree) if isinstance(node, ast.Global)
+            for name in node.names)
+        self._unconditional_deletes = {
+            id(stmt) for node in ast.walk(tree)
+            if isinstance(node, (ast.Module, ast.ClassDef))
+            for stmt in node.body if isinstance(stmt, ast.Delete)}
+        self.visit(tree)
+        # function bodies run after the module, possibly defining more
+        # deferred functions
+        while self._deferred:
+            node, scope = self._deferred.pop(0)
+            self._visit_function_body(node, scope)
+        # aliases do not refer to anything after their handler
+        self.referenced -= (self._aliases - self.module.bindings
+                            - self.undefined)
+        return ScopeAnalysis(set(self.module.bindings), self.referenced,
+                             self.undefined, self.module.star_import)
+
+    # -- bindings ----------------------------------------------------------
+
+    def _binding_scope(self, name: str) -> Scope:
+        scope = self.scope
+        if name in scope.not_local and scope.kind != MODULE:
+            # `global` names are bound in the module, `nonlocal` names
+            # in the enclosing function scope that already binds them
+            for outer in scope.parent.chain():
+                if outer.kind == MODULE or (outer.kind == FUNCTION
+                                            and name in outer.bindings):
+                    return outer
+        return scope
+
+    def _bind(self, name: str):
+        self._binding_scope(name).bindings.add(name)
+
+    def _bind_target(self, target: ast.AST):
+        """Bind all the names assigned by an assignment target."""
+        if isinstance(target, ast.Name):
+            self._bind(target.id)
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            for elt in target.elts:
+                self._bind_target(elt)
+        elif isinstance(target, ast.Starred):
+            self._bind_target(target.value)
+        else:
+            # attributes and subscripts use the names they are applied to
+            self.visit(target)
+
+    # -- resolution --------------------------------------------------------
+
+    def _resolve(self, name: str):
+        """Check that `name` is defined where it is used."""
+        scopes = list(self.scope.chain())
+        in_body = any(s.kind in (FUNCTION, CLASS) for s in scopes)
+        for i, scope in enumerate(scopes):
+            if scope.kind == CLASS and i > 0:
+                # class scopes are not visible from nested scopes
+                continue
+            if name in scope.bindings and name not in scope.not_local:
+                if scope.kind == MODULE and not in_body:
+                    self.referenced.add(name)
+                return
+        if not in_body:
+            self.referenced.add(name)
+        if name in BUILTINS:
+            return
+        if self._name_error_guards or any(s.star_import for s in scopes):
+            return
+        self.undefined.add(name)
+
+    # -- visitors ----------------------------------------------------------
+
+    def visit_Name(self, node: ast.Name):
+        """Resolve loaded names and bind stored ones."""
+        if isinstance(node.ctx, ast.Store):
+            self._bind(node.id)
+        else:
+            self._resolve(node.id)
+
+    def visit_Assign(self, node: ast.Assign):
+        """Evaluate the value before binding the targets."""
+        self.visit(node.value)
+        for target in node.targets:
+            self._bind_target(target)
+
+    def visit_AugAssign(self, node: ast.AugAssign):
+        """Augmented assignments read the target before binding it."""
+        self.visit(node.value)
+        if isinstance(node.target, ast.Name):
+            self._resolve(node.target.id)
+        self._bind_target(node.target)
+
+    def visit_AnnAssign(self, node: ast.AnnAssign):
+        """Annotations without a value do not bind the target."""
+        self.visit(node.annotation)
+        if node.value is None:
+            if self.scope.kind == FUNCTION:
+                self._bind_target(node.target)
+            elif not isinstance(node.target, ast.Name):
+                self.visit(node.target)
+            return
+        self.visit(node.value)
+        self._bind_target(node.target)
+
+    def visit_NamedExpr(self, node: ast.NamedExpr):
+        """Bind walrus targets outside of comprehensions."""
+        self.visit(node.value)
+        scope = self.scope
+        while scope.kind == COMPREHENSION:
+            scope = scope.parent
+        scope.bindings.add(node.target.id)
+
+    def visit_For(self, node: Union[ast.For, ast.AsyncFor]):
+        """Evaluate the iterable before binding the loop variable."""
+        self.visit(node.iter)
+        self._bind_target(node.target)
+        for stmt in node.body + node.orelse:
+            self.visit(stmt)
+
+    visit_AsyncFor = visit_For
+
+    def visit_With(self, node: Union[ast.With, ast.AsyncWith]):
+        """Bind the context managers' targets in the current scope."""
+        for item in node.items:
+            self.visit(item.context_expr)
+            if item.optional_vars is not None:
+                self._bind_target(item.optional_vars)
+        for stmt in node.body:
+            self.visit(stmt)
+
+    visit_AsyncWith = visit_With
+
+    def visit_Import(self, node: Union[ast.Import, ast.ImportFrom]):
+        """Bind imported names."""
+        if getattr(node, "module", None) == "__future__":
+            return
+        for alias in node.names:
+            if alias.name == "*":
+                self.scope.star_import = True
+            elif alias.asname:
+                self._bind(alias.asname)
+            else:
+                # `import a.b` binds `a`
+                self._bind(alias.name.split(".")[0])
+
+    visit_ImportFrom = visit_Import
+
+    def visit_Global(self, node: Union[ast.Global, ast.Nonlocal]):
+        """Make the declared names refer to the outer scopes."""
+        if self.scope.kind != MODULE:
+            self.scope.not_local.update(node.names)
+
+    visit_Nonlocal = visit_Global
+
+    def visit_Delete(self, node: ast.Delete):
+        """Deleting a name requires it to be defined, and unbinds it."""
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                self._resolve(target.id)
+                if id(node) in self._unconditional_deletes:
+                    self._binding_scope(target.id).bindings.discard(
+                        target.id)
+            else:
+                self.visit(target)
+
+    def visit_Try(self, node: ast.Try):
+        """Analyze a `try` statement."""
+        guarded = any(_catches_name_error(h.type) for h in node.handlers)
+        self._name_error_guards += guarded
+        for stmt in node.body:
+            self.visit(stmt)
+        self._name_error_guards -= guarded
+        for handler in node.handlers:
+            self.visit(handler)
+        for stmt in node.orelse + node.finalbody:
+            self.visit(stmt)
+
+    visit_TryStar = visit_Try
+
+    def visit_ExceptHandler(self, node: ast.ExceptHandler):
+        """Bind the exception alias just within the handler."""
+        if node.type is not None:
+            self.visit(node.type)
+        if node.name is None:
+            for stmt in node.body:
+                self.visit(stmt)
+            return
+        scope = self._binding_scope(node.name)
+        was_bound = node.name in scope.bindings
+        scope.bindings.add(node.name)
+        for stmt in node.body:
+            self.visit(stmt)
+        if not was_bound and scope.kind != FUNCTION:
+            # Python deletes the alias at the end of the handler
+            scope.bindings.discard(node.name)
+            self._aliases.add(node.name)
+
+    def visit_MatchAs(self, node: ast.MatchAs):
+        """Bind `case ... as x` captures."""
+        if node.pattern is not None:
+            self.visit(node.pattern)
+        if node.name is not None:
+            self._bind(node.name)
+
+    def visit_MatchStar(self, node: ast.MatchStar):
+        """Bind `case [*rest]` captures."""
+        if node.name is not None:
+            self._bind(node.name)
+
+    def visit_MatchMapping(self, node: ast.MatchMapping):
+        """Bind `case {**rest}` captures."""
+        self.generic_visit(node)
+        if node.rest is not None:
+            self._bind(node.rest)
+
+    def _visit_signature(self, node: Union[ast.FunctionDef, ast.Lambda]):
+        """Visit the parts of a function evaluated where it is defined."""
+        args = node.args
+        for default in args.defaults + args.kw_defaults:
+            if default is not None:
+                self.visit(default)
+        if isinstance(node, ast.Lambda):
+            return
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        for arg in _all_args(args):
+            if arg.annotation is not None:
+                self.visit(arg.annotation)
+        if node.returns is not None:
+            self.visit(node.returns)
+
+    def visit_FunctionDef(self, node: Union[ast.FunctionDef,
+                                            ast.AsyncFunctionDef]):
+        """Bind the function's name and defer the analysis of its body."""
+        self._visit_signature(node)
+        self._bind(node.name)
+        self._deferred.append((node, self.scope))
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node: ast.Lambda):
+        """Defer the analysis of the lambda's body."""
+        self._visit_signature(node)
+        self._deferred.append((node, self.scope))
+
+    def _visit_function_body(self, node: Union[ast.FunctionDef,
+                                               ast.Lambda],
+                             parent: Scope):
+        is_lambda = isinstance(node, ast.Lambda)
+        scope = Scope(LAMBDA if is_lambda else FUNCTION, parent)
+        scope.bindings.update(arg.arg for arg in _all_args(node.args))
+        if parent.kind == CLASS:
+            scope.bindings.add("__class__")
+        body = [node.body] if is_lambda else node.body
+        # names bound anywhere in a function are local to it
+        _collect_local_bindings(body, scope)
+        previous_scope, self.scope = self.scope, scope
+        for stmt in body:
+            self.visit(stmt)
+        self.scope = previous_scope
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        """Analyze the class body right away, it runs when defined."""
+        for expr in node.decorator_list + node.bases:
+            self.visit(expr)
+        for keyword in node.keywords:
+            self.visit(keyword.value)
+        previous_scope, self.scope = self.scope, Scope(CLASS, self.scope)
+        self.scope.bindings.update(("__module__", "__qualname__"))
+        for stmt in node.body:
+            self.visit(stmt)
+        self.scope = previous_scope
+        self._bind(node.name)
+
+    def _visit_comprehension(self, node: ast.AST, elts: List[ast.AST]):
+        generators = node.generators
+        # the first iterable is evaluated in the enclosing scope
+        self.visit(generators[0].iter)
+        previous_scope, self.scope = (self.scope,
+                                      Scope(COMPREHENSION, self.scope))
+        for i, generator in enumerate(generators):
+            if i > 0:
+                self.visit(generator.iter)
+            self._bind_target(generator.target)
+            for condition in generator.ifs:
+                self.visit(condition)
+        for elt in elts:
+            self.visit(elt)
+        self.scope = previous_scope
+
+    def visit_ListComp(self, node: Union[ast.ListComp, ast.SetComp,
+                                         ast.GeneratorExp]):
+        """Analyze a comprehension in its own scope."""
+        self._visit_comprehension(node, [node.elt])
+
+    visit_SetComp = visit_ListComp
+    visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node: ast.DictComp):
+        """Analyze a dict comprehension in its own scope."""
+        self._visit_comprehension(node, [node.key, node.value])
+
+
+def _all_args(args: ast.arguments) -> List[ast.arg]:
+    return [arg for arg in (args.posonlyargs + args.args + [args.vararg]
+                            + args.kwonlyargs + [args.kwarg]) if arg]
+
+
+def _catches_name_error(exc_type: Optional[ast.AST]) -> bool:
+    if isinstance(exc_type, ast.Tuple):
+        return any(_catches_name_error(e) for e in exc_type.elts)
+    return isinstance(exc_type, ast.Name) and exc_type.id == "NameError"
+
+
+def _collect_local_bindings(body: List[ast.AST], scope: Scope):
+    """Collect the names a function body binds.
+
+    Nested scopes are not entered, apart from collecting their names and
+    the walrus targets of comprehensions.
+    """
+    todo = list(body)
+    while todo:
+        node = todo.pop()
+        if isinstance(node, (ast.Global, ast.Nonlocal)):
+            scope.not_local.update(node.names)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            scope.bindings.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef,
+                               ast.ClassDef)):
+            scope.bindings.add(node.name)
+            continue
+        elif isinstance(node, ast.Lambda):
+            continue
+        elif isinstance(node, (ast.ListComp, ast.SetComp, ast.DictComp,
+                               ast.GeneratorExp)):
+            # only walrus targets leak from comprehensions
+            scope.bindings.update(
+                n.target.id for n in ast.walk(node)
+                if isinstance(n, ast.NamedExpr))
+            continue
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            scope.bindings.update(
+                (a.asname or a.name.split(".")[0]) for a in node.names
+                if a.name != "*")
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            scope.bindings.add(node.name)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            scope.bindings.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            scope.bindings.add(node.rest)
+        todo.extend(ast.iter_child_nodes(node))
+    scope.bindings.difference_update(scope.not_local)
+
+
+@lru_cache(maxsize=1024)
+def _analyze_source(code: str) -> ScopeAnalysis:
+    return _ScopeAnalyzer().analyze(ast.parse(code))
+
+
+def analyze_scopes(code: Union[str, ast.AST]) -> ScopeAnalysis:
+    """Analyze the names that a piece of code defines and uses.
+
+    Args:
+        code: Python source code, or its parsed tree
+
+    Returns: A `ScopeAnalysis` of the module. Its sets belong to the caller,
+        which is free to modify them.
+    """
+    if isinstance(code, ast.AST):
+        analysis = _ScopeAnalyzer().analyze(code)
+    else:
+        analysis = _analyze_source(code)
+    return ScopeAnalysis(set(analysis.defined), set(analysis.referenced),
+                         set(analysis.undefined), analysis.star_import)
+
+
+def get_undefined_names(code: Union[str, ast.AST]) -> Set[str]:
+    """Get the names that a piece of code uses but does not define.
+
+    These are the names that need to be available (e.g. restored from the
+    previous steps) for the code to run. Builtins are excluded.
+
+    Args:
+        code: Python source code, or its parsed tree
+
+    Returns: A set of names
+    """
+    return analyze_scopes(code).undefined
@@ -16,7 +16,7 @@ from typing import Any, Dict, Callable
 from kubernetes.client.rest import ApiException
 
 from kale import NotebookProcessor, marshal
-from kale.common import (astutils, flakeutils, podutils, k8sutils,
+from kale.common import (astutils, scopeutils, podutils, k8sutils,
                          jputils, utils)
 
 log = logging.getLogger(__name__)
@@ -259,7 +259,7 @@ def _prepare_transformer_assets(fn: Callable, assets: Dict = None):
     processor = NotebookProcessor(nb_path=notebook_path,
                                   skip_validation=True)
     fn_source = astutils.get_function_source(fn, strip_signature=False)
-    missing_names = flakeutils.pyflakes_report(
+    missing_names = scopeutils.get_undefined_names(
         processor.get_imports_and_functions() + "\n" + fn_source)
     if not assets:
         assets = dict()
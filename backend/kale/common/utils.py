@@ -130,7 +130,8 @@ def graceful_exit(exit_code):
 
     In case the code is running inside an IPython kernel, this function raises
     a `KaleGracefulExit` exception. This exception is expected to ke captured
-    inside the `kale.common.jputils.capture_streams` function.
+    when handling the messages of the kernel running the code (see
+    `kale.common.jputils.run_code`).
     """
     if is_ipython():
         from kale.common.jputils import KaleGracefulExit
@@ -139,6 +140,19 @@ def graceful_exit(exit_code):
         sys.exit(exit_code)
 
 
+def env_flag(name: str, default: bool = False) -> bool:
+    """Read a boolean-like environment variable.
+
+    The values `1`, `true`, `yes` and `on` (case insensitive) are considered
+    truthy, any other value is considered falsy. If the variable is not set,
+    return `default`.
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in {"1", "true", "yes", "on"}
+
+
 def read_json_from_file(path: str) -> Dict:
     """Read a file that contains a JSON object and return it as dictionary."""
     try:
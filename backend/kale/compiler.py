@@ -6,12 +6,13 @@ import re
 import logging
 import argparse
 import autopep8
-from typing import NamedTuple
+from typing import List, NamedTuple, Set
+from concurrent.futures import ProcessPoolExecutor
 from jinja2 import Environment, PackageLoader, FileSystemLoader
 
 from kale import __version__ as KALE_VERSION
 from kale.pipeline import Pipeline, Step, PipelineParam
-from kale.common import kfputils, utils
+from kale.common import astutils, cacheutils, kfputils, profutils, utils
 
 log = logging.getLogger(__name__)
 
@@ -21,6 +22,10 @@ PIPELINE_TEMPLATE = "new_pipeline_template.jinja2"
 PIPELINE_ORIGIN = {"nb": NB_FN_TEMPLATE,
                    "py": PY_FN_TEMPLATE}
 
+AUTOPEP8_CACHE_NAMESPACE = "autopep8"
+# Formatting fewer components in a process pool is not worth the overhead
+MIN_PARALLEL_FORMATTING = 4
+
 KFP_DSL_ARTIFACT_IMPORTS = [
     "Dataset",
     "Model",
@@ -31,6 +36,48 @@ KFP_DSL_ARTIFACT_IMPORTS = [
 ]
 
 
+def _get_max_workers() -> int:
+    """Get the number of processes that format the generated code.
+
+    Defaults to the number of CPUs and can be set with the
+    `KALE_COMPILE_WORKERS` environment variable.
+    """
+    return int(os.getenv("KALE_COMPILE_WORKERS") or os.cpu_count() or 1)
+
+
+@profutils.profiled("autopep8")
+def _fix_code_many(codes: List[str]) -> List[str]:
+    """Fix the code style of pieces of generated code with autopep8.
+
+    The generated code of the steps that did not change since the previous
+    compilation is the same, so its formatted version is reused from the
+    compilation cache (see `kale.common.cacheutils`). The rest is formatted
+    in a process pool, when there is enough of it.
+    """
+    keys = [cacheutils.compute_key(autopep8.__version__, code)
+            for code in codes]
+    fixed_codes = [cacheutils.load(AUTOPEP8_CACHE_NAMESPACE, key)
+                   for key in keys]
+    misses = [i for i, fixed_code in enumerate(fixed_codes)
+              if fixed_code is None]
+    workers = min(_get_max_workers(), len(misses))
+    if workers > 1 and len(misses) >= MIN_PARALLEL_FORMATTING:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            fixed = list(pool.map(autopep8.fix_code,
+                                  [codes[i] for i in misses]))
+    else:
+        fixed = [autopep8.fix_code(codes[i]) for i in misses]
+    for i, fixed_code in zip(misses, fixed):
+        fixed_codes[i] = fixed_code
+        cacheutils.store(AUTOPEP8_CACHE_NAMESPACE, keys[i], fixed_code)
+    return fixed_codes
+
+
+def _fix_code(code: str) -> str:
+    """Fix the code style of a piece of generated code with autopep8."""
+    return _fix_code_many([code])[0]
+
+
 class Artifact(NamedTuple):
     """A Step artifact."""
     name: str
@@ -74,6 +121,7 @@ class Compiler:
         """
         log.info("Compiling Pipeline into KFP DSL code")
         self.dsl_source = self.generate_dsl()
+        cacheutils.prune(AUTOPEP8_CACHE_NAMESPACE)
         return self._save_compiled_code()
 
     def run(self):
@@ -89,16 +137,26 @@ class Compiler:
 
         Returns (str): A Python executable script
         """
+        formatting = self.pipeline.config.code_formatting
         # List of lightweight components generated code
         lightweight_components = [
-            self.generate_lightweight_component(step)
+            self._render_lightweight_component(step)
             for step in self.pipeline.steps
         ]
-        pipeline_code = self.generate_pipeline(lightweight_components)
-        return pipeline_code
+        if formatting == "autopep8":
+            lightweight_components = _fix_code_many(lightweight_components)
+        pipeline_code = self._render_pipeline(lightweight_components)
+        if formatting == "none":
+            return pipeline_code
+        # fix code style using pep8 guidelines
+        return _fix_code(pipeline_code)
 
     def generate_lightweight_component(self, step: Step):
         """Generate Python code using the function template."""
+        return _fix_code(self._render_lightweight_component(step))
+
+    @profutils.profiled("template render")
+    def _render_lightweight_component(self, step: Step):
         step_source_raw = step.source
 
         def _encode_source(s):
@@ -112,6 +170,12 @@ class Compiler:
             # escaped by encode("unicode_escape").
             step.source = [re.sub(r"'''", "\\'\\'\\'", _encode_source(s))
                            for s in step_source_raw]
+            input_columns = {
+                name: re.sub(r"'''", "\\'\\'\\'", _encode_source(repr(cols)))
+                for name, cols in self._get_input_columns(
+                    step, "\n".join(step_source_raw)).items()}
+        else:
+            input_columns = {}
 
         _template_filename = PIPELINE_ORIGIN.get(self.pipeline.processor.id)
         template = self._get_templating_env().get_template(_template_filename)
@@ -120,27 +184,43 @@ class Compiler:
         params_without_defaults = [f"{step.name}_html_report: Output[HTML]"]
         params_with_defaults = []
         step_inputs_list, step_outputs_list = [], []
+        # Small values are passed as KFP parameters instead of artifacts
+        value_inputs = sorted(step.value_ins)
+        value_outputs = sorted(step.value_outs)
         if hasattr(step, 'ins') and step.ins:
-            step_inputs_list = sorted(step.ins)
+            step_inputs_list = sorted(set(step.ins) - set(value_inputs))
             for var_name in step_inputs_list:
                 # Determine the correct input type based on variable name
                 input_type = "Model" if "model" in var_name else "Dataset"
                 params_without_defaults.append(
                     f"{var_name}_artifact: Input[{input_type}]"
                 )
+            for var_name in value_inputs:
+                params_without_defaults.append(
+                    f"{var_name}_value: {step.value_ins[var_name]}"
+                )
 
         step_outputs_list = []
 
         if hasattr(step, 'outs') and step.outs:
-            step_outputs_list = sorted(step.outs)
+            step_outputs_list = sorted(set(step.outs) - set(value_outputs))
             for var_name in step_outputs_list:
                 output_type = "Model" if "model" in var_name else "Dataset"
                 params_without_defaults.append(
                     f"{var_name}_artifact: Output[{output_type}]"
                 )
+            for var_name in value_outputs:
+                params_without_defaults.append(
+                    f"{var_name}_value: "
+                    f"kfp_dsl.OutputPath({step.value_outs[var_name]})"
+                )
 
-        if (hasattr(self.pipeline, 'pipeline_parameters') and self.pipeline.pipeline_parameters):  # noqa: E501
-            for param_name, param in self.pipeline.pipeline_parameters.items():
+        # A component receives just the pipeline parameters its step consumes,
+        # so that changing a parameter does not invalidate the KFP cache of
+        # the steps that do not use it
+        step_parameters = self._get_step_parameters(step)
+        if step_parameters:
+            for param_name, param in step_parameters.items():
                 if isinstance(param, PipelineParam):
                     param_type = param.param_type or "str"
                     param_value_str = repr(param.param_value)
@@ -157,8 +237,8 @@ class Compiler:
 
         # Create pipeline parameter mapping for the template
         pipeline_params = {}
-        if hasattr(self.pipeline, 'pipeline_parameters') and self.pipeline.pipeline_parameters:  # noqa: E501
-            for param_name, param in self.pipeline.pipeline_parameters.items():
+        if step_parameters:
+            for param_name, param in step_parameters.items():
                 if isinstance(param, PipelineParam):
                     clean_param_name = (
                         f"{param_name.lower()}_param"
@@ -201,13 +281,67 @@ class Compiler:
             packages_list=packages_list,
             step_inputs=step_inputs,
             step_outputs=step_outputs,
+            value_inputs=value_inputs,
+            value_outputs=value_outputs,
+            input_columns=input_columns,
             kfp_dsl_artifact_imports=KFP_DSL_ARTIFACT_IMPORTS,
             **self.pipeline.config.to_dict()
         )
-        return autopep8.fix_code(fn_code)
+        return fn_code
+
+    def _get_step_parameters(self, step: Step):
+        """Get the pipeline parameters a step consumes, in pipeline order."""
+        return {name: param for name, param
+                in (self.pipeline.pipeline_parameters or {}).items()
+                if name in step.parameters}
+
+    def _get_input_columns(self, step: Step, source: str):
+        """Get the columns of the step's input data frames it references.
+
+        Inputs that are also outputs of the step are always loaded in full,
+        since the step might save them back with new columns. So are the
+        free variables of the functions the step defines, loads or calls:
+        the functions might use any of their columns.
+        """
+        if not self.pipeline.config.marshal_column_projection:
+            return {}
+        names = (set(step.ins) - set(step.outs) - set(step.value_ins)
+                 - self._get_fns_free_variables(step))
+        try:
+            return astutils.get_column_projections(source, names)
+        except SyntaxError:
+            log.debug("Could not parse the source of step '%s', its inputs"
+                      " will be loaded in full", step.name)
+            return {}
+
+    def _get_fns_free_variables(self, step: Step) -> Set[str]:
+        """Get the free variables of the functions a step can run.
+
+        These are the functions the step defines or loads from its
+        ancestors, and the functions they use, transitively.
+        """
+        fns_free_variables = dict()
+        for _step in self.pipeline.steps:
+            for fn_name, (free_vars, _) in _step.fns_free_variables.items():
+                fns_free_variables.setdefault(fn_name, set()).update(
+                    free_vars)
+        free_vars = set()
+        to_visit = [name for name in set(step.ins) | set(
+            step.fns_free_variables) if name in fns_free_variables]
+        while to_visit:
+            for name in fns_free_variables.pop(to_visit.pop(), ()):
+                free_vars.add(name)
+                if name in fns_free_variables:
+                    to_visit.append(name)
+        return free_vars
 
     def generate_pipeline(self, lightweight_components):
         """Generate Python code using the pipeline template."""
+        # fix code style using pep8 guidelines
+        return _fix_code(self._render_pipeline(lightweight_components))
+
+    @profutils.profiled("template render")
+    def _render_pipeline(self, lightweight_components):
         template = self._get_templating_env().get_template(PIPELINE_TEMPLATE)
         step_outputs = {}
         step_inputs = {}
@@ -243,12 +377,16 @@ class Compiler:
             lightweight_components=lightweight_components,
             step_outputs=step_outputs,
             step_inputs=step_inputs,
+            # run every step after its predecessors in the pipeline graph
+            # only, so that independent branches run in parallel
+            dependencies_tasks=self.pipeline.pipeline_dependencies_tasks,
+            steps_parameters={step.name: list(self._get_step_parameters(step))
+                              for step in self.pipeline.steps},
             pipeline_param_info=pipeline_param_info,
             component_names=component_names,
             **self.pipeline.config.to_dict()
         )
-        # fix code style using pep8 guidelines
-        return autopep8.fix_code(pipeline_code)
+        return pipeline_code
 
     def _get_package_list_from_imports(self):
         """Extracts unique package names from the tagged imports cell.
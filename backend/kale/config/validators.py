@@ -187,6 +187,18 @@ class VolumeAccessModeValidator(EnumValidator):
     enum = ("", "rom", "rwo", "rwm")
 
 
+class CodeFormattingValidator(EnumValidator):
+    """Validates the formatting mode of the generated code."""
+
+    enum = ("autopep8", "once", "none")
+
+
+class StepExecutorValidator(EnumValidator):
+    """Validates the engine that runs the code of notebook steps."""
+
+    enum = ("kernel", "in-process")
+
+
 class IsLowerValidator(Validator):
     """Validates if a string is all lowercase."""
 
@@ -3,10 +3,18 @@
 
 # Import all backends so that they register themselves to the Dispatcher
 from .backends import *
-from .backend import get_dispatcher, set_data_dir, get_data_dir
+from .backend import (get_dispatcher, set_data_dir, get_data_dir,
+                      set_content_addressed, is_content_addressed,
+                      set_mmap_mode, get_mmap_mode,
+                      set_dataframe_format, get_dataframe_format,
+                      set_max_workers, get_max_workers,
+                      set_codec, get_codec)
+from .lazy import LazyObject, unwrap
 
 save = get_dispatcher().save
 load = get_dispatcher().load
+save_many = get_dispatcher().save_many
+load_many = get_dispatcher().load_many
 get_backend = get_dispatcher().get_backend
 get_backends = get_dispatcher().get_backends
 get_backend_by_name = get_dispatcher().get_backend_by_name
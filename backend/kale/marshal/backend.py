@@ -3,15 +3,50 @@
 
 import os
 import re
+import json
+import shutil
+import hashlib
 import logging
+import weakref
+import functools
 
-from typing import Dict, Any, Type
+from typing import Dict, Any, Type, Tuple, Optional, List, Callable
+from concurrent.futures import ThreadPoolExecutor
 
 from kale.common import utils
+from kale.marshal import stats, compression
+from kale.marshal.lazy import LazyObject, get_source, is_resolved, unwrap
 
 log = logging.getLogger(__name__)
 
 __DATA_DIR = os.path.curdir
+__CONTENT_ADDRESSED = utils.env_flag("KALE_MARSHAL_CONTENT_ADDRESSED")
+__MMAP_MODE = os.getenv("KALE_MARSHAL_MMAP_MODE") or None
+__DATAFRAME_FORMAT = os.getenv("KALE_MARSHAL_DATAFRAME_FORMAT", "feather")
+__DATAFRAME_COMPRESSION = (os.getenv("KALE_MARSHAL_DATAFRAME_COMPRESSION")
+                           or None)
+__MAX_WORKERS = int(os.getenv("KALE_MARSHAL_MAX_WORKERS", "8"))
+__CODEC = os.getenv("KALE_MARSHAL_CODEC") or None
+__CODEC_LEVEL = (int(os.getenv("KALE_MARSHAL_CODEC_LEVEL"))
+                 if os.getenv("KALE_MARSHAL_CODEC_LEVEL") else None)
+
+# Modes supported by `numpy.load` (`None` disables memory mapping)
+MMAP_MODES = (None, "r", "r+", "c")
+
+# Formats used to store data frames, with the codecs each format supports
+# (`None` disables compression)
+DATAFRAME_FORMATS = {"feather": (None, "lz4", "zstd"),
+                     "parquet": (None, "snappy", "gzip", "brotli", "lz4",
+                                 "zstd"),
+                     "pickle": (None,)}
+
+# Folder, inside the data directory, where the content-addressed store keeps
+# the deduplicated blobs.
+BLOBS_DIR_NAME = ".kale.blobs"
+# Folder, inside the data directory, with an index entry for every saved
+# object, so that loads do not need to scan the data directory.
+INDEX_DIR_NAME = ".kale.index"
+_HASH_CHUNK_SIZE = 1024 * 1024
 
 
 def set_data_dir(path):
@@ -29,6 +64,302 @@ def get_data_dir():
     return __DATA_DIR
 
 
+def set_content_addressed(enabled: bool = True):
+    """Enable or disable the content-addressed store.
+
+    When enabled, each distinct content is stored just once under
+    `<data_dir>/.kale.blobs` and the saved names become symlinks pointing to
+    the blobs. Objects whose backend can hash them in memory (e.g., arrays
+    and data frames) are hashed before being saved, so saving the same
+    object multiple times (or under multiple names) costs just a hash. Other
+    objects are hashed while they are written and duplicate copies are
+    discarded.
+
+    The default value can be set with the `KALE_MARSHAL_CONTENT_ADDRESSED`
+    environment variable.
+    """
+    global __CONTENT_ADDRESSED
+    __CONTENT_ADDRESSED = enabled
+
+
+def is_content_addressed() -> bool:
+    """Whether the content-addressed store is enabled."""
+    global __CONTENT_ADDRESSED  # noqa: F824
+    return __CONTENT_ADDRESSED
+
+
+def set_mmap_mode(mode: Optional[str] = "r"):
+    """Load arrays and columnar data frames as memory-mapped objects.
+
+    With memory mapping, loading an object does not read the file in memory:
+    data is paged in lazily, when it is accessed. This means that a step that
+    reads just a slice of a large array, only reads that slice from disk.
+
+    When memory mapping is enabled, data frames are saved using the
+    (uncompressed) Arrow IPC columnar format, so that they can be loaded
+    without copies.
+
+    The default value can be set with the `KALE_MARSHAL_MMAP_MODE`
+    environment variable.
+
+    Objects mapped with the 'r+' mode write their changes back to the file.
+    When the file is a link to a content-addressed blob (see
+    `set_content_addressed`), it is first replaced with a private copy of
+    the blob, so that the changes do not reach the other names sharing it.
+
+    Args:
+        mode: One of `numpy.load`'s `mmap_mode` values ('r', 'r+', 'c').
+            Set to None to disable memory mapping.
+    """
+    if mode not in MMAP_MODES:
+        raise ValueError("Invalid mmap mode '%s'. Supported modes are: %s"
+                         % (mode, MMAP_MODES))
+    global __MMAP_MODE
+    __MMAP_MODE = mode
+
+
+def get_mmap_mode() -> Optional[str]:
+    """Get the memory mapping mode used when loading objects."""
+    global __MMAP_MODE  # noqa: F824
+    return __MMAP_MODE
+
+
+def set_dataframe_format(fmt: str = "feather",
+                         compression: Optional[str] = None):
+    """Set the format used to save pandas objects.
+
+    Columnar formats (`feather`, `parquet`) are written and read using
+    multiple threads and allow steps to load just a subset of the columns.
+    Objects that cannot be converted to Arrow are always pickled.
+
+    The default values can be set with the `KALE_MARSHAL_DATAFRAME_FORMAT`
+    and `KALE_MARSHAL_DATAFRAME_COMPRESSION` environment variables.
+
+    Args:
+        fmt: One of 'feather' (Arrow IPC), 'parquet' or 'pickle'.
+        compression: The codec used to compress columnar files. Set to None
+            to write uncompressed files, which can be memory-mapped.
+    """
+    if fmt not in DATAFRAME_FORMATS:
+        raise ValueError("Invalid data frame format '%s'. Supported formats"
+                         " are: %s" % (fmt, list(DATAFRAME_FORMATS)))
+    if compression not in DATAFRAME_FORMATS[fmt]:
+        raise ValueError("Invalid compression '%s' for format '%s'."
+                         " Supported values are: %s"
+                         % (compression, fmt, DATAFRAME_FORMATS[fmt]))
+    global __DATAFRAME_FORMAT, __DATAFRAME_COMPRESSION
+    __DATAFRAME_FORMAT = fmt
+    __DATAFRAME_COMPRESSION = compression
+
+
+def get_dataframe_format() -> Tuple[str, Optional[str]]:
+    """Get the format and compression used to save pandas objects."""
+    global __DATAFRAME_FORMAT, __DATAFRAME_COMPRESSION  # noqa: F824
+    return __DATAFRAME_FORMAT, __DATAFRAME_COMPRESSION
+
+
+def set_max_workers(max_workers: int):
+    """Set the number of threads used to save and load multiple objects.
+
+    Marshalling is mostly bound by the latency of the storage, so the number
+    of threads can exceed the number of CPUs. Set to 1 to marshal one object
+    at a time.
+
+    The default value can be set with the `KALE_MARSHAL_MAX_WORKERS`
+    environment variable.
+    """
+    if max_workers < 1:
+        raise ValueError("The number of workers must be a positive integer")
+    global __MAX_WORKERS
+    __MAX_WORKERS = max_workers
+
+
+def get_max_workers() -> int:
+    """Get the number of threads used to save and load multiple objects."""
+    global __MAX_WORKERS  # noqa: F824
+    return __MAX_WORKERS
+
+
+def _get_type_name(_type: type) -> str:
+    """Get the name of a type, as printed by `str(type)`.
+
+    E.g., `pandas.core.frame.DataFrame` or `function`.
+    """
+    if _type.__module__ == "builtins":
+        return _type.__qualname__
+    return "%s.%s" % (_type.__module__, _type.__qualname__)
+
+
+def set_codec(codec: Optional[str] = "zstd", level: Optional[int] = None):
+    """Compress the serialized objects with a streaming codec.
+
+    Objects are serialized directly into the compressed stream. The codec
+    applies to the default (dill) backend and to the backends that write
+    through `kale.marshal.compression.open_write` (e.g., pickled data
+    frames). Other backends write their own format, uncompressed or
+    compressed according to their own settings.
+
+    When loading, the codec is detected automatically, so files compressed
+    with different codecs can live in the same data directory.
+
+    The default values can be set with the `KALE_MARSHAL_CODEC` and
+    `KALE_MARSHAL_CODEC_LEVEL` environment variables.
+
+    Args:
+        codec: One of 'zstd', 'lz4' and 'gzip'. Set to None to disable
+            compression.
+        level: The compression level. Defaults to the codec's default, or
+            to a fast level for gzip.
+    """
+    if codec is not None and codec not in compression.CODECS:
+        raise ValueError("Invalid codec '%s'. Supported codecs are: %s"
+                         % (codec, list(compression.CODECS)))
+    global __CODEC, __CODEC_LEVEL
+    __CODEC = codec
+    __CODEC_LEVEL = level
+
+
+def get_codec() -> Tuple[Optional[str], Optional[int]]:
+    """Get the codec and the level used to compress serialized objects."""
+    global __CODEC, __CODEC_LEVEL  # noqa: F824
+    return __CODEC, __CODEC_LEVEL
+
+
+def _get_index_path(name: str) -> str:
+    return os.path.join(get_data_dir(), INDEX_DIR_NAME, name + ".json")
+
+
+def _get_size(path: str) -> int:
+    """Get the size of a file or the total size of a folder's files."""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, f))
+               for root, _, fs in os.walk(path) for f in fs)
+
+
+def write_index_entry(name: str, path: str, checksum: str = None, **kwargs):
+    """Record a saved object in the data directory's index.
+
+    The entry is written atomically, so concurrent readers either see the
+    previous entry or the new one.
+
+    Args:
+        name: The name of the saved object
+        path: The path of the file (or folder) the object was saved to
+        checksum: A digest of the object's content, if known
+        kwargs: Additional fields to store in the entry
+    """
+    entry = {"name": name,
+             "file": os.path.basename(path),
+             "file_type": os.path.splitext(path)[1].lstrip("."),
+             "size": _get_size(path),
+             "checksum": checksum,
+             **kwargs}
+    index_path = _get_index_path(name)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    tmp_path = "%s.tmp-%s" % (index_path, utils.random_string())
+    with open(tmp_path, "w") as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, index_path)
+
+
+def read_index_entry(name: str) -> Optional[Dict[str, Any]]:
+    """Get the index entry of a saved object.
+
+    Returns None if the object is not indexed, e.g. because it was saved by
+    a previous version of Kale or copied to the data directory by hand.
+    """
+    try:
+        with open(_get_index_path(name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log.warning("Could not read the index entry of '%s': %s", name, e)
+        return None
+
+
+def _get_blobs_dir():
+    return os.path.join(get_data_dir(), BLOBS_DIR_NAME)
+
+
+def _hash_path(path: str) -> str:
+    """Compute the sha256 digest of a file or of a folder's contents."""
+    h = hashlib.sha256()
+    if os.path.isdir(path):
+        files = sorted(os.path.join(root, f)
+                       for root, _, fs in os.walk(path) for f in fs)
+    else:
+        files = [path]
+    for file_path in files:
+        h.update(os.path.relpath(file_path, path).encode())
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def _move_blob(tmp_path: str, blob_path: str):
+    """Atomically move a freshly written blob in place."""
+    try:
+        os.replace(tmp_path, blob_path)
+    except OSError:
+        # Folders cannot replace non-empty folders. In that case another
+        # process has already stored the very same content.
+        if not os.path.exists(blob_path):
+            raise
+        utils.rm_r(tmp_path)
+
+
+def materialize_blob_link(path: str):
+    """Replace a link to a content-addressed blob with a copy of the blob.
+
+    Objects that are modified in place on disk (e.g., arrays mapped in 'r+'
+    mode) must not write to a blob, as other names might be pointing to it.
+    """
+    if not os.path.islink(path):
+        return
+    tmp_path = "%s.tmp-%s" % (path, utils.random_string())
+    if os.path.isdir(path):
+        shutil.copytree(path, tmp_path)
+        os.unlink(path)
+        os.rename(tmp_path, path)
+    else:
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, path)
+
+
+def _link_blob(blob_path: str, link_path: str):
+    """Make `link_path` a relative symlink pointing to `blob_path`."""
+    target = os.path.relpath(blob_path, os.path.dirname(link_path))
+    if os.path.islink(link_path) and os.readlink(link_path) == target:
+        return
+    tmp_link = os.path.join(os.path.dirname(link_path),
+                            ".%s.%s" % (os.path.basename(link_path),
+                                        utils.random_string()))
+    os.symlink(target, tmp_link)
+    if os.path.isdir(link_path) and not os.path.islink(link_path):
+        utils.rm_r(link_path)
+    os.replace(tmp_link, link_path)
+
+
+class _HashingWriter(object):
+    """A file-like object that hashes the bytes written to another file."""
+
+    def __init__(self, f):
+        self._f = f
+        self._hash = hashlib.sha256()
+
+    def write(self, data) -> int:
+        """Hash `data` and write it to the underlying file."""
+        self._hash.update(data)
+        return self._f.write(data)
+
+    def hexdigest(self) -> str:
+        """Get the digest of the bytes written so far."""
+        return self._hash.hexdigest()
+
+
 class MarshalBackend(object):
     """Base class for marshalling Python objects.
 
@@ -39,8 +370,11 @@ class MarshalBackend(object):
     A backend registers itself to specific objects/file types using the
     following class attributes:
 
-    * `file_type`: The file extension of the files/folders the backend is able
-                   to restore. NOTE: Currently this can be just *one* ext.
+    * `file_type`: The file extension of the files/folders the backend
+                   writes by default.
+    * `extra_file_types`: Additional extensions the backend is able to
+                          restore, in case it can write objects in more than
+                          one format (see `get_file_type`).
     * `obj_type_regex`: A regex which is matched against the `type` of an
                         object.
 
@@ -50,8 +384,15 @@ class MarshalBackend(object):
     name: str = "Default backend"
     display_name: str = "generic"  # This is supposed to tbe the library name
     file_type: str = "dillpkl"
+    extra_file_types: Tuple[str, ...] = ()
     obj_type_regex: str = None
     predictor_type: str = None  # Used for creating serving predictors
+    # Whether `load` accepts a `columns` argument to restore just a subset
+    # of the object's columns.
+    supports_columns: bool = False
+    # Whether multiple objects can be saved or loaded at the same time from
+    # different threads (see `Dispatcher.save_many` and `load_many`).
+    concurrency_safe: bool = True
 
     # Set to False if you want your backend not to use the default backend
     # in case of a missing library.
@@ -77,40 +418,178 @@ class MarshalBackend(object):
         Returns the path (<data_dir>/<basename>.<backend_extension>) to the
         saved file.
         """
-        abs_path = os.path.join(get_data_dir(), name + "." + self.file_type)
+        with stats.measure("save", name, self.display_name) as record:
+            abs_path = self._save_and_index(obj, name)
+            if record is not None:
+                record["file_type"] = os.path.splitext(abs_path)[1][1:]
+                record["bytes"] = _get_size(abs_path)
+        return abs_path
+
+    def _save_and_index(self, obj: Any, name: str) -> str:
+        file_type = self.get_file_type(obj)
+        abs_path = os.path.join(get_data_dir(), name + "." + file_type)
         log.info("Saving %s object using %s: %s to %s",
                  self.display_name, self.name, name, abs_path)
+        if is_content_addressed():
+            abs_path = self._content_addressed_save(obj, abs_path, file_type)
+        else:
+            if os.path.islink(abs_path):
+                # Never write through a link to a content-addressed blob,
+                # other names might be pointing to it.
+                os.unlink(abs_path)
+            abs_path = self._save_or_fallback(obj, abs_path)
+        # Remove any stale copy of the object saved in another format, it
+        # would make the name ambiguous when loading.
+        for _type in (self.file_type,) + self.extra_file_types:
+            stale_path = os.path.join(get_data_dir(), name + "." + _type)
+            if stale_path != abs_path and os.path.lexists(stale_path):
+                utils.rm_r(stale_path)
+        checksum = None
+        if os.path.islink(abs_path):
+            # content-addressed blobs are named after their digest
+            checksum = os.path.basename(os.readlink(abs_path)).split(".")[0]
+        write_index_entry(name, abs_path, checksum=checksum,
+                          codec=compression.detect(abs_path))
+        return abs_path
+
+    def _save_or_fallback(self, obj: Any, path: str) -> str:
         try:
-            self.save(obj, abs_path)
+            return self.save(obj, path) or path
         except ImportError as e:
             if not self.fallback_on_missing_lib:
                 raise e
             log.warning("Failed to import %s (%s). Falling back to default"
                         " backend.", self.display_name, e)
-            self._default_save(obj, name)  # always try the default save
-        return abs_path
+            self._default_save(obj, path)  # always try the default save
+            return path
+
+    def _content_addressed_save(self, obj: Any, path: str,
+                                file_type: str) -> str:
+        """Store `obj` as a deduplicated blob and link `path` to it.
+
+        Returns the path of the link, whose extension could differ from
+        `file_type` in case the backend had to write another format.
+        """
+        blobs_dir = _get_blobs_dir()
+        os.makedirs(blobs_dir, exist_ok=True)
+        try:
+            digest = self.content_hash(obj)
+        except Exception as e:
+            log.debug("Could not hash %s object in memory (%s). Hashing the"
+                      " serialized object instead.", self.display_name, e)
+            digest = None
+
+        blob_path = None
+        if digest:
+            for _type in dict.fromkeys((file_type, self.file_type)
+                                       + self.extra_file_types):
+                _blob_path = os.path.join(blobs_dir,
+                                          "%s.%s" % (digest, _type))
+                if os.path.exists(_blob_path):
+                    log.info("Content already stored in %s, skipping write",
+                             _blob_path)
+                    blob_path = _blob_path
+                    break
+        if not blob_path:
+            tmp_path = os.path.join(
+                blobs_dir, "%stmp-%s.%s" % (digest + "." if digest else "",
+                                            utils.random_string(), file_type))
+            if digest:
+                tmp_path = self._save_or_fallback(obj, tmp_path)
+            else:
+                tmp_path, digest = self._save_and_hash(obj, tmp_path)
+            blob_path = os.path.join(
+                blobs_dir, digest + os.path.splitext(tmp_path)[1])
+            _move_blob(tmp_path, blob_path)
+        path = os.path.splitext(path)[0] + os.path.splitext(blob_path)[1]
+        _link_blob(blob_path, path)
+        return path
+
+    def get_file_type(self, obj: Any) -> str:
+        """Get the file extension `obj` is going to be saved with.
+
+        Backends that can write objects in more than one format override
+        this function and list the alternative extensions in
+        `extra_file_types`.
+        """
+        return self.file_type
 
-    def save(self, obj: Any, path: str):
-        """Save `obj` to file."""
+    def save(self, obj: Any, path: str) -> Optional[str]:
+        """Save `obj` to file.
+
+        Backends that, depending on the object, need to write a format other
+        than the one implied by `path`, return the path they actually wrote
+        to. Its extension must be one of the backend's file types.
+        """
         self._default_save(obj, path)
 
+    def content_hash(self, obj: Any) -> Optional[str]:
+        """Compute a digest that identifies the content of `obj`.
+
+        The content-addressed store uses this digest to name the blobs.
+        Specialized backends can override this function to hash the object's
+        buffers directly, without serializing it first. By default, None is
+        returned and the object is hashed while it is saved (see
+        `_save_and_hash`).
+        """
+        return None
+
+    def _save_and_hash(self, obj: Any, path: str) -> Tuple[str, str]:
+        """Save `obj` and compute the digest of its serialized content.
+
+        Objects serialized with dill are hashed while they are streamed to
+        the file, the files written by specialized backends are hashed once
+        they are written.
+
+        Returns: The path the object was saved to (see `save`) and the digest
+        """
+        if type(self).save is MarshalBackend.save:
+            return path, self._default_save(obj, path, hashed=True)
+        path = self._save_or_fallback(obj, path)
+        return path, _hash_path(path)
+
     @staticmethod
-    def _default_save(obj: Any, path: str):
+    def _default_save(obj: Any, path: str,
+                      hashed: bool = False) -> Optional[str]:
         import dill
-        with open(path, "wb") as f:
-            dill.dump(obj, f)
-
-    def wrapped_load(self, name: str) -> Any:
+        with compression.open_write(path, *get_codec()) as f:
+            if not hashed:
+                dill.dump(obj, f)
+                return None
+            writer = _HashingWriter(f)
+            dill.dump(obj, writer)
+            return writer.hexdigest()
+
+    def wrapped_load(self, name: str, file_type: str = None,
+                     columns: Optional[List[str]] = None) -> Any:
         """Wrapper around the public `load` function.
 
         This function provides common logging and exception handling for every
         class that extends the base `MarshalBackend`. `Dispatcher` calls
         directly this function instead of `load`.
+
+        Args:
+            name: The name of the serialized object
+            file_type: The extension of the file to be restored. Defaults to
+                the backend's `file_type`.
+            columns: Restore just these columns, if the backend supports
+                column projection (see `supports_columns`).
         """
-        abs_path = os.path.join(get_data_dir(), name + "." + self.file_type)
+        abs_path = os.path.join(get_data_dir(),
+                                name + "." + (file_type or self.file_type))
         log.info("Loading %s file using %s: %s",
                  self.display_name, self.name, name)
+        with stats.measure("load", name, self.display_name) as record:
+            if record is not None:
+                record["file_type"] = file_type or self.file_type
+                record["bytes"] = _get_size(abs_path)
+            return self._load_or_fallback(abs_path, columns)
+
+    def _load_or_fallback(self, abs_path: str,
+                          columns: Optional[List[str]] = None) -> Any:
         try:
+            if columns is not None and self.supports_columns:
+                return self.load(abs_path, columns=columns)
             return self.load(abs_path)
         except ImportError as e:
             if not self.fallback_on_missing_lib:
@@ -126,7 +605,8 @@ class MarshalBackend(object):
     @staticmethod
     def _default_load(file_path: str) -> Any:
         import dill
-        return dill.load(open(file_path, "rb"))
+        with compression.open_read(file_path) as f:
+            return dill.load(f)
 
 
 dispatcher = None
@@ -176,6 +656,11 @@ class Dispatcher(object):
 
     def __init__(self):
         self.backends: Dict[str, MarshalBackend] = dict()
+        self._default_backend = MarshalBackend()
+        # precompiled `obj_type_regex` of every backend
+        self._obj_type_regexes: Dict[MarshalBackend, re.Pattern] = dict()
+        # backend resolved for every type that has been dispatched
+        self._type_cache = weakref.WeakKeyDictionary()
 
     def register(self, cls: Type[MarshalBackend]) -> Type[MarshalBackend]:
         """Register a new marshalling backend.
@@ -186,12 +671,17 @@ class Dispatcher(object):
         Returns: the class itself
         """
         if cls.__name__ not in self.backends:
-            self.backends[cls.__name__] = cls()
+            backend = cls()
+            self.backends[cls.__name__] = backend
+            if backend.obj_type_regex:
+                self._obj_type_regexes[backend] = re.compile(
+                    backend.obj_type_regex)
+            self._type_cache.clear()
         return cls
 
     def get_backend(self, obj: Any):
         """Get the backend registered for the input object type."""
-        return self._dispatch_obj_type(obj)
+        return self._dispatch_obj_type(unwrap(obj))
 
     def get_backends(self) -> Dict[str, MarshalBackend]:
         """Get all registered backends."""
@@ -211,35 +701,196 @@ class Dispatcher(object):
             obj_name: Name of the object to be saved
         """
         try:
-            return self._dispatch_obj_type(obj).wrapped_save(obj, obj_name)
+            return self._save(obj, obj_name)
         except Exception as e:
-            error_msg = ("During data passing, Kale could not marshal the"
-                         " following object:\n\n  - path: '%s'\n  - type: '%s'"
-                         % (obj_name, type(obj)))
-            log.error(error_msg + self.END_USER_EXC_MSG % e)
-            log.debug("Original Traceback", exc_info=e.__traceback__)
+            self._log_save_error(obj, obj_name, e)
             utils.graceful_exit(1)
 
-    def load(self, basename: str):
+    def save_many(self, objs: Dict[str, Any]) -> Dict[str, str]:
+        """Save multiple objects to file, concurrently.
+
+        Objects whose backends are safe to run concurrently (see
+        `MarshalBackend.concurrency_safe`) are saved using a pool of threads
+        (see `set_max_workers`), the others are saved one at a time. All the
+        objects are attempted even if some fail, and errors are reported for
+        each one of them.
+
+        Args:
+            objs: A dict mapping names to the objects to be marshalled
+
+        Returns: A dict mapping names to the saved files
+        """
+        tasks = dict()
+        for obj_name, obj in objs.items():
+            if is_resolved(obj):
+                backend = self._dispatch_obj_type(unwrap(obj))
+            else:
+                # don't load the object just to find out its backend
+                backend = self._dispatch_file_type(get_source(obj))
+            tasks[obj_name] = (backend, functools.partial(self._save, obj,
+                                                          obj_name))
+        results, errors = self._run_tasks(tasks)
+        for obj_name, e in errors.items():
+            self._log_save_error(objs[obj_name], obj_name, e)
+        if errors:
+            utils.graceful_exit(1)
+        return {obj_name: results[obj_name] for obj_name in objs}
+
+    def _save(self, obj: Any, obj_name: str):
+        if isinstance(obj, LazyObject):
+            if not is_resolved(obj):
+                # The object was never used, there is no need to restore it
+                # just to write it back where it was loaded from.
+                source = get_source(obj)
+                if (os.path.splitext(os.path.abspath(source))[0]
+                        == os.path.abspath(os.path.join(get_data_dir(),
+                                                        obj_name))):
+                    log.info("%s was not used. Skipping save.", obj_name)
+                    return source
+            obj = unwrap(obj)
+        return self._dispatch_obj_type(obj).wrapped_save(obj, obj_name)
+
+    def _log_save_error(self, obj: Any, obj_name: str, e: Exception):
+        error_msg = ("During data passing, Kale could not marshal the"
+                     " following object:\n\n  - path: '%s'\n  - type: '%s'"
+                     % (obj_name, type(obj)))
+        log.error(error_msg + self.END_USER_EXC_MSG % e)
+        log.debug("Original Traceback", exc_info=e.__traceback__)
+
+    def load(self, basename: str, columns: Optional[List[str]] = None,
+             lazy: bool = False):
         """Restore a file to memory.
 
         Args:
             basename: The name of the serialized object to be loaded
+            columns: Restore just these columns of a tabular object. The
+                argument is ignored by backends that do not support column
+                projection.
+            lazy: Return a `LazyObject` proxy that restores the object the
+                first time it is used. The file is looked up right away, so
+                that missing objects are still reported by this call.
 
         Returns: restored object
         """
         try:
-            entry_name = self._unique_ls(basename)
-            return self._dispatch_file_type(entry_name).wrapped_load(basename)
+            return self._load(basename, columns=columns, lazy=lazy)
         except Exception as e:
-            error_msg = ("During data passing, Kale could not load the"
-                         " following file:\n\n\n  - name: '%s'" % basename)
-            log.error(error_msg + self.END_USER_EXC_MSG % e)
-            log.debug("Original Traceback", exc_info=e.__traceback__)
+            self._log_load_error(basename, e)
+            utils.graceful_exit(1)
+
+    def load_many(self, basenames: List[str],
+                  columns: Dict[str, List[str]] = None,
+                  lazy: bool = False) -> Dict[str, Any]:
+        """Restore multiple files to memory, concurrently.
+
+        Files whose backends are safe to run concurrently (see
+        `MarshalBackend.concurrency_safe`) are loaded using a pool of threads
+        (see `set_max_workers`), the others are loaded one at a time. All the
+        files are attempted even if some fail, and errors are reported for
+        each one of them.
+
+        Args:
+            basenames: The names of the serialized objects to be loaded
+            columns: A dict mapping names to the columns to be restored (see
+                `load`)
+            lazy: Return `LazyObject` proxies (see `load`)
+
+        Returns: A dict mapping names to the restored objects
+        """
+        columns = columns or dict()
+        tasks, errors = dict(), dict()
+        for basename in basenames:
+            try:
+                backend = (MarshalBackend() if lazy else
+                           self._dispatch_file_type(self._unique_ls(basename)))
+            except Exception as e:
+                errors[basename] = e
+                continue
+            tasks[basename] = (backend, functools.partial(
+                self._load, basename, columns=columns.get(basename),
+                lazy=lazy))
+        # creating proxies is cheap, there is no need for threads
+        results, task_errors = self._run_tasks(tasks, concurrent=not lazy)
+        errors.update(task_errors)
+        for basename in basenames:
+            if basename in errors:
+                self._log_load_error(basename, errors[basename])
+        if errors:
             utils.graceful_exit(1)
+        return {basename: results[basename] for basename in basenames}
+
+    def _load(self, basename: str, columns: Optional[List[str]] = None,
+              lazy: bool = False):
+        entry_name = self._unique_ls(basename)
+        file_type = os.path.splitext(entry_name)[1].lstrip(".")
+        if lazy:
+            return LazyObject(
+                lambda: self.load(basename, columns=columns),
+                source=os.path.join(get_data_dir(), entry_name))
+        return (self._dispatch_file_type(entry_name)
+                .wrapped_load(basename, file_type, columns=columns))
+
+    def _log_load_error(self, basename: str, e: Exception):
+        error_msg = ("During data passing, Kale could not load the"
+                     " following file:\n\n\n  - name: '%s'" % basename)
+        log.error(error_msg + self.END_USER_EXC_MSG % e)
+        log.debug("Original Traceback", exc_info=e.__traceback__)
+
+    @staticmethod
+    def _run_tasks(tasks: Dict[str, Tuple[MarshalBackend, Callable]],
+                   concurrent: bool = True) -> Tuple[Dict, Dict]:
+        """Run marshalling tasks, concurrently when their backend allows it.
+
+        Args:
+            tasks: A dict mapping object names to their backend and to the
+                function that marshals them
+            concurrent: Set to False to run all the tasks sequentially
+
+        Returns: A tuple with two dicts, mapping object names to the results
+            of the tasks and to the exceptions they raised, respectively
+        """
+        results, errors = dict(), dict()
+        pooled = {name: fn for name, (backend, fn) in tasks.items()
+                  if concurrent and backend.concurrency_safe}
+        if len(pooled) < 2 or get_max_workers() < 2:
+            pooled = dict()
+        sequential = {name: fn for name, (_, fn) in tasks.items()
+                      if name not in pooled}
+
+        pool = None
+        if pooled:
+            pool = ThreadPoolExecutor(
+                max_workers=min(get_max_workers(), len(pooled)),
+                thread_name_prefix="kale-marshal")
+        try:
+            futures = {name: pool.submit(fn) for name, fn in pooled.items()}
+            # run the sequential tasks while the pool is busy
+            for name, fn in sequential.items():
+                try:
+                    results[name] = fn()
+                except Exception as e:
+                    errors[name] = e
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    errors[name] = e
+        finally:
+            if pool:
+                pool.shutdown()
+        return results, errors
 
     @staticmethod
     def _unique_ls(basename: str):
+        # look up the file in the index first, it takes a single read
+        # instead of listing and stat-ing the whole data directory.
+        entry = read_index_entry(basename)
+        if (entry and os.path.lexists(os.path.join(get_data_dir(),
+                                                   entry["file"]))):
+            return entry["file"]
+        if entry:
+            log.info("Index entry for '%s' is stale, scanning %s", basename,
+                     get_data_dir())
         # get the unique file/folder inside _DATA_DIR: there could be
         # multiple files with the same name and different extension.
         entries = [ls for ls in os.listdir(get_data_dir())
@@ -252,7 +903,7 @@ class Dispatcher(object):
             log.info("Looking for unique file/folder with basename '%s' in %s",
                      basename, get_data_dir())
             raise ValueError("No file or folder found with basename '%s' in %s"
-                             % basename, get_data_dir())
+                             % (basename, get_data_dir()))
         if len(entries) > 1:
             raise ValueError("Found multiple files/folders with name %s: %s"
                              % (basename, entries))
@@ -261,30 +912,38 @@ class Dispatcher(object):
     def _dispatch_obj_type(self, obj: Any) -> MarshalBackend:
         """Dispatch to a backend based on the object's type matching regex.
 
+        The backend resolved for a type is cached, so the regexes are matched
+        just once per type.
+
         Args:
             obj: any Python object
         """
-        # object types are printed as <class 'obj type'>
-        _type = re.sub(r"'>$", "",
-                       re.sub(r"^<class '", "",
-                              str(type(obj))))
-        # type of base class
-        _type_base = re.sub(r"'>$", "",
-                            re.sub(r"^<class '", "",
-                                   str(obj.__class__.__bases__[0])))
-        _backends = [backend for backend in self.backends.values()
-                     if re.match(backend.obj_type_regex, _type)
-                     or re.match(backend.obj_type_regex, _type_base)]
-        if len(_backends) > 1:
-            raise RuntimeError("Too many matching marshalling backends for"
-                               " object type %s (base type %s): %s"
-                               % (_type, _type_base, _backends))
-        if not _backends:
-            log.debug("No backends found for type %s (%s). Falling back to"
-                      " default backend." % (_type, _type_base))
-            return MarshalBackend()
-        else:
-            return _backends[0]
+        _type = type(obj)
+        try:
+            return self._type_cache[_type]
+        except KeyError:
+            pass
+        backend = self._resolve_obj_type(_type)
+        self._type_cache[_type] = backend
+        return backend
+
+    def _resolve_obj_type(self, _type: type) -> MarshalBackend:
+        """Match the type, and then its base classes in MRO order."""
+        for _cls in _type.__mro__:
+            type_name = _get_type_name(_cls)
+            _backends = [backend for backend, regex
+                         in self._obj_type_regexes.items()
+                         if regex.match(type_name)]
+            if len(_backends) > 1:
+                raise RuntimeError("Too many matching marshalling backends"
+                                   " for object type %s (%s): %s"
+                                   % (_get_type_name(_type), type_name,
+                                      _backends))
+            if _backends:
+                return _backends[0]
+        log.debug("No backends found for type %s. Falling back to default"
+                  " backend.", _get_type_name(_type))
+        return self._default_backend
 
     def _dispatch_file_type(self, filename: str) -> MarshalBackend:
         """Dispatch to a backend based on the matching file type.
@@ -296,9 +955,11 @@ class Dispatcher(object):
         Args:
             filename (str): filename whose extension must be matched.
         """
+        file_type = os.path.splitext(filename)[1].lstrip(".")
         _backends = [
             backend for backend in self.backends.values()
-            if os.path.splitext(filename)[1].lstrip(".") == backend.file_type]
+            if file_type == backend.file_type
+            or file_type in backend.extra_file_types]
         if len(_backends) > 1:
             raise RuntimeError("Too many matching marshalling backends for"
                                " file %s : %s" % (os.path.basename(filename),
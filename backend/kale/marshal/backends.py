@@ -1,9 +1,20 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright (c) 2019–2025 The Kale Contributors.
 
+import os
+import json
+import shutil
+import hashlib
 import logging
+import functools
+import importlib.util
 
-from kale.marshal.backend import get_dispatcher, MarshalBackend
+from kale.common import utils
+from kale.marshal import compression
+from kale.marshal.chunked import ChunkedArtifact, write_manifest
+from kale.marshal.backend import (get_dispatcher, get_mmap_mode, get_codec,
+                                  get_dataframe_format, materialize_blob_link,
+                                  MarshalBackend)
 
 
 log = logging.getLogger(__name__)
@@ -12,6 +23,21 @@ log = logging.getLogger(__name__)
 register_backend = get_dispatcher().register
 
 
+def _n_threads():
+    return os.cpu_count() or 1
+
+
+@functools.lru_cache(maxsize=None)
+def _has_pyarrow() -> bool:
+    """Whether pyarrow is installed, warning just once when it is not."""
+    if importlib.util.find_spec("pyarrow") is not None:
+        return True
+    log.warning("Columnar formats require pyarrow (install"
+                " 'kubeflow-kale[columnar]'). Pandas objects will be"
+                " pickled.")
+    return False
+
+
 @register_backend
 class FunctionBackend(MarshalBackend):
     """Marshal Python functions."""
@@ -60,28 +86,316 @@ class NumpyBackend(MarshalBackend):
         np.save(path, obj)
 
     def load(self, file_path):
-        """Restore a Numpy object."""
+        """Restore a Numpy object.
+
+        Arrays are memory-mapped when a mmap mode is set (see
+        `kale.marshal.set_mmap_mode`).
+        """
+        import numpy as np
+        mmap_mode = get_mmap_mode()
+        if mmap_mode == "r+":
+            # writes to the map must not reach a shared blob
+            materialize_blob_link(file_path)
+        return np.load(file_path, mmap_mode=mmap_mode)
+
+    def content_hash(self, obj):
+        """Hash the array's buffer without serializing it."""
         import numpy as np
-        return np.load(file_path)
+        arr = np.asarray(obj)
+        if arr.dtype.hasobject:
+            return super().content_hash(obj)
+        # `descr` keeps the field names of structured arrays
+        h = hashlib.sha256(repr((arr.dtype.descr, arr.shape)).encode())
+        h.update(np.ascontiguousarray(arr).data)
+        return h.hexdigest()
 
 
 @register_backend
 class PandasBackend(MarshalBackend):
-    """Marshal Pandas objects."""
+    """Marshal Pandas objects.
+
+    Objects are saved in a columnar format, Arrow IPC (Feather V2) by default,
+    or Parquet (see `kale.marshal.set_dataframe_format`). Columnar files are
+    written and read using multiple threads and can be loaded partially,
+    restoring just the requested columns.
+
+    Objects that would not be restored exactly from Arrow are pickled: those
+    with object columns or index levels (Arrow would infer the type of their
+    values, e.g. lists become arrays), Series named after something other
+    than a JSON scalar, and objects whose column types would change. When
+    memory mapping is enabled
+    (see `kale.marshal.set_mmap_mode`), objects are always saved as
+    uncompressed Feather files, so that they can be loaded with zero copies
+    from a memory-mapped file.
+    """
     name = "Pandas backend"
     display_name = "pandas"
-    file_type = "pdpkl"
+    file_type = "feather"
+    extra_file_types = ("parquet", "pdpkl")
     obj_type_regex = r"pandas\..*(DataFrame|Series)"
+    supports_columns = True
+
+    # Arrow schema metadata used to restore Series objects
+    _SERIES_METADATA_KEY = b"kale.series_name"
+    _SERIES_COLUMN = "__kale_series__"
+
+    def get_file_type(self, obj):
+        """Get the extension of the configured data frame format."""
+        fmt, _ = get_dataframe_format()
+        if get_mmap_mode() is not None:
+            fmt = "feather"
+        if fmt == "pickle" or not _has_pyarrow():
+            return "pdpkl"
+        return fmt
 
     def save(self, obj, path):
         """Save a Pandas object."""
         import pandas as pd  # noqa: F401
-        obj.to_pickle(path)
+        if path.endswith((".feather", ".parquet")):
+            reason = self._get_pickle_reason(obj)
+            table = None
+            if reason is None:
+                try:
+                    table = self._to_arrow(obj)
+                    reason = self._get_round_trip_error(obj, table)
+                except Exception as e:
+                    # Arrow raises several exception types (ArrowInvalid,
+                    # ArrowTypeError, ValueError for duplicate column
+                    # names...)
+                    log.warning("Could not convert %s to Arrow (%s)."
+                                " Falling back to pickle.",
+                                type(obj).__name__, e)
+                    reason = str(e)
+            if reason is None:
+                self._write_table(table, path)
+                return path
+            log.debug("Pickling %s: %s", type(obj).__name__, reason)
+            path = os.path.splitext(path)[0] + ".pdpkl"
+        with compression.open_write(path, *get_codec()) as f:
+            obj.to_pickle(f, compression=None)
+        return path
+
+    def load(self, file_path, columns=None):
+        """Restore a Pandas object.
+
+        Args:
+            file_path: Path to the serialized object
+            columns: Restore just these columns of a DataFrame. Columnar files
+                read just the requested columns from disk.
+        """
+        import pandas as pd
+        if file_path.endswith((".feather", ".parquet")):
+            return self._load_columnar(file_path, columns)
+        with compression.open_read(file_path) as f:
+            obj = pd.read_pickle(f, compression=None)
+        if columns is not None and isinstance(obj, pd.DataFrame):
+            obj = obj[columns]
+        return obj
 
-    def load(self, file_path):
-        """Restore a Pandas object."""
+    @staticmethod
+    def _get_dtypes(obj):
+        """Get the dtypes of the columns and of the index levels of `obj`."""
+        import pandas as pd
+        dtypes = (list(obj.dtypes) if isinstance(obj, pd.DataFrame)
+                  else [obj.dtype])
+        index = obj.index
+        dtypes.extend(index.dtypes if isinstance(index, pd.MultiIndex)
+                      else [index.dtype])
+        return dtypes
+
+    def _get_pickle_reason(self, obj):
+        """Get why `obj` must be pickled, None if Arrow can store it."""
+        import pandas as pd
+        if any(pd.api.types.is_object_dtype(dtype)
+               for dtype in self._get_dtypes(obj)):
+            return "object columns are converted to Arrow types"
+        if isinstance(obj, pd.Series) and not (
+                obj.name is None
+                or type(obj.name) in (bool, int, float, str)):
+            return "the name of the Series is not a JSON scalar"
+        return None
+
+    def _get_round_trip_error(self, obj, table):
+        """Check that `table` restores the structure of `obj`.
+
+        Returns: A description of the difference, None if there is none
+        """
+        import pandas as pd
+        restored = table.slice(0, 0).to_pandas()
+        if isinstance(obj, pd.Series):
+            restored = restored[self._SERIES_COLUMN]
+        elif not restored.columns.equals(obj.columns):
+            return "the columns would change"
+        restored_dtypes = self._get_dtypes(restored)
+        dtypes = self._get_dtypes(obj)
+        if restored_dtypes != dtypes:
+            return "the dtypes would change from %s to %s" % (
+                dtypes, restored_dtypes)
+        if list(restored.index.names) != list(obj.index.names):
+            return "the index names would change"
+        return None
+
+    def _to_arrow(self, obj):
         import pandas as pd
-        return pd.read_pickle(file_path)
+        import pyarrow as pa
+
+        if isinstance(obj, pd.Series):
+            table = pa.Table.from_pandas(
+                obj.to_frame(name=self._SERIES_COLUMN), nthreads=_n_threads())
+            return table.replace_schema_metadata({
+                **table.schema.metadata,
+                self._SERIES_METADATA_KEY: json.dumps(obj.name).encode()})
+        return pa.Table.from_pandas(obj, nthreads=_n_threads())
+
+    @staticmethod
+    def _write_table(table, path):
+        fmt, compression = get_dataframe_format()
+        if get_mmap_mode() is not None and compression is not None:
+            # compressed buffers cannot be memory-mapped
+            compression = None
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            pq.write_table(table, path, compression=compression or "none")
+        else:
+            from pyarrow import feather
+            if fmt != "feather":
+                # the codec was configured for another format
+                compression = None
+            # pyarrow would compress Feather files with lz4 by default
+            feather.write_feather(table, path,
+                                  compression=compression or "uncompressed")
+
+    def _load_columnar(self, file_path, columns=None):
+        mmap = get_mmap_mode() is not None
+        if file_path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            schema = pq.read_schema(file_path)
+            read_columns = self._with_index_columns(schema, columns)
+            table = pq.read_table(file_path, columns=read_columns,
+                                  memory_map=mmap, use_threads=True)
+        else:
+            import pyarrow as pa
+            from pyarrow import feather
+            with pa.OSFile(file_path, "rb") as f:
+                schema = pa.ipc.open_file(f).schema
+            read_columns = self._with_index_columns(schema, columns)
+            # With memory mapping, columns are backed by the mapped file,
+            # which is paged in only when the data is actually accessed.
+            table = feather.read_table(file_path, columns=read_columns,
+                                       memory_map=mmap, use_threads=True)
+        obj = table.to_pandas(split_blocks=True, use_threads=True)
+        metadata = schema.metadata or {}
+        if self._SERIES_METADATA_KEY in metadata:
+            obj = obj[self._SERIES_COLUMN]
+            obj.name = json.loads(metadata[self._SERIES_METADATA_KEY])
+        elif columns is not None:
+            # Arrow returns the columns in the file order
+            obj = obj[list(columns)]
+        return obj
+
+    def _with_index_columns(self, schema, columns):
+        """Add the index columns to the columns to be read from a file."""
+        if columns is None or not all(isinstance(c, str) for c in columns):
+            # Arrow stores column names as strings and interprets integers as
+            # positions. Read everything and let pandas select the columns.
+            return None
+        metadata = schema.metadata or {}
+        if self._SERIES_METADATA_KEY in metadata:
+            # Series are stored as a single column, always read everything
+            return None
+        if not set(columns) <= set(schema.names):
+            # e.g., top level names of MultiIndex columns
+            return None
+        pandas_metadata = schema.pandas_metadata or {}
+        # RangeIndexes are stored as metadata (dicts), not as columns
+        index_columns = [c for c in pandas_metadata.get("index_columns", [])
+                         if isinstance(c, str)]
+        return list(dict.fromkeys(list(columns) + index_columns))
+
+    def content_hash(self, obj):
+        """Hash the object's values, index and schema.
+
+        `hash_pandas_object` hashes the values of object columns by their
+        string representation, e.g. `1` and `"1"` get the same hash, so
+        objects with object columns (or index levels) are hashed serialized.
+        """
+        import pandas as pd
+        if any(pd.api.types.is_object_dtype(dtype)
+               for dtype in self._get_dtypes(obj)):
+            return super().content_hash(obj)
+        try:
+            row_hashes = pd.util.hash_pandas_object(obj, index=True)
+        except TypeError:
+            # e.g., object columns holding unhashable values
+            return super().content_hash(obj)
+        if isinstance(obj, pd.DataFrame):
+            schema = (list(obj.columns), list(obj.dtypes))
+        else:
+            schema = (obj.name, obj.dtype)
+        h = hashlib.sha256(repr((type(obj).__name__, list(obj.index.names),
+                                 obj.index.dtype, schema)).encode())
+        h.update(row_hashes.values.tobytes())
+        return h.hexdigest()
+
+
+@register_backend
+class ChunkedBackend(MarshalBackend):
+    """Marshal generators and streams of chunks.
+
+    Chunks are consumed and saved one at a time into a folder, along with a
+    manifest, so that objects larger than the available memory can be
+    marshalled. The folder is restored as a `ChunkedArtifact`, which loads
+    the chunks lazily while it is iterated.
+    """
+    name = "Chunked backend"
+    display_name = "chunked"
+    file_type = "chunks"
+    obj_type_regex = (r"(generator|pandas\..*TextFileReader"
+                      r"|kale\.marshal\.chunked\.ChunkedArtifact)$")
+    # Consuming a generator runs user code, which might not be thread safe
+    concurrency_safe = False
+
+    def save(self, obj, path):
+        """Save the chunks of an iterable into the `path` folder."""
+        tmp_path = "%s.tmp-%s" % (path, utils.random_string())
+        if isinstance(obj, ChunkedArtifact):
+            # The chunks are already serialized, just copy them
+            shutil.copytree(obj.path, tmp_path)
+        else:
+            os.makedirs(tmp_path)
+            try:
+                write_manifest(tmp_path, self._save_chunks(obj, tmp_path))
+            except BaseException:
+                utils.rm_r(tmp_path)
+                raise
+        if os.path.lexists(path):
+            utils.rm_r(path)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _save_chunks(obj, path):
+        chunks = []
+        for i, chunk in enumerate(obj):
+            backend = get_dispatcher().get_backend(chunk)
+            chunk_path = os.path.join(path, "chunk-%06d.%s"
+                                      % (i, backend.get_file_type(chunk)))
+            chunk_path = backend._save_or_fallback(chunk, chunk_path)
+            chunks.append(os.path.basename(chunk_path))
+            log.debug("Saved chunk %d of %s to %s", i, type(obj).__name__,
+                      chunk_path)
+        return chunks
+
+    def load(self, file_path):
+        """Restore a `ChunkedArtifact` that loads the chunks lazily."""
+        return ChunkedArtifact(file_path)
+
+    def content_hash(self, obj):
+        """Chunks are not available before being consumed.
+
+        The content-addressed store hashes the saved folder instead.
+        """
+        raise TypeError("Chunked objects cannot be hashed before being"
+                        " saved")
 
 
 @register_backend
@@ -130,6 +444,8 @@ class PyTorchBackend(MarshalBackend):
     display_name = "pytorch"
     file_type = "pt"
     obj_type_regex = r"torch\.nn\.modules\.module\.Module"
+    # TorchScript compilation is not thread safe
+    concurrency_safe = False
 
     def save(self, obj, path):
         """Save a PyTorch object."""
@@ -161,6 +477,8 @@ class KerasBackend(MarshalBackend):
     display_name = "keras"
     file_type = "keras"
     obj_type_regex = r"keras\..*"
+    # Keras models share global (graph, session) state
+    concurrency_safe = False
 
     def save(self, obj, path):
         """Save a Keras object."""
@@ -181,6 +499,8 @@ class TensorflowKerasBackend(MarshalBackend):
     file_type = "tfkeras"
     obj_type_regex = r"tensorflow\.python\.keras.*"
     predictor_type = "tensorflow"
+    # Keras models share global (graph, session) state
+    concurrency_safe = False
 
     def save(self, obj, path):
         """Save a Tensorflow Keras object."""
@@ -0,0 +1,70 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2019–2025 The Kale Contributors.
+
+import os
+import json
+
+from typing import Any, Dict, Iterator, List
+
+MANIFEST_NAME = "manifest.json"
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    """Read the manifest of a chunked artifact folder."""
+    with open(os.path.join(path, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def write_manifest(path: str, chunks: List[str]):
+    """Write the manifest of a chunked artifact folder.
+
+    Args:
+        path: The artifact folder
+        chunks: The chunks' file names, in order
+    """
+    with open(os.path.join(path, MANIFEST_NAME), "w") as f:
+        json.dump({"chunks": chunks}, f)
+
+
+class ChunkedArtifact(object):
+    """A sequence of chunks stored on disk, loaded one at a time.
+
+    Steps that produce generators (or other streams of chunks, e.g. pandas'
+    `read_csv(..., chunksize=N)` readers) are marshalled chunk by chunk.
+    Downstream steps receive a `ChunkedArtifact`, which can be iterated any
+    number of times and keeps at most one chunk in memory at a time:
+
+    ```
+    for chunk in chunks:
+        process(chunk)
+    ```
+
+    Each chunk is saved with the backend that handles its type, so chunks of
+    arrays and data frames benefit from the numpy and columnar formats.
+    """
+
+    def __init__(self, path: str):
+        """Open the chunked artifact stored in the `path` folder."""
+        self.path = path
+        self.chunks: List[str] = read_manifest(path)["chunks"]
+
+    def __len__(self):
+        """Get the number of chunks."""
+        return len(self.chunks)
+
+    def __iter__(self) -> Iterator[Any]:
+        """Load the chunks one at a time."""
+        for i in range(len(self.chunks)):
+            yield self[i]
+
+    def __getitem__(self, index: int) -> Any:
+        """Load a single chunk."""
+        from kale.marshal.backend import get_dispatcher
+        chunk_path = os.path.join(self.path, self.chunks[index])
+        return (get_dispatcher()._dispatch_file_type(chunk_path)
+                .load(chunk_path))
+
+    def __repr__(self):
+        """Represent the artifact without loading its chunks."""
+        return "<%s of %d chunks at %s>" % (type(self).__name__,
+                                            len(self.chunks), self.path)
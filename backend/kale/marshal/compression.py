@@ -0,0 +1,158 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2019–2025 The Kale Contributors.
+
+import io
+import os
+import logging
+import contextlib
+
+from typing import IO, Dict, Iterator, Optional
+
+from kale.marshal import stats
+
+log = logging.getLogger(__name__)
+
+
+class Codec(object):
+    """Base class for streaming compression codecs.
+
+    Codecs wrap binary file objects, so that backends can serialize objects
+    directly into a compressed stream, without building the uncompressed
+    payload in memory.
+
+    A codec is identified by the following class attributes:
+
+    * `name`: The name used to configure the codec.
+    * `magic`: The leading bytes of the codec's frames. It is used to detect
+               the codec a file was compressed with.
+    """
+    name: str = None
+    magic: bytes = None
+
+    def writer(self, f: IO[bytes], level: Optional[int] = None) -> IO[bytes]:
+        """Wrap `f` with a stream that compresses what is written to it."""
+        raise NotImplementedError
+
+    def reader(self, f: IO[bytes]) -> IO[bytes]:
+        """Wrap `f` with a stream that decompresses what is read from it."""
+        raise NotImplementedError
+
+
+class GzipCodec(Codec):
+    """Gzip codec, available in the standard library."""
+    name = "gzip"
+    magic = b"\x1f\x8b"
+
+    def writer(self, f, level=None):
+        """Compress with `gzip` (level 1 by default, favoring speed)."""
+        import gzip
+        return gzip.GzipFile(fileobj=f, mode="wb",
+                             compresslevel=1 if level is None else level)
+
+    def reader(self, f):
+        """Decompress with `gzip`."""
+        import gzip
+        return gzip.GzipFile(fileobj=f, mode="rb")
+
+
+class ZstdCodec(Codec):
+    """Zstandard codec, requires the `zstandard` library."""
+    name = "zstd"
+    magic = b"\x28\xb5\x2f\xfd"
+
+    def writer(self, f, level=None):
+        """Compress with `zstandard`, using multiple threads."""
+        import zstandard
+        compressor = zstandard.ZstdCompressor(
+            level=3 if level is None else level, threads=-1)
+        return compressor.stream_writer(f, closefd=False)
+
+    def reader(self, f):
+        """Decompress with `zstandard`."""
+        import zstandard
+        # pickle reads in small chunks, buffer them to avoid the overhead
+        return io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(f, closefd=False))
+
+
+class LZ4Codec(Codec):
+    """LZ4 frame codec, requires the `lz4` library."""
+    name = "lz4"
+    magic = b"\x04\x22\x4d\x18"
+
+    def writer(self, f, level=None):
+        """Compress with `lz4.frame`."""
+        import lz4.frame
+        return lz4.frame.LZ4FrameFile(f, mode="wb",
+                                      compression_level=level or 0)
+
+    def reader(self, f):
+        """Decompress with `lz4.frame`."""
+        import lz4.frame
+        return lz4.frame.LZ4FrameFile(f, mode="rb")
+
+
+CODECS: Dict[str, Codec] = {codec.name: codec
+                            for codec in (GzipCodec(), ZstdCodec(),
+                                          LZ4Codec())}
+_MAGIC_LENGTH = max(len(codec.magic) for codec in CODECS.values())
+
+
+def _match_magic(header: bytes) -> Optional[str]:
+    for codec in CODECS.values():
+        if header.startswith(codec.magic):
+            return codec.name
+    return None
+
+
+def detect(path: str) -> Optional[str]:
+    """Detect the codec a file was compressed with, using its magic bytes.
+
+    Returns None for uncompressed files and folders.
+    """
+    if os.path.isdir(path):
+        return None
+    with open(path, "rb") as f:
+        return _match_magic(f.read(_MAGIC_LENGTH))
+
+
+@contextlib.contextmanager
+def open_write(path: str, codec: Optional[str] = None,
+               level: Optional[int] = None) -> Iterator[IO[bytes]]:
+    """Open a file for writing, compressing it with `codec`.
+
+    If the library that implements the codec is not installed, the file is
+    written uncompressed.
+    """
+    with open(path, "wb") as f:
+        f = stats.timed(f)
+        if codec is None:
+            yield f
+            return
+        try:
+            stream = CODECS[codec].writer(f, level)
+        except ImportError as e:
+            log.warning("Could not load the %s codec (%s). Writing %s"
+                        " uncompressed.", codec, e, path)
+            yield f
+            return
+        with stream:
+            yield stream
+
+
+@contextlib.contextmanager
+def open_read(path: str) -> Iterator[IO[bytes]]:
+    """Open a file for reading, decompressing it if needed.
+
+    The codec is detected from the file's magic bytes, so files written
+    with any codec, or uncompressed, can be read transparently.
+    """
+    with open(path, "rb") as f:
+        codec = _match_magic(f.read(_MAGIC_LENGTH))
+        f.seek(0)
+        f = stats.timed(f)
+        if codec is None:
+            yield f
+            return
+        with CODECS[codec].reader(f) as stream:
+            yield stream
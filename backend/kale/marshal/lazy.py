@@ -0,0 +1,218 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2019–2025 The Kale Contributors.
+
+import operator
+
+from typing import Any, Callable
+
+_UNRESOLVED = object()
+
+
+def _proxy(fn: Callable) -> Callable:
+    """Create a method that applies `fn` to the resolved object."""
+    def method(self, *args):
+        return fn(self._kale_resolve(), *args)
+    return method
+
+
+def _proxy_binary(op: Callable, reflected: bool = False) -> Callable:
+    """Create a binary operator method, unwrapping a proxied operand."""
+    def method(self, other):
+        other = unwrap(other)
+        if reflected:
+            return op(other, self._kale_resolve())
+        return op(self._kale_resolve(), other)
+    return method
+
+
+def _proxy_inplace(iop: Callable) -> Callable:
+    """Create an in-place operator method.
+
+    The result of the operation is what the proxied name gets re-bound to,
+    so after the first in-place operation the name points to the real
+    object.
+    """
+    def method(self, other):
+        return iop(self._kale_resolve(), unwrap(other))
+    return method
+
+
+class LazyObject(object):
+    """A proxy that restores a marshalled object on first use.
+
+    The proxy behaves like the object it wraps: attribute access, item
+    access, operators, iteration, `isinstance` checks, etc. are forwarded to
+    the wrapped object, which is loaded the first time any of these happens.
+
+    Code that needs the actual object (e.g., C extensions that check the
+    exact type of their arguments) can get it with `unwrap`.
+    """
+    __slots__ = ("_kale_factory", "_kale_source", "_kale_wrapped",
+                 "__weakref__")
+
+    def __init__(self, factory: Callable[[], Any], source: str = None):
+        """Create a new proxy.
+
+        Args:
+            factory: Function that restores the wrapped object
+            source: The path of the file the object is restored from
+        """
+        object.__setattr__(self, "_kale_factory", factory)
+        object.__setattr__(self, "_kale_source", source)
+        object.__setattr__(self, "_kale_wrapped", _UNRESOLVED)
+
+    def _kale_resolve(self):
+        wrapped = object.__getattribute__(self, "_kale_wrapped")
+        if wrapped is _UNRESOLVED:
+            wrapped = object.__getattribute__(self, "_kale_factory")()
+            object.__setattr__(self, "_kale_wrapped", wrapped)
+            object.__setattr__(self, "_kale_factory", None)
+        return wrapped
+
+    # `isinstance` falls back to `__class__` when the type does not match
+    __class__ = property(_proxy(operator.attrgetter("__class__")))
+
+    def __getattr__(self, name):
+        """Forward attribute access to the wrapped object."""
+        return getattr(self._kale_resolve(), name)
+
+    def __setattr__(self, name, value):
+        """Set an attribute of the wrapped object."""
+        setattr(self._kale_resolve(), name, value)
+
+    def __delattr__(self, name):
+        """Delete an attribute of the wrapped object."""
+        delattr(self._kale_resolve(), name)
+
+    def __dir__(self):
+        """List the attributes of the wrapped object."""
+        return dir(self._kale_resolve())
+
+    def __repr__(self):
+        """Represent the wrapped object, without loading it."""
+        if not is_resolved(self):
+            return "<%s of %s (not loaded)>" % (
+                type(self).__name__, object.__getattribute__(
+                    self, "_kale_source"))
+        return repr(self._kale_resolve())
+
+    def __reduce_ex__(self, protocol):
+        """Pickle the wrapped object, not the proxy."""
+        return self._kale_resolve().__reduce_ex__(protocol)
+
+    def __copy__(self):
+        """Copy the wrapped object."""
+        import copy
+        return copy.copy(self._kale_resolve())
+
+    def __deepcopy__(self, memo):
+        """Deep copy the wrapped object."""
+        import copy
+        return copy.deepcopy(self._kale_resolve(), memo)
+
+    def __array__(self, dtype=None, copy=None):
+        """Convert the wrapped object to a numpy array."""
+        import numpy as np
+        if copy:
+            return np.array(self._kale_resolve(), dtype=dtype, copy=True)
+        return np.asarray(self._kale_resolve(), dtype=dtype)
+
+    __str__ = _proxy(str)
+    __bytes__ = _proxy(bytes)
+    __format__ = _proxy(format)
+    __bool__ = _proxy(bool)
+    __hash__ = _proxy(hash)
+    __len__ = _proxy(len)
+    __iter__ = _proxy(iter)
+    __reversed__ = _proxy(reversed)
+    __contains__ = _proxy(operator.contains)
+    __getitem__ = _proxy(operator.getitem)
+    __setitem__ = _proxy(operator.setitem)
+    __delitem__ = _proxy(operator.delitem)
+    __call__ = _proxy(lambda obj, *args: obj(*args))
+    __enter__ = _proxy(lambda obj: obj.__enter__())
+    __exit__ = _proxy(lambda obj, *args: obj.__exit__(*args))
+    __fspath__ = _proxy(lambda obj: obj.__fspath__())
+
+    __neg__ = _proxy(operator.neg)
+    __pos__ = _proxy(operator.pos)
+    __abs__ = _proxy(operator.abs)
+    __invert__ = _proxy(operator.invert)
+    __int__ = _proxy(int)
+    __float__ = _proxy(float)
+    __complex__ = _proxy(complex)
+    __index__ = _proxy(operator.index)
+    __round__ = _proxy(round)
+
+    __eq__ = _proxy_binary(operator.eq)
+    __ne__ = _proxy_binary(operator.ne)
+    __lt__ = _proxy_binary(operator.lt)
+    __le__ = _proxy_binary(operator.le)
+    __gt__ = _proxy_binary(operator.gt)
+    __ge__ = _proxy_binary(operator.ge)
+
+    __add__ = _proxy_binary(operator.add)
+    __sub__ = _proxy_binary(operator.sub)
+    __mul__ = _proxy_binary(operator.mul)
+    __matmul__ = _proxy_binary(operator.matmul)
+    __truediv__ = _proxy_binary(operator.truediv)
+    __floordiv__ = _proxy_binary(operator.floordiv)
+    __mod__ = _proxy_binary(operator.mod)
+    __divmod__ = _proxy_binary(divmod)
+    __pow__ = _proxy_binary(operator.pow)
+    __lshift__ = _proxy_binary(operator.lshift)
+    __rshift__ = _proxy_binary(operator.rshift)
+    __and__ = _proxy_binary(operator.and_)
+    __xor__ = _proxy_binary(operator.xor)
+    __or__ = _proxy_binary(operator.or_)
+
+    __radd__ = _proxy_binary(operator.add, reflected=True)
+    __rsub__ = _proxy_binary(operator.sub, reflected=True)
+    __rmul__ = _proxy_binary(operator.mul, reflected=True)
+    __rmatmul__ = _proxy_binary(operator.matmul, reflected=True)
+    __rtruediv__ = _proxy_binary(operator.truediv, reflected=True)
+    __rfloordiv__ = _proxy_binary(operator.floordiv, reflected=True)
+    __rmod__ = _proxy_binary(operator.mod, reflected=True)
+    __rdivmod__ = _proxy_binary(divmod, reflected=True)
+    __rpow__ = _proxy_binary(operator.pow, reflected=True)
+    __rlshift__ = _proxy_binary(operator.lshift, reflected=True)
+    __rrshift__ = _proxy_binary(operator.rshift, reflected=True)
+    __rand__ = _proxy_binary(operator.and_, reflected=True)
+    __rxor__ = _proxy_binary(operator.xor, reflected=True)
+    __ror__ = _proxy_binary(operator.or_, reflected=True)
+
+    __iadd__ = _proxy_inplace(operator.iadd)
+    __isub__ = _proxy_inplace(operator.isub)
+    __imul__ = _proxy_inplace(operator.imul)
+    __imatmul__ = _proxy_inplace(operator.imatmul)
+    __itruediv__ = _proxy_inplace(operator.itruediv)
+    __ifloordiv__ = _proxy_inplace(operator.ifloordiv)
+    __imod__ = _proxy_inplace(operator.imod)
+    __ipow__ = _proxy_inplace(operator.ipow)
+    __ilshift__ = _proxy_inplace(operator.ilshift)
+    __irshift__ = _proxy_inplace(operator.irshift)
+    __iand__ = _proxy_inplace(operator.iand)
+    __ixor__ = _proxy_inplace(operator.ixor)
+    __ior__ = _proxy_inplace(operator.ior)
+
+
+def is_resolved(obj: Any) -> bool:
+    """Whether `obj` is not a proxy or its object has already been loaded."""
+    if type(obj) is not LazyObject:
+        return True
+    return object.__getattribute__(obj, "_kale_wrapped") is not _UNRESOLVED
+
+
+def get_source(obj: LazyObject) -> str:
+    """Get the path of the file a proxy restores its object from."""
+    return object.__getattribute__(obj, "_kale_source")
+
+
+def unwrap(obj: Any) -> Any:
+    """Get the object wrapped by a `LazyObject`, loading it if needed.
+
+    Objects that are not proxies are returned as they are.
+    """
+    if type(obj) is LazyObject:
+        return obj._kale_resolve()
+    return obj
@@ -0,0 +1,194 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2019–2025 The Kale Contributors.
+
+import os
+import json
+import time
+import logging
+import threading
+import contextlib
+
+from typing import IO, Any, Dict, Iterator, List, Optional
+
+from kale.common import utils
+
+log = logging.getLogger(__name__)
+
+__ENABLED = utils.env_flag("KALE_MARSHAL_IO_STATS")
+
+# Folder, inside the data directory, where the per-step reports are written
+STATS_DIR_NAME = ".kale.stats"
+
+_records: List[Dict[str, Any]] = list()
+_records_lock = threading.Lock()
+# The record of the operation running in the current thread, used by timed
+# files to account for the time spent reading and writing.
+_current = threading.local()
+
+
+def set_enabled(enabled: bool = True):
+    """Enable or disable the collection of marshalling I/O statistics.
+
+    When enabled, every save and load records the backend used, the number
+    of bytes, the total time and the throughput. Backends that write
+    through streams (see `kale.marshal.compression`) also split the time
+    spent serializing (and compressing) objects from the time spent on I/O.
+
+    The default value can be set with the `KALE_MARSHAL_IO_STATS`
+    environment variable.
+    """
+    global __ENABLED
+    __ENABLED = enabled
+
+
+def is_enabled() -> bool:
+    """Whether marshalling I/O statistics are collected."""
+    global __ENABLED  # noqa: F824
+    return __ENABLED
+
+
+def get_records() -> List[Dict[str, Any]]:
+    """Get the statistics collected so far, one record per operation."""
+    with _records_lock:
+        return [dict(r) for r in _records]
+
+
+def reset():
+    """Discard the statistics collected so far."""
+    with _records_lock:
+        _records.clear()
+
+
+@contextlib.contextmanager
+def measure(operation: str, name: str,
+            backend: str) -> Iterator[Optional[Dict[str, Any]]]:
+    """Measure a save or load operation.
+
+    Yields the operation's record, or None when statistics are disabled.
+    The caller is expected to set the `file_type` and `bytes` fields.
+
+    Args:
+        operation: Either 'save' or 'load'
+        name: The name of the marshalled object
+        backend: The display name of the backend
+    """
+    if not is_enabled():
+        yield None
+        return
+    record = {"name": name, "operation": operation, "backend": backend,
+              "file_type": None, "bytes": None, "io_time": None}
+    _current.record = record
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        _current.record = None
+    record["total_time"] = time.perf_counter() - start
+    if record["io_time"] is not None:
+        record["serialize_time"] = record["total_time"] - record["io_time"]
+    else:
+        record["serialize_time"] = None
+    record["throughput"] = (record["bytes"] / record["total_time"]
+                            if record["bytes"] and record["total_time"]
+                            else None)
+    with _records_lock:
+        _records.append(record)
+
+
+class _TimedFile(object):
+    """Wrap a file object to measure the time spent reading or writing."""
+
+    def __init__(self, f: IO[bytes], record: Dict[str, Any]):
+        self._f = f
+        self._record = record
+        record["io_time"] = record["io_time"] or 0.
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._record["io_time"] += time.perf_counter() - start
+
+    def write(self, b):
+        """Write to the wrapped file."""
+        return self._timed(self._f.write, b)
+
+    def read(self, *args):
+        """Read from the wrapped file."""
+        return self._timed(self._f.read, *args)
+
+    def readinto(self, b):
+        """Read from the wrapped file into a buffer."""
+        return self._timed(self._f.readinto, b)
+
+    def readline(self, *args):
+        """Read a line from the wrapped file."""
+        return self._timed(self._f.readline, *args)
+
+    def __getattr__(self, name):
+        """Forward any other attribute to the wrapped file."""
+        return getattr(self._f, name)
+
+
+def timed(f: IO[bytes]) -> IO[bytes]:
+    """Account the I/O on `f` to the operation running in this thread."""
+    record = getattr(_current, "record", None)
+    if record is None:
+        return f
+    return _TimedFile(f, record)
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Aggregate the records by operation.
+
+    Returns: A dict with the total time, bytes and throughput of the saves
+        and of the loads, e.g. `{"save_time": 1.2, "save_bytes": 1024, ...}`
+    """
+    summary = dict()
+    for operation in ("load", "save"):
+        ops = [r for r in records if r["operation"] == operation]
+        total_time = sum(r["total_time"] for r in ops)
+        total_bytes = sum(r["bytes"] or 0 for r in ops)
+        summary["%s_count" % operation] = len(ops)
+        summary["%s_time" % operation] = total_time
+        summary["%s_bytes" % operation] = total_bytes
+        summary["%s_throughput" % operation] = (total_bytes / total_time
+                                                if total_time else 0.)
+    return summary
+
+
+def write_report(step_name: str, path: str = None,
+                 kfp_metrics: bool = True) -> str:
+    """Write the statistics collected so far as a JSON report.
+
+    Args:
+        step_name: The name of the step the statistics refer to
+        path: Where to write the report. Defaults to
+            `<data_dir>/.kale.stats/<step_name>.json`
+        kfp_metrics: Also export the summary as KFP metrics, merged with
+            the metrics the step might already export
+
+    Returns: The path to the report
+    """
+    from kale.marshal.backend import get_data_dir
+    from kale.common import kfputils
+
+    records = get_records()
+    summary = summarize(records)
+    if not path:
+        path = os.path.join(get_data_dir(), STATS_DIR_NAME,
+                            step_name + ".json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"step": step_name, "summary": summary,
+                   "artifacts": records}, f, indent=2)
+    log.info("Marshalling I/O of step '%s': loaded %d bytes in %.3fs,"
+             " saved %d bytes in %.3fs. Report: %s", step_name,
+             summary["load_bytes"], summary["load_time"],
+             summary["save_bytes"], summary["save_time"], path)
+    if kfp_metrics:
+        kfputils.generate_mlpipeline_metrics(
+            {"marshal-%s" % k.replace("_", "-"): v
+             for k, v in summary.items()}, merge=True)
+    return path
@@ -4,6 +4,7 @@
 import os
 import copy
 import logging
+import functools
 import networkx as nx
 
 from typing import Iterable, Dict
@@ -12,7 +13,7 @@ from kubernetes.client.rest import ApiException
 
 from kale.step import Step, PipelineParam
 from kale.config import Config, Field, validators
-from kale.common import graphutils, utils, podutils
+from kale.common import graphutils, utils, podutils, schedutils
 
 log = logging.getLogger(__name__)
 
@@ -95,6 +96,26 @@ class PipelineConfig(Config):
     abs_working_dir = Field(type=str, default="")
     marshal_volume = Field(type=bool, default=True)
     marshal_path = Field(type=str, default="/marshal")
+    # load just the columns of the input data frames a step references
+    marshal_column_projection = Field(type=bool, default=False)
+    # bind step inputs to proxies that are loaded on first use
+    marshal_lazy_inputs = Field(type=bool, default=False)
+    # report the time and bytes each step spends marshalling its artifacts
+    marshal_io_stats = Field(type=bool, default=False)
+    # how to format the generated code: format every component and then the
+    # whole pipeline ("autopep8"), format just the whole pipeline ("once")
+    # or skip formatting ("none")
+    code_formatting = Field(type=str, default="autopep8",
+                            validators=[validators.CodeFormattingValidator])
+    # run the code of notebook steps in a Jupyter kernel ("kernel") or in the
+    # step's own process ("in-process")
+    step_executor = Field(type=str, default="kernel",
+                          validators=[validators.StepExecutorValidator])
+    # merge linear chains of steps into single components
+    fuse_steps = Field(type=bool, default=False)
+    # pass the variables bound just to small literals (numbers, strings,
+    # ...) as KFP parameters, instead of marshalling them
+    marshal_small_values = Field(type=bool, default=False)
     steps_defaults = Field(type=dict, default=dict())
     kfp_host = Field(type=str)
     storage_class_name = Field(type=str,
@@ -183,6 +204,17 @@ class PipelineConfig(Config):
             self.marshal_path = os.path.join(wd, marshal_dir)
 
 
+def _invalidating(method):
+    """Wrap a graph mutator to invalidate the memoized views of a Pipeline."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._invalidate()
+    return wrapper
+
+
 class Pipeline(nx.DiGraph):
     """A Pipeline that can be converted into a KFP pipeline.
 
@@ -191,25 +223,59 @@ class Pipeline(nx.DiGraph):
     algorithms but provides helper functions to work with Step objects
     instead of standard networkx "nodes". This makes it simpler to access
     the steps of the pipeline and their attributes.
+
+    The topological order of the steps (and the views derived from the
+    graph's structure) is computed once and memoized until the graph
+    changes. Every change increases the pipeline's `version`.
     """
 
     def __init__(self, config: PipelineConfig, *args, **kwargs):
+        self._version = 0
+        self._views = dict()
         super().__init__(*args, **kwargs)
         self.config = config
         self.pipeline_parameters: Dict[str, PipelineParam] = dict()
         self.processor = None
         self._pps_names = None
 
-    def run(self):
-        """Runs the steps locally in topological sort."""
-        for step in self.steps:
-            step.run(self.pipeline_parameters)
+    add_node = _invalidating(nx.DiGraph.add_node)
+    add_nodes_from = _invalidating(nx.DiGraph.add_nodes_from)
+    remove_node = _invalidating(nx.DiGraph.remove_node)
+    remove_nodes_from = _invalidating(nx.DiGraph.remove_nodes_from)
+    add_edge = _invalidating(nx.DiGraph.add_edge)
+    add_edges_from = _invalidating(nx.DiGraph.add_edges_from)
+    remove_edge = _invalidating(nx.DiGraph.remove_edge)
+    remove_edges_from = _invalidating(nx.DiGraph.remove_edges_from)
+    clear = _invalidating(nx.DiGraph.clear)
+    clear_edges = _invalidating(nx.DiGraph.clear_edges)
+
+    @property
+    def version(self) -> int:
+        """Get the number of changes made to the graph."""
+        return self._version
+
+    def _invalidate(self):
+        self._version += 1
+        self._views.clear()
+
+    def _get_view(self, name: str, compute):
+        """Get a view of the graph, computing it once per version."""
+        if name not in self._views:
+            self._views[name] = compute()
+        return self._views[name]
+
+    def run(self, max_workers: int = None):
+        """Run the steps locally, the independent ones in parallel.
+
+        See `schedutils.run_pipeline`.
+        """
+        schedutils.run_pipeline(self, max_workers=max_workers)
 
     def add_step(self, step: Step):
         """Add a new Step to the pipeline."""
         if not isinstance(step, Step):
             raise RuntimeError("Not of type Step.")
-        if step.name in self.steps_names:
+        if self.has_node(step.name):
             raise RuntimeError("Step with name '%s' already exists"
                                % step.name)
         self.add_node(step.name, step=step)
@@ -230,19 +296,24 @@ class Pipeline(nx.DiGraph):
     @property
     def steps_names(self):
         """Get all Steps' names, sorted topologically."""
-        return [step.name for step in self._topological_sort()]
+        return list(self._get_view(
+            "steps_names", lambda: list(nx.topological_sort(self))))
 
     @property
     def all_steps_parameters(self):
         """Create a dict with step names and their parameters."""
+        # not memoized, steps' parameters change without changing the graph
         return {step: sorted(self.get_step(step).parameters.keys())
                 for step in self.steps_names}
 
     @property
     def pipeline_dependencies_tasks(self):
         """Generate a dictionary of Pipeline dependencies."""
-        return {step_name: list(self.predecessors(step_name))
-                for step_name in self.steps_names}
+        tasks = self._get_view(
+            "pipeline_dependencies_tasks",
+            lambda: {step_name: list(self.predecessors(step_name))
+                     for step_name in self.steps_names})
+        return {step_name: list(preds) for step_name, preds in tasks.items()}
 
     @property
     def pps_names(self):
@@ -263,7 +334,7 @@ class Pipeline(nx.DiGraph):
                 for n in self.pps_names]
 
     def _topological_sort(self) -> Iterable[Step]:
-        return self._steps_iterable(nx.topological_sort(self))
+        return self._steps_iterable(self.steps_names)
 
     def get_ordered_ancestors(self, step_name: str) -> Iterable[Step]:
         """Return the ancestors of a step in an ordered manner.
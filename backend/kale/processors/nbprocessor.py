@@ -3,14 +3,19 @@
 
 import os
 import re
+import ast
+import sys
+import copy
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+from functools import lru_cache
 
 import nbformat as nb
 
 from kale.config import Field
 from kale.step import Step, PipelineParam
-from kale.common import astutils, flakeutils, graphutils, utils
+from kale.common import (astutils, cacheutils, graphutils, profutils,
+                         scopeutils, utils)
 from kale.pipeline import PipelineConfig
 from .baseprocessor import BaseProcessor
 
@@ -54,6 +59,18 @@ _TAGS_LANGUAGE = [SKIP_TAG,
 _STEPS_DEFAULTS_LANGUAGE = [ANNOTATION_TAG,
                             LABEL_TAG,
                             LIMITS_TAG]
+# A single regex for the whole tagging language: the name of the group that
+# matches a tag is the index of the tag's definition in `_TAGS_LANGUAGE`.
+_TAGS_MATCHER = re.compile("^(?:%s)$" % "|".join(
+    "(?P<_%d>%s)" % (i, tag[1:-1]) for i, tag in enumerate(_TAGS_LANGUAGE)))
+# Tags whose cells are collected by `_get_reserved_tag_source`
+_RESERVED_TAGS = (IMPORT_TAG,
+                  FUNCTIONS_TAG,
+                  PIPELINE_PARAMETERS_TAG,
+                  PIPELINE_METRICS_TAG)
+
+# The maximum size of the variables passed as KFP parameters, in bytes
+MAX_VALUE_SIZE = 1024
 
 
 METRICS_TEMPLATE = '''\
@@ -97,6 +114,213 @@ def get_limit_from_tag(tag_parts):
     return tag_parts.pop(0), tag_parts.pop(0)
 
 
+@lru_cache(maxsize=1024)
+def classify_tag(tag: Any) -> Optional[str]:
+    """Get the definition in the tagging language that matches a tag.
+
+    Returns: One of the tags of `_TAGS_LANGUAGE` (e.g. `STEP_TAG`), or None
+        if the tag is not part of the language
+    """
+    if not isinstance(tag, str):
+        return None
+    match = _TAGS_MATCHER.match(tag)
+    if not match:
+        return None
+    return _TAGS_LANGUAGE[int(match.lastgroup[1:])]
+
+
+def _parse_tags(tags: List[Any]) -> Dict[str, Any]:
+    parsed_tags = dict()
+
+    # `step_names` is a list because a notebook cell might be assigned to
+    # more than one Pipeline step.
+    parsed_tags['step_names'] = list()
+    parsed_tags['prev_steps'] = list()
+    # define intermediate variables so that dicts are not added to a steps
+    # when they are empty
+    cell_annotations = dict()
+    cell_labels = dict()
+    cell_limits = dict()
+
+    # the notebook cell was not tagged
+    if not tags:
+        return parsed_tags
+
+    for t in tags:
+        if not isinstance(t, str):
+            raise ValueError("Tags must be string. Found tag %s of type %s"
+                             % (t, type(t)))
+        # Check that the tag is defined by the Kale tagging language
+        if classify_tag(t) is None:
+            raise ValueError("Unrecognized tag: {}".format(t))
+
+        # Special tags have a specific effect on the cell they belong to.
+        # Specifically:
+        #  - skip: ignore the notebook cell
+        #  - pipeline-parameters: use the cell to populate Pipeline
+        #       parameters. The cell must contain only assignment
+        #       expressions
+        #  - pipeline-metrics: use the cell to populate Pipeline metrics.
+        #       The cell must contain only variable names
+        #  - imports: the code of the corresponding cell(s) will be
+        #       prepended to every Pipeline step
+        #  - functions: same as imports, but the corresponding code is
+        #       placed **after** `imports`
+        special_tags = ['skip', 'pipeline-parameters', 'pipeline-metrics',
+                        'imports', 'functions']
+        if t in special_tags:
+            parsed_tags['step_names'] = [t]
+            return parsed_tags
+
+        # now only `step` and `prev` tags remain to be parsed.
+        tag_parts = t.split(':')
+        tag_name = tag_parts.pop(0)
+
+        if tag_name == "annotation":
+            key, value = get_annotation_or_label_from_tag(tag_parts)
+            cell_annotations.update({key: value})
+
+        if tag_name == "label":
+            key, value = get_annotation_or_label_from_tag(tag_parts)
+            cell_labels.update({key: value})
+
+        if tag_name == "limit":
+            key, value = get_limit_from_tag(tag_parts)
+            cell_limits.update({key: value})
+
+        # name of the future Pipeline step
+        if tag_name in ["step"]:
+            step_name = tag_parts.pop(0)
+            parsed_tags['step_names'].append(step_name)
+        # name(s) of the father Pipeline step(s)
+        if tag_name == "prev":
+            prev_step_name = tag_parts.pop(0)
+            parsed_tags['prev_steps'].append(prev_step_name)
+
+    if not parsed_tags['step_names'] and parsed_tags['prev_steps']:
+        raise ValueError(
+            "A cell can not provide `prev` annotations without "
+            "providing a `block` or `step` annotation as well")
+
+    if cell_annotations:
+        if not parsed_tags['step_names']:
+            raise ValueError(
+                "A cell can not provide Pod annotations in a cell"
+                " that does not declare a step name.")
+        parsed_tags['annotations'] = cell_annotations
+
+    if cell_limits:
+        if not parsed_tags['step_names']:
+            raise ValueError(
+                "A cell can not provide Pod resource limits in a"
+                " cell that does not declare a step name.")
+        parsed_tags['limits'] = cell_limits
+    return parsed_tags
+
+
+class CellTags(object):
+    """The tags of a notebook cell, classified by the Kale tagging language.
+
+    Attributes:
+        tags: The raw tags of the cell
+        language: The definitions of the tagging language (e.g. `STEP_TAG`)
+            that match the tags. Unrecognized tags are ignored.
+    """
+
+    def __init__(self, metadata: Dict[str, Any]):
+        self.tags: List[Any] = list(metadata.get("tags") or [])
+        self.language: FrozenSet[str] = frozenset(
+            filter(None, map(classify_tag, self.tags)))
+        # invalid tags only fail the consumers that need the parsed tags
+        try:
+            self._parsed, self._error = _parse_tags(self.tags), None
+        except ValueError as e:
+            self._parsed, self._error = None, e
+
+    @property
+    def parsed(self) -> Dict[str, Any]:
+        """Get the parsed tags (see `NotebookProcessor.parse_cell_metadata`).
+
+        Raises:
+            ValueError: The tags are not valid
+        """
+        if self._error is not None:
+            raise self._error
+        return copy.deepcopy(self._parsed)
+
+    def has(self, tag: str) -> bool:
+        """Whether the cell has a tag matching a tagging language definition.
+
+        Args:
+            tag: A tag of `_TAGS_LANGUAGE`, e.g. `PIPELINE_METRICS_TAG`
+        """
+        return tag in self.language
+
+    def has_other_than(self, tag: str) -> bool:
+        """Whether the cell has any tag of the language apart from `tag`."""
+        return bool(self.language - {tag})
+
+
+class NotebookTags(object):
+    """The classified tags of the code cells of a notebook.
+
+    The cells are classified once and the reserved tags' source code is
+    collected with a single pass over the notebook. The classification
+    describes a specific list of cells: see `describes`.
+    """
+
+    def __init__(self, cells: List[Any]):
+        self._cells = cells
+        self._cells_count = len(cells)
+        self.cells: List[Tuple[Any, CellTags]] = [
+            (c, CellTags(c.metadata)) for c in cells if c.cell_type == "code"]
+        self._sources: Dict[str, str] = dict()
+        self._metrics_misplaced = None
+
+    def describes(self, cells: List[Any]) -> bool:
+        """Whether the classification is still valid for a list of cells."""
+        return cells is self._cells and len(cells) == self._cells_count
+
+    def get_reserved_source(self, search_tag: str) -> str:
+        """Get the source code of the cells of a reserved tag.
+
+        See `NotebookProcessor._get_reserved_tag_source`.
+        """
+        if search_tag not in self._sources:
+            self._collect((_RESERVED_TAGS if search_tag in _RESERVED_TAGS
+                           else (search_tag,)))
+        return self._sources[search_tag]
+
+    def are_metrics_misplaced(self) -> bool:
+        """Whether a pipeline-metrics cell is followed by other tags."""
+        if self._metrics_misplaced is None:
+            self._collect(_RESERVED_TAGS)
+        return self._metrics_misplaced
+
+    def _collect(self, search_tags: Sequence[str]):
+        detected = dict.fromkeys(search_tags, False)
+        sources = {tag: list() for tag in search_tags}
+        metrics_detected = False
+        self._metrics_misplaced = False
+        for c, cell_tags in self.cells:
+            for tag in search_tags:
+                # in case the previous cell was a `tag` cell and this cell
+                # is not any other tag of the tag language:
+                if detected[tag] and not cell_tags.has_other_than(tag):
+                    sources[tag].append(c.source)
+                elif cell_tags.has(tag):
+                    sources[tag].append(c.source)
+                    detected[tag] = True
+                else:
+                    detected[tag] = False
+            if cell_tags.has(PIPELINE_METRICS_TAG):
+                metrics_detected = True
+            elif metrics_detected and cell_tags.language:
+                self._metrics_misplaced = True
+        for tag in search_tags:
+            self._sources[tag] = "\n".join(sources[tag]).strip()
+
+
 class NotebookConfig(PipelineConfig):
     """Config store for a notebook.
 
@@ -128,8 +352,7 @@ class NotebookConfig(PipelineConfig):
             return steps_defaults
 
         for c in steps_defaults:
-            if any(re.match(_c, c)
-                   for _c in _STEPS_DEFAULTS_LANGUAGE) is False:
+            if classify_tag(c) not in _STEPS_DEFAULTS_LANGUAGE:
                 raise ValueError("Unrecognized common step configuration:"
                                  " {}".format(c))
 
@@ -152,6 +375,89 @@ class NotebookConfig(PipelineConfig):
         return result
 
 
+class StepAnalysis(object):
+    """The static analysis of a step's source code.
+
+    `dependencies_detection` looks at every step once for each of its
+    descendants. The analysis of a step is computed just once, when the step
+    is first visited, and reused for the rest of the traversal. Analyses are
+    also stored in the compilation cache (see `kale.common.cacheutils`), so
+    that recompiling a notebook analyzes just the steps whose source changed.
+
+    Attributes:
+        source: The step's source code
+        ins: The names the step uses but does not define, excluding pipeline
+            parameters
+        parameters: The pipeline parameters the step uses
+        marshal_candidates: The names the step defines
+        function_calls: The names of the functions the step calls
+        fns_free_variables: The free variables and the consumed pipeline
+            parameters of the functions the step defines
+    """
+    cache_namespace = "step-analysis"
+
+    def __init__(self, processor: "NotebookProcessor", step: Step,
+                 imports_and_functions: str = ""):
+        """Analyze the source code of `step`."""
+        self.source = '\n'.join(step.source)
+        pipeline_parameters = processor.pipeline.pipeline_parameters
+        # changing the analysis code invalidates the cached analyses
+        code_version = cacheutils.fingerprint(astutils, scopeutils,
+                                              sys.modules[__name__])
+        key = cacheutils.compute_key(code_version, self.source,
+                                     imports_and_functions,
+                                     sorted(pipeline_parameters or {}))
+        cached = cacheutils.load(self.cache_namespace, key)
+        if cached is not None:
+            self._from_dict(cached, pipeline_parameters)
+            return
+        self.ins, self.parameters = processor._detect_in_dependencies(
+            source_code=self.source, pipeline_parameters=pipeline_parameters)
+        tree = ast.parse(utils.comment_magic_commands(self.source))
+        prelude = processor._prelude
+        if prelude and step.source[:len(prelude)] == prelude:
+            # every step starts with the prelude, whose functions are
+            # analyzed just once
+            own_source = '\n'.join(step.source[len(prelude):])
+            self.fns_free_variables = {
+                **processor._get_prelude_fns_free_variables(),
+                **processor._detect_fns_free_variables(
+                    ast.parse(utils.comment_magic_commands(own_source)),
+                    imports_and_functions, pipeline_parameters)}
+        else:
+            self.fns_free_variables = processor._detect_fns_free_variables(
+                tree, imports_and_functions, pipeline_parameters)
+        self.function_calls = astutils.get_function_calls(tree)
+        self.marshal_candidates = astutils.get_marshal_candidates(
+            self.source)
+        cacheutils.store(self.cache_namespace, key, self._to_dict())
+
+    def _to_dict(self) -> Dict[str, Any]:
+        return {"ins": sorted(self.ins),
+                "parameters": sorted(self.parameters),
+                "marshal_candidates": sorted(self.marshal_candidates),
+                "function_calls": sorted(self.function_calls),
+                "fns_free_variables": {
+                    fn: [sorted(free_vars), sorted(consumed)]
+                    for fn, (free_vars, consumed)
+                    in self.fns_free_variables.items()}}
+
+    def _from_dict(self, data: Dict[str, Any],
+                   pipeline_parameters: Optional[dict]):
+        self.ins = set(data["ins"])
+        self.parameters = {name: pipeline_parameters[name]
+                           for name in data["parameters"]}
+        self.marshal_candidates = set(data["marshal_candidates"])
+        self.function_calls = set(data["function_calls"])
+        # consumed parameters are a set just when there are parameters, see
+        # `_detect_fns_free_variables`
+        self.fns_free_variables = {
+            fn: (set(free_vars),
+                 set(consumed) if pipeline_parameters else {})
+            for fn, (free_vars, consumed)
+            in data["fns_free_variables"].items()}
+
+
 class NotebookProcessor(BaseProcessor):
     """Convert a Notebook to a Pipeline object."""
 
@@ -175,7 +481,14 @@ class NotebookProcessor(BaseProcessor):
                 pipeline generation) might still be invalid.
         """
         self.nb_path = os.path.expanduser(nb_path)
+        self._notebook_tags: Optional[NotebookTags] = None
         self.notebook = self._read_notebook()
+        self._step_analyses: Dict[str, StepAnalysis] = dict()
+        self._imports_and_functions = ""
+        self._ancestor_index = None
+        # the imports and functions cells prepended to every step
+        self._prelude: List[str] = list()
+        self._prelude_fns_free_variables = None
 
         nb_metadata = self.notebook.metadata.get(KALE_NB_METADATA_KEY, dict())
         nb_metadata.update({"notebook_path": nb_path})
@@ -183,6 +496,7 @@ class NotebookProcessor(BaseProcessor):
             nb_metadata.update(nb_metadata_overrides)
         super().__init__(**{**kwargs, **nb_metadata})
 
+    @profutils.profiled("notebook read")
     def _read_notebook(self):
         if not os.path.exists(self.nb_path):
             raise ValueError("NotebookProcessor could not find a notebook at"
@@ -203,6 +517,11 @@ class NotebookProcessor(BaseProcessor):
         # run static analysis over the source code
         self.dependencies_detection(imports_and_functions)
         self.assign_metrics(pipeline_metrics)
+        if self.config.fuse_steps:
+            self.fuse_steps()
+        if self.config.marshal_small_values:
+            self.detect_small_values()
+        cacheutils.prune(StepAnalysis.cache_namespace)
 
         # TODO: Additional action required:
         #  Run a static analysis over every step to check that pipeline
@@ -215,6 +534,7 @@ class NotebookProcessor(BaseProcessor):
             pipeline_parameters[name] = PipelineParam(v_type, v_value)
         self.pipeline.pipeline_parameters = pipeline_parameters
 
+    @profutils.profiled("tag parsing")
     def parse_notebook(self):
         """Creates a NetworkX graph based on the input notebook's tags.
 
@@ -233,11 +553,8 @@ class NotebookProcessor(BaseProcessor):
         # Variables that will become pipeline metrics
         pipeline_metrics = list()
 
-        for c in self.notebook.cells:
-            if c.cell_type != "code":
-                continue
-
-            tags = self.parse_cell_metadata(c.metadata)
+        for c, cell_tags in self._get_notebook_tags().cells:
+            tags = cell_tags.parsed
 
             if len(tags['step_names']) > 1:
                 raise NotImplementedError("Kale does not yet support multiple"
@@ -323,8 +640,9 @@ class NotebookProcessor(BaseProcessor):
                 prev_step_name = step_name
 
         # Prepend any `imports` and `functions` cells to every Pipeline step
+        self._prelude = imports_block + functions_block
         for step in self.pipeline.steps:
-            step.source = imports_block + functions_block + step.source
+            step.source = self._prelude + step.source
 
         # merge together pipeline parameters
         pipeline_parameters = '\n'.join(pipeline_parameters)
@@ -346,92 +664,7 @@ class NotebookProcessor(BaseProcessor):
         Returns (dict): parsed tags based on Kale tagging language
 
         """
-        parsed_tags = dict()
-
-        # `step_names` is a list because a notebook cell might be assigned to
-        # more than one Pipeline step.
-        parsed_tags['step_names'] = list()
-        parsed_tags['prev_steps'] = list()
-        # define intermediate variables so that dicts are not added to a steps
-        # when they are empty
-        cell_annotations = dict()
-        cell_labels = dict()
-        cell_limits = dict()
-
-        # the notebook cell was not tagged
-        if 'tags' not in metadata or len(metadata['tags']) == 0:
-            return parsed_tags
-
-        for t in metadata['tags']:
-            if not isinstance(t, str):
-                raise ValueError("Tags must be string. Found tag %s of type %s"
-                                 % (t, type(t)))
-            # Check that the tag is defined by the Kale tagging language
-            if any(re.match(_t, t) for _t in _TAGS_LANGUAGE) is False:
-                raise ValueError("Unrecognized tag: {}".format(t))
-
-            # Special tags have a specific effect on the cell they belong to.
-            # Specifically:
-            #  - skip: ignore the notebook cell
-            #  - pipeline-parameters: use the cell to populate Pipeline
-            #       parameters. The cell must contain only assignment
-            #       expressions
-            #  - pipeline-metrics: use the cell to populate Pipeline metrics.
-            #       The cell must contain only variable names
-            #  - imports: the code of the corresponding cell(s) will be
-            #       prepended to every Pipeline step
-            #  - functions: same as imports, but the corresponding code is
-            #       placed **after** `imports`
-            special_tags = ['skip', 'pipeline-parameters', 'pipeline-metrics',
-                            'imports', 'functions']
-            if t in special_tags:
-                parsed_tags['step_names'] = [t]
-                return parsed_tags
-
-            # now only `step` and `prev` tags remain to be parsed.
-            tag_parts = t.split(':')
-            tag_name = tag_parts.pop(0)
-
-            if tag_name == "annotation":
-                key, value = get_annotation_or_label_from_tag(tag_parts)
-                cell_annotations.update({key: value})
-
-            if tag_name == "label":
-                key, value = get_annotation_or_label_from_tag(tag_parts)
-                cell_labels.update({key: value})
-
-            if tag_name == "limit":
-                key, value = get_limit_from_tag(tag_parts)
-                cell_limits.update({key: value})
-
-            # name of the future Pipeline step
-            if tag_name in ["step"]:
-                step_name = tag_parts.pop(0)
-                parsed_tags['step_names'].append(step_name)
-            # name(s) of the father Pipeline step(s)
-            if tag_name == "prev":
-                prev_step_name = tag_parts.pop(0)
-                parsed_tags['prev_steps'].append(prev_step_name)
-
-        if not parsed_tags['step_names'] and parsed_tags['prev_steps']:
-            raise ValueError(
-                "A cell can not provide `prev` annotations without "
-                "providing a `block` or `step` annotation as well")
-
-        if cell_annotations:
-            if not parsed_tags['step_names']:
-                raise ValueError(
-                    "A cell can not provide Pod annotations in a cell"
-                    " that does not declare a step name.")
-            parsed_tags['annotations'] = cell_annotations
-
-        if cell_limits:
-            if not parsed_tags['step_names']:
-                raise ValueError(
-                    "A cell can not provide Pod resource limits in a"
-                    " cell that does not declare a step name.")
-            parsed_tags['limits'] = cell_limits
-        return parsed_tags
+        return CellTags(metadata).parsed
 
     def get_pipeline_parameters_source(self):
         """Get just pipeline parameters cells from the notebook.
@@ -447,36 +680,13 @@ class NotebookProcessor(BaseProcessor):
         """
         # check that the pipeline metrics tag is only assigned to cells at
         # the end of the notebook
-        detected = False
-        tags = _TAGS_LANGUAGE[:]
-        tags.remove(PIPELINE_METRICS_TAG)
-
-        for c in self.notebook.cells:
-            # parse only source code cells
-            if c.cell_type != "code":
-                continue
-
-            # if we see a pipeline-metrics tag, set the flag
-            if (('tags' in c.metadata
-                 and len(c.metadata['tags']) > 0
-                 and any(re.match(PIPELINE_METRICS_TAG, t)
-                         for t in c.metadata['tags']))):
-                detected = True
-                continue
-
-            # if we have the flag set and we detect any other tag from the tags
-            # language, then raise error
-            if (detected
-                and 'tags' in c.metadata
-                and len(c.metadata['tags']) > 0
-                and any([any(re.match(tag, t) for t in c.metadata['tags'])
-                         for tag in tags])):
-                raise ValueError(
-                    "Tag pipeline-metrics tag must be placed on a "
-                    "cell at the end of the Notebook."
-                    " Pipeline metrics should be considered as a"
-                    " result of the pipeline execution and not of"
-                    " single steps.")
+        if self._get_notebook_tags().are_metrics_misplaced():
+            raise ValueError(
+                "Tag pipeline-metrics tag must be placed on a "
+                "cell at the end of the Notebook."
+                " Pipeline metrics should be considered as a"
+                " result of the pipeline execution and not of"
+                " single steps.")
         return self._get_reserved_tag_source(PIPELINE_METRICS_TAG)
 
     def get_imports_and_functions(self):
@@ -499,34 +709,19 @@ class NotebookProcessor(BaseProcessor):
 
         Returns: the unified code of all the cells belonging to `search_tag`
         """
-        detected = False
-        source = ''
+        return self._get_notebook_tags().get_reserved_source(search_tag)
 
-        language = _TAGS_LANGUAGE[:]
-        language.remove(search_tag)
+    def _get_notebook_tags(self) -> NotebookTags:
+        """Get the classified tags of the notebook's cells.
 
-        for c in self.notebook.cells:
-            # parse only source code cells
-            if c.cell_type != "code":
-                continue
-            # in case the previous cell was a `search_tag` cell and this
-            # cell is not any other tag of the tag language:
-            if (detected
-                and (('tags' not in c.metadata
-                      or len(c.metadata['tags']) == 0)
-                     or all([not any(re.match(tag, t)
-                                     for t in c.metadata['tags'])
-                            for tag in language]))):
-                source += '\n' + c.source
-            elif (('tags' in c.metadata
-                   and len(c.metadata['tags']) > 0
-                   and any(re.match(search_tag, t)
-                           for t in c.metadata['tags']))):
-                source += '\n' + c.source
-                detected = True
-            else:
-                detected = False
-        return source.strip()
+        The cells are classified on first use and again only if the
+        notebook's cells are replaced.
+        """
+        cells = self.notebook.cells
+        if (self._notebook_tags is None
+                or not self._notebook_tags.describes(cells)):
+            self._notebook_tags = NotebookTags(cells)
+        return self._notebook_tags
 
     def assign_metrics(self, pipeline_metrics: dict):
         """Assign pipeline metrics to specific pipeline steps.
@@ -566,10 +761,11 @@ class NotebookProcessor(BaseProcessor):
                 break
 
             anc_step = self.pipeline.get_step(anc)
-            anc_source = '\n'.join(anc_step.source)
             # get all the marshal candidates from father's source and intersect
-            # with the metrics that have not been matched yet
-            marshal_candidates = astutils.get_marshal_candidates(anc_source)
+            # with the metrics that have not been matched yet. The steps have
+            # already been analyzed by `dependencies_detection`.
+            marshal_candidates = self._get_step_analysis(
+                anc_step).marshal_candidates
             assigned_metrics = metrics_left.intersection(marshal_candidates)
             # Remove the metrics that have already been assigned.
             metrics_left.difference_update(assigned_metrics)
@@ -585,15 +781,146 @@ class NotebookProcessor(BaseProcessor):
 
         self.pipeline.remove_node(tmp_step_name)
 
-    def _ensure_fns_free_variables(self, anc_step, anc_source: str,
-                                   imports_and_functions: str):
+    def fuse_steps(self):
+        """Merge the linear chains of steps into single steps.
+
+        Every step becomes a KFP component, which costs a pod, the
+        installation of the step's packages, a kernel and the marshalling of
+        the step's inputs and outputs. A chain of steps where every step has
+        a single child, and every step has a single parent, runs as a single
+        step instead: the steps' code runs in a row in the same kernel, so
+        the data they exchange stays in memory.
+
+        Steps with different configurations (e.g. resource limits) are not
+        merged. The merged step is named after the first and last steps of
+        the chain (e.g. `load_to_train`).
+
+        This must run after `dependencies_detection` and `assign_metrics`.
+        """
+        def _can_fuse(u, v):
+            u_config = self.pipeline.get_step(u).config.to_dict()
+            v_config = self.pipeline.get_step(v).config.to_dict()
+            u_config.pop("name")
+            v_config.pop("name")
+            return u_config == v_config
+
+        for chain in graphutils.get_linear_chains(self.pipeline, _can_fuse):
+            self._fuse_chain([self.pipeline.get_step(name) for name in chain])
+
+    def _fuse_chain(self, chain: List[Step]):
+        chain_names = {step.name for step in chain}
+        # the names consumed by the steps that are not part of the chain
+        consumed = {name for step in self.pipeline.steps
+                    if step.name not in chain_names for name in step.ins}
+        ins, outs, produced = list(), list(), set()
+        source = list(chain[0].source)
+        for step in chain:
+            ins.extend(name for name in step.ins
+                       if name not in produced and name not in ins)
+            outs.extend(name for name in step.outs
+                        if name in consumed and name not in outs)
+            produced.update(step.outs)
+            if step is not chain[0]:
+                # the prelude already runs at the beginning of the chain
+                prelude = step.source[:len(self._prelude)]
+                skip = len(self._prelude) if prelude == self._prelude else 0
+                source.extend(step.source[skip:])
+
+        config = chain[0].config.to_dict()
+        config["name"] = "%s_to_%s" % (chain[0].name, chain[-1].name)
+        fused = Step(source=source, ins=ins, outs=outs, **config)
+        for step in chain:
+            fused.parameters.update(step.parameters)
+            fused.metrics = fused.metrics or step.metrics
+            fused.fns_free_variables.update(step.fns_free_variables)
+            for artifact in step.artifacts:
+                if (artifact.name in ins if artifact.is_input
+                        else artifact.name in outs):
+                    fused.add_artifact(artifact.name, artifact.type,
+                                       artifact.is_input)
+
+        preds = list(self.pipeline.predecessors(chain[0].name))
+        succs = list(self.pipeline.successors(chain[-1].name))
+        self.pipeline.remove_nodes_from(chain_names)
+        self.pipeline.add_step(fused)
+        self.pipeline.add_edges_from((pred, fused.name) for pred in preds)
+        self.pipeline.add_edges_from((fused.name, succ) for succ in succs)
+
+    def detect_small_values(self):
+        """Select the ins and outs of the steps to pass as KFP parameters.
+
+        Marshalling a variable pickles it to a file that KFP uploads to and
+        downloads from its artifact storage. For a number or a short string
+        this costs far more than the value itself, and KFP cannot reuse the
+        cached runs of the consumers, whose inputs are new artifacts at every
+        run. These variables travel as KFP parameters instead.
+
+        An out of a step is a small value when the step binds it just to
+        small literals of the same type (see `astutils.get_value_types`).
+        Non-finite floats are left out, as their `repr` (`inf`, `nan`) is
+        not a valid literal in the generated step.
+        A step that receives a small value and does not bind it cannot
+        change it, so it does not output it again: its descendants read it
+        from the step that produced it.
+
+        This must run after `dependencies_detection`, once the graph does
+        not change anymore.
+        """
+        ancestor_index = graphutils.AncestorIndex(self.pipeline)
+        for step in self.pipeline.steps:
+            step.value_ins = dict()
+            for name in step.ins:
+                # the nearest ancestor that outputs the variable
+                producer = next(
+                    (anc_step for anc_step in map(
+                        self.pipeline.get_step,
+                        ancestor_index.get_ordered_ancestors(step.name))
+                     if name in anc_step.outs), None)
+                if producer and name in producer.value_outs:
+                    step.value_ins[name] = producer.value_outs[name]
+            value_types = astutils.get_value_types(
+                "\n".join(step.source), step.outs, MAX_VALUE_SIZE)
+            step.value_outs = dict()
+            for name in list(step.outs):
+                if name in step.value_ins and name not in value_types:
+                    step.outs.remove(name)
+                    continue
+                types = {value_types.get(name)}
+                if name in step.ins:
+                    types.add(step.value_ins.get(name))
+                if len(types) == 1 and None not in types:
+                    step.value_outs[name] = types.pop()
+
+    def _get_step_analysis(self, step: Step) -> StepAnalysis:
+        """Get the analysis of a step, computing it on first use."""
+        analysis = self._step_analyses.get(step.name)
+        if analysis is None:
+            with profutils.phase("static analysis"):
+                analysis = StepAnalysis(self, step,
+                                        self._imports_and_functions)
+            self._step_analyses[step.name] = analysis
+        return analysis
+
+    def _get_prelude_fns_free_variables(self):
+        """Get the free variables of the functions of the prelude.
+
+        The prelude (the `imports` and `functions` cells) is prepended to
+        every step, so its functions are analyzed once per compilation.
+        """
+        if self._prelude_fns_free_variables is None:
+            tree = ast.parse(utils.comment_magic_commands(
+                '\n'.join(self._prelude)))
+            self._prelude_fns_free_variables = (
+                self._detect_fns_free_variables(
+                    tree, self._imports_and_functions,
+                    self.pipeline.pipeline_parameters))
+        return self._prelude_fns_free_variables
+
+    def _ensure_fns_free_variables(self, anc_step: Step):
         """Lazily compute ancestor functions' free vars if missing."""
         if not getattr(anc_step, 'fns_free_variables', None):
-            anc_step.fns_free_variables = self._detect_fns_free_variables(
-                anc_source,
-                imports_and_functions,
-                self.pipeline.pipeline_parameters
-            )
+            anc_step.fns_free_variables = dict(
+                self._get_step_analysis(anc_step).fns_free_variables)
 
     def _propagate_free_vars_from_function(self, step: Step, anc_step: Step,
                                            fn_name: str):
@@ -624,14 +951,12 @@ class NotebookProcessor(BaseProcessor):
 
         # Then, expand transitively using functions defined in earlier
         # ancestors of anc_step (i.e., ancestors that lead to anc_step).
-        earlier_ancestors = graphutils.get_ordered_ancestors(self.pipeline,
-                                                             anc_step.name)
+        earlier_ancestors = self._ancestor_index.get_ordered_ancestors(
+            anc_step.name)
         for ea_name in earlier_ancestors:
             ea_step = self.pipeline.get_step(ea_name)
-            ea_source = '\n'.join(ea_step.source)
             # Ensure their fns_free_variables are computed
-            self._ensure_fns_free_variables(ea_step, ea_source,
-                                            self.get_imports_and_functions())
+            self._ensure_fns_free_variables(ea_step)
             ea_fns_free_vars = getattr(ea_step, 'fns_free_variables', {})
             # We iterate over a snapshot of aggregated to allow growth
             # during the loop
@@ -667,6 +992,7 @@ class NotebookProcessor(BaseProcessor):
                     anc_step.add_artifact(fv_name, inferred_type,
                                           is_input=False)
 
+    @profutils.profiled("dependencies detection")
     def dependencies_detection(self, imports_and_functions: str = ""):
         """Detects data dependencies between pipeline steps to support KFPv2.
 
@@ -696,26 +1022,30 @@ class NotebookProcessor(BaseProcessor):
             its detected `ins`, `outs`, `parameters`, and `fns_free_variables`
             to facilitate KFP v2 artifact handling.
         """
+        # every step is analyzed once and the analysis is reused whenever
+        # the step is visited as an ancestor of another step
+        self._step_analyses = dict()
+        self._imports_and_functions = imports_and_functions
+        self._prelude_fns_free_variables = None
+        # the graph does not change during the traversal, so the ancestors
+        # of every step are computed at most once
+        self._ancestor_index = graphutils.AncestorIndex(self.pipeline)
         # resolve the data dependencies between steps, looping through the
         # graph
         for step in self.pipeline.steps:
             # detect the INS dependencies of the CURRENT node------------------
-            step_source = '\n'.join(step.source)
+            analysis = self._get_step_analysis(step)
             # get the variables that this step is missing and the pipeline
             # parameters that it actually needs.
-            ins, parameters = self._detect_in_dependencies(
-                source_code=step_source,
-                pipeline_parameters=self.pipeline.pipeline_parameters)
-            step.parameters = parameters
+            ins = analysis.ins
+            step.parameters = dict(analysis.parameters)
 
-            fns_free_vars = self._detect_fns_free_variables(
-                step_source, imports_and_functions,
-                self.pipeline.pipeline_parameters)
+            fns_free_vars = dict(analysis.fns_free_variables)
 
             # Get all the function calls. This will be used below to check if
             # any of the ancestors declare any of these functions. Is that is
             # so, the free variables of those functions will have to be loaded.
-            fn_calls = astutils.get_function_calls(step_source)
+            fn_calls = set(analysis.function_calls)
             # add OUT dependencies annotations in the PARENT nodes-------------
             # Intersect the missing names of this father's child with all
             # the father's names. The intersection is the list of variables
@@ -723,21 +1053,19 @@ class NotebookProcessor(BaseProcessor):
             # The ancestors are the the nodes that have a path to `step`,
             # ordered by path length.
             ins_left = ins.copy()
-            for anc in (graphutils.get_ordered_ancestors(self.pipeline,
-                                                         step.name)):
+            for anc in self._ancestor_index.get_ordered_ancestors(
+                    step.name):
                 if not ins_left:
                     # if there are no more variables that need to be
                     # marshalled, stop the graph traverse
                     break
                 anc_step = self.pipeline.get_step(anc)
-                anc_source = '\n'.join(anc_step.source)
                 # Ensure ancestor's functions free variables are available
-                self._ensure_fns_free_variables(anc_step, anc_source,
-                                                imports_and_functions)
+                self._ensure_fns_free_variables(anc_step)
                 # get all the marshal candidates from father's source and
                 # intersect with the required names of the current node
-                marshal_candidates = astutils.get_marshal_candidates(
-                    anc_source)
+                marshal_candidates = self._get_step_analysis(
+                    anc_step).marshal_candidates
                 outs = ins_left.intersection(marshal_candidates)
                 for out_name in outs:
                     # Heuristic for type inference:
@@ -812,7 +1140,7 @@ class NotebookProcessor(BaseProcessor):
             pipeline_parameters: Pipeline parameters dict
         """
         commented_source_code = utils.comment_magic_commands(source_code)
-        ins = flakeutils.pyflakes_report(code=commented_source_code)
+        ins = scopeutils.get_undefined_names(commented_source_code)
         # Pipeline parameters will be part of the names that are missing,
         # but of course we don't want to marshal them in as they will be
         # present as parameters
@@ -822,6 +1150,14 @@ class NotebookProcessor(BaseProcessor):
             # these are the parameters that are actually needed by this step.
             relevant_parameters = ins.intersection(pipeline_parameters.keys())
             ins.difference_update(relevant_parameters)
+            # Magic commands are commented out, so the parameters they
+            # reference (e.g. `%env LR={lr}`) are invisible to the analysis
+            magic_lines = re.findall(r"^\s*[%!].*$", source_code,
+                                     re.MULTILINE)
+            relevant_parameters.update(
+                name for name in pipeline_parameters
+                if any(re.search(r"\b%s\b" % re.escape(name), line)
+                       for line in magic_lines))
         step_params = {k: pipeline_parameters[k] for k in relevant_parameters}\
             if pipeline_parameters else {}
         return ins, step_params
@@ -846,30 +1182,42 @@ class NotebookProcessor(BaseProcessor):
         In the example above, `x` is a free variable for function `foo`,
         because it is defined outside of the context of `foo`.
 
-        Here we run the PyFlakes report over the function body to get all the
+        Here we analyze the scopes of the function body to get all the
         missing names (i.e. free variables), excluding the function arguments.
+        `imports_and_functions` is analyzed once, and the names it defines
+        are removed from the missing names of every function.
 
         Args:
-            source_code: Multiline Python source code
+            source_code: Multiline Python source code, or its parsed tree
             imports_and_functions: Multiline Python source that is prepended
                 to every pipeline step. It should contain the code cells that
                 where tagged as `import` and `functions`. We prepend this code
                 to the function body because it will always be present in any
                 pipeline step.
             step_parameters: Step parameters names. The step parameters
-                are removed from the pyflakes report, as these names will
+                are removed from the missing names, as these names will
                 always be available in the step's context.
 
         Returns (dict): A dictionary with the name of the function as key and
             a list of variables names + consumed pipeline parameters as values.
         """
         fns_free_vars = dict()
+        prelude = scopeutils.analyze_scopes(
+            utils.comment_magic_commands(imports_and_functions))
         # now check the functions' bodies for free variables. fns is a
         # dict function_name -> function_source
         fns = astutils.parse_functions(source_code)
         for fn_name, fn in fns.items():
-            code = imports_and_functions + "\n" + fn
-            free_vars = flakeutils.pyflakes_report(code=code)
+            if prelude.star_import:
+                # star imports could define any name
+                free_vars = set()
+            else:
+                # the same as analyzing `imports_and_functions + fn`: the
+                # function can use the names the prelude defines, and the
+                # functions of the prelude can use the function
+                analysis = scopeutils.analyze_scopes(fn)
+                free_vars = ((analysis.undefined - prelude.defined)
+                             | (prelude.undefined - analysis.defined))
             # the pipeline parameters that are used in the function
             consumed_params = {}
             if step_parameters:
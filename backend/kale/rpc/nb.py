@@ -166,9 +166,11 @@ def unmarshal_data(source_notebook_path):
         return {}
 
     marshal.set_data_dir(kale_marshal_dir)
+    # hidden entries are Kale's own bookkeeping (e.g., the blobs folder of
+    # the content-addressed store)
     return {os.path.splitext(f)[0]:
             marshal.load(os.path.splitext(f)[0])
-            for f in os.listdir(kale_marshal_dir)}
+            for f in os.listdir(kale_marshal_dir) if not f.startswith(".")}
 
 
 def explore_notebook(request, source_notebook_path):
@@ -64,6 +64,10 @@ class Step:
         self._pps_names = None
         # used to keep track of the "free variables" used by the step
         self.fns_free_variables = dict()
+        # the ins and outs passed as KFP parameters instead of marshalled
+        # artifacts, mapped to their types
+        self.value_ins: Dict[str, str] = dict()
+        self.value_outs: Dict[str, str] = dict()
 
     def __call__(self, *args, **kwargs):
         """Handler for when the @step decorated function is called."""
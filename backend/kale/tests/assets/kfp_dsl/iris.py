@@ -9,10 +9,8 @@ from kfp.dsl import Input, Output, Dataset, HTML, Metrics, ClassificationMetrics
                          'kubeflow-kale', 'numpy', 'scikit-learn'],
     pip_index_urls=['https://pypi.org/simple'],
 )
-def load_transform_data_step(load_transform_data_html_report: Output[HTML], x_trn_artifact: Output[Dataset], x_tst_artifact: Output[Dataset], y_trn_artifact: Output[Dataset], y_tst_artifact: Output[Dataset], n_estimators_param: int = 500, max_depth_param: int = 2):
+def load_transform_data_step(load_transform_data_html_report: Output[HTML], x_trn_artifact: Output[Dataset], x_tst_artifact: Output[Dataset], y_trn_artifact: Output[Dataset], y_tst_artifact: Output[Dataset]):
     _kale_pipeline_parameters_block = '''
-        N_ESTIMATORS = 500
-        MAX_DEPTH = 2
     '''
 
     _kale_data_loading_block = '''
@@ -44,14 +42,13 @@ def load_transform_data_step(load_transform_data_html_report: Output[HTML], x_tr
     # -----------------------DATA SAVING START---------------------------------
     from kale import marshal as _kale_marshal
     _kale_marshal.set_data_dir("/marshal")
-    # Save x_trn to output artifact
-    _kale_marshal.save(x_trn, "x_trn_artifact")
-    # Save x_tst to output artifact
-    _kale_marshal.save(x_tst, "x_tst_artifact")
-    # Save y_trn to output artifact
-    _kale_marshal.save(y_trn, "y_trn_artifact")
-    # Save y_tst to output artifact
-    _kale_marshal.save(y_tst, "y_tst_artifact")
+    # Save the output artifacts concurrently
+    _kale_marshal.save_many({
+        "x_trn_artifact": x_trn,
+        "x_tst_artifact": x_tst,
+        "y_trn_artifact": y_trn,
+        "y_tst_artifact": y_tst,
+    })
     # -----------------------DATA SAVING END-----------------------------------
     '''
 
@@ -92,10 +89,14 @@ def train_model_step(train_model_html_report: Output[HTML], x_trn_artifact: Inpu
     # -----------------------DATA LOADING START--------------------------------
     from kale import marshal as _kale_marshal
     _kale_marshal.set_data_dir("/marshal")
-    # Load x_trn_artifact from input artifact
-    x_trn = _kale_marshal.load("x_trn_artifact")
-    # Load y_trn_artifact from input artifact
-    y_trn = _kale_marshal.load("y_trn_artifact")
+    # Load the input artifacts concurrently
+    _kale_inputs = _kale_marshal.load_many([
+        "x_trn_artifact",
+        "y_trn_artifact",
+    ])
+    x_trn = _kale_inputs["x_trn_artifact"]
+    y_trn = _kale_inputs["y_trn_artifact"]
+    del _kale_inputs
     # -----------------------DATA LOADING END----------------------------------
     '''
 
@@ -164,12 +165,16 @@ def evaluate_model_step(evaluate_model_html_report: Output[HTML], model_artifact
     # -----------------------DATA LOADING START--------------------------------
     from kale import marshal as _kale_marshal
     _kale_marshal.set_data_dir("/marshal")
-    # Load model_artifact from input artifact
-    model = _kale_marshal.load("model_artifact")
-    # Load x_tst_artifact from input artifact
-    x_tst = _kale_marshal.load("x_tst_artifact")
-    # Load y_tst_artifact from input artifact
-    y_tst = _kale_marshal.load("y_tst_artifact")
+    # Load the input artifacts concurrently
+    _kale_inputs = _kale_marshal.load_many([
+        "model_artifact",
+        "x_tst_artifact",
+        "y_tst_artifact",
+    ])
+    model = _kale_inputs["model_artifact"]
+    x_tst = _kale_inputs["x_tst_artifact"]
+    y_tst = _kale_inputs["y_tst_artifact"]
+    del _kale_inputs
     # -----------------------DATA LOADING END----------------------------------
     '''
 
@@ -245,8 +250,6 @@ def auto_generated_pipeline(
     """Auto-generated pipeline function."""
 
     load_transform_data_task = load_transform_data_step(
-        n_estimators_param=n_estimators,
-        max_depth_param=max_depth
     )
 
     load_transform_data_task.set_display_name("load-transform-data-step")
@@ -258,7 +261,6 @@ def auto_generated_pipeline(
         max_depth_param=max_depth
     )
 
-    train_model_task.after(load_transform_data_task)
     train_model_task.after(load_transform_data_task)
 
     train_model_task.set_display_name("train-model-step")
@@ -271,9 +273,8 @@ def auto_generated_pipeline(
         max_depth_param=max_depth
     )
 
-    evaluate_model_task.after(train_model_task)
-    evaluate_model_task.after(load_transform_data_task)
     evaluate_model_task.after(load_transform_data_task)
+    evaluate_model_task.after(train_model_task)
 
     evaluate_model_task.set_display_name("evaluate-model-step")
 
@@ -8,12 +8,10 @@ from kfp.dsl import Input, Output, Dataset, HTML, Metrics, ClassificationMetrics
     packages_to_install=['kfp>=2.0.0', 'kubeflow-kale', 'numpy'],
     pip_index_urls=['https://pypi.org/simple'],
 )
-def create_matrix_step(create_matrix_html_report: Output[HTML], rnd_matrix_artifact: Output[Dataset], d1: int = 5, d2: int = 6, booltest: bool = True, strtest: str = 'test'):
+def create_matrix_step(create_matrix_html_report: Output[HTML], rnd_matrix_artifact: Output[Dataset], d1: int = 5, d2: int = 6):
     _kale_pipeline_parameters_block = '''
         d1 = 5
         d2 = 6
-        booltest = True
-        strtest = test
     '''
 
     _kale_data_loading_block = '''
@@ -75,12 +73,8 @@ def create_matrix_step(create_matrix_html_report: Output[HTML], rnd_matrix_artif
     packages_to_install=['kfp>=2.0.0', 'kubeflow-kale', 'numpy'],
     pip_index_urls=['https://pypi.org/simple'],
 )
-def sum_matrix_step(sum_matrix_html_report: Output[HTML], rnd_matrix_artifact: Input[Dataset], d1: int = 5, d2: int = 6, booltest: bool = True, strtest: str = 'test'):
+def sum_matrix_step(sum_matrix_html_report: Output[HTML], rnd_matrix_artifact: Input[Dataset]):
     _kale_pipeline_parameters_block = '''
-        d1 = 5
-        d2 = 6
-        booltest = True
-        strtest = test
     '''
 
     _kale_data_loading_block = '''
@@ -150,19 +144,13 @@ def auto_generated_pipeline(
 
     create_matrix_task = create_matrix_step(
         d1=d1,
-        d2=d2,
-        booltest=booltest,
-        strtest=strtest
+        d2=d2
     )
 
     create_matrix_task.set_display_name("create-matrix-step")
 
     sum_matrix_task = sum_matrix_step(
-        rnd_matrix_artifact=create_matrix_task.outputs["rnd_matrix_artifact"],
-        d1=d1,
-        d2=d2,
-        booltest=booltest,
-        strtest=strtest
+        rnd_matrix_artifact=create_matrix_task.outputs["rnd_matrix_artifact"]
     )
 
     sum_matrix_task.after(create_matrix_task)
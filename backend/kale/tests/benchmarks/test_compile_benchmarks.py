@@ -0,0 +1,105 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2019–2025 The Kale Contributors.
+
+"""Benchmarks of the notebook to DSL path.
+
+The benchmarks compile synthetic notebooks of different sizes and DAG
+shapes and print the time spent in every compilation phase. They are slow,
+so they are skipped unless the `KALE_BENCHMARKS` environment variable is
+set:
+
+    KALE_BENCHMARKS=1 python -m pytest -s kale/tests/benchmarks
+"""
+
+import os
+import time
+import pytest
+import nbformat
+
+from typing import Callable
+from unittest import mock
+
+from kale import Compiler, NotebookProcessor
+from kale.common import profutils, utils
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_NOTEBOOK = os.path.join(THIS_DIR, "../assets/notebooks/",
+                             "pipeline_parameters_and_metrics.ipynb")
+
+pytestmark = pytest.mark.skipif(not utils.env_flag("KALE_BENCHMARKS"),
+                                reason="Set KALE_BENCHMARKS to run them")
+
+
+def generate_notebook(path: str, cells: int, shape: str,
+                      code_cell: Callable):
+    """Write a notebook of `cells` steps to `path`.
+
+    The notebook reuses the imports, pipeline parameters and metadata of the
+    `pipeline_parameters_and_metrics` notebook.
+
+    Args:
+        path: Where to write the notebook
+        cells: The number of steps
+        shape: "deep" chains the steps, each one consuming the output of the
+            previous one. "wide" fans out from the first step to independent
+            steps that consume its output and joins them in the last step.
+        code_cell: The factory of the notebook cells (see the `code_cell`
+            fixture)
+    """
+    notebook = nbformat.read(BASE_NOTEBOOK, as_version=nbformat.NO_CONVERT)
+    notebook.cells = [c for c in notebook.cells
+                      if set(c.metadata.get("tags", []))
+                      & {"imports", "pipeline-parameters"}]
+    notebook.cells.append(code_cell("data_0 = np.random.rand(d1, d2)",
+                                    "step:step_0"))
+    for i in range(1, cells - 1):
+        parent = i - 1 if shape == "deep" else 0
+        notebook.cells.append(code_cell(
+            "def transform_%d(x):\n"
+            "    return x * %d + d1\n"
+            "\n"
+            "data_%d = transform_%d(data_%d)\n"
+            "total_%d = data_%d.sum()" % (i, i, i, i, parent, i, i),
+            "step:step_%d" % i, "prev:step_%d" % parent))
+    last = cells - 1
+    parents = [last - 1] if shape == "deep" else range(1, last)
+    notebook.cells.append(code_cell(
+        "result = sum([%s])" % ", ".join("total_%d" % i for i in parents),
+        "step:step_%d" % last, *("prev:step_%d" % i for i in parents)))
+    nbformat.write(notebook, path)
+
+
+@pytest.mark.parametrize("cache", ["cold", "warm"])
+@pytest.mark.parametrize("shape", ["deep", "wide"])
+@pytest.mark.parametrize("cells", [10, 100, 1000])
+@mock.patch("kale.common.utils.random_string")
+def test_compile(random_string, cells, shape, cache, tmp_path, monkeypatch,
+                 capsys, code_cell):
+    """Profile the compilation of a synthetic notebook."""
+    random_string.return_value = "rnd"
+    monkeypatch.setenv("KALE_COMPILE_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    notebook_path = str(tmp_path / "benchmark.ipynb")
+    generate_notebook(notebook_path, cells, shape, code_cell)
+
+    def _compile():
+        processor = NotebookProcessor(notebook_path)
+        pipeline = processor.run()
+        imports_and_functions = processor.get_imports_and_functions()
+        return Compiler(pipeline, imports_and_functions).compile()
+
+    if cache == "warm":
+        _compile()
+    profutils.reset()
+    profutils.set_enabled(True)
+    try:
+        start = time.perf_counter()
+        dsl_script_path = _compile()
+        elapsed = time.perf_counter() - start
+    finally:
+        profutils.set_enabled(False)
+
+    assert os.path.exists(dsl_script_path)
+    with capsys.disabled():
+        print("\n%d cells, %s DAG, %s cache: %.3fs\n%s"
+              % (cells, shape, cache, elapsed, profutils.format_report()))
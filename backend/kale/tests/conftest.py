@@ -0,0 +1,17 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2019–2025 The Kale Contributors.
+
+"""Test fixtures shared by the unit, e2e and benchmark tests."""
+
+import pytest
+import nbformat
+
+
+def _code_cell(source, *tags):
+    return nbformat.v4.new_code_cell(source, metadata={"tags": list(tags)})
+
+
+@pytest.fixture
+def code_cell():
+    """Return a factory of notebook code cells with the given tags."""
+    return _code_cell
@@ -2,7 +2,9 @@
 # Copyright (c) 2019–2025 The Kale Contributors.
 
 import os
+import runpy
 import pytest
+import nbformat
 
 from unittest import mock
 
@@ -36,3 +38,207 @@ def test_notebook_to_dsl(random_string, notebook_path, dsl_path):
     expected_result = open(dsl_path).read()
     result = open(dsl_script_path).read()
     assert result == expected_result
+
+
+@mock.patch("kale.compiler.KALE_VERSION", new="0+unknown")
+@mock.patch("kale.compiler.MIN_PARALLEL_FORMATTING", new=1)
+@mock.patch("kale.common.utils.random_string")
+def test_notebook_to_dsl_parallel_formatting(random_string, monkeypatch):
+    """Test that formatting in a process pool gives the same DSL."""
+    random_string.return_value = "rnd"
+    monkeypatch.setenv("KALE_COMPILE_CACHE", "false")
+    monkeypatch.setenv("KALE_COMPILE_WORKERS", "2")
+
+    notebook_path = os.path.join(EXAMPLES_DIR, "serving/sklearn/iris.ipynb")
+    dsl_path = os.path.join(THIS_DIR, "../assets/kfp_dsl/", "iris.py")
+    processor = NotebookProcessor(notebook_path, {"abs_working_dir": "/kale"})
+    pipeline = processor.run()
+    imports_and_functions = processor.get_imports_and_functions()
+
+    dsl_script_path = Compiler(pipeline, imports_and_functions).compile()
+
+    assert open(dsl_script_path).read() == open(dsl_path).read()
+
+
+@pytest.mark.parametrize("code_formatting", ["once", "none"])
+@mock.patch("kale.common.utils.random_string")
+def test_notebook_to_dsl_code_formatting(random_string, code_formatting):
+    """Test that the faster formatting modes generate valid DSL."""
+    random_string.return_value = "rnd"
+
+    notebook_path = os.path.join(EXAMPLES_DIR, "serving/sklearn/iris.ipynb")
+    overrides = {"abs_working_dir": "/kale",
+                 "code_formatting": code_formatting}
+    processor = NotebookProcessor(notebook_path, overrides)
+    pipeline = processor.run()
+    imports_and_functions = processor.get_imports_and_functions()
+
+    dsl_script_path = Compiler(pipeline, imports_and_functions).compile()
+
+    source = open(dsl_script_path).read()
+    compile(source, dsl_script_path, "exec")
+    for step in pipeline.steps:
+        assert "def %s_step(" % step.name in source
+
+
+@mock.patch("kale.common.utils.random_string")
+def test_notebook_to_dsl_in_process_executor(random_string):
+    """Test that steps can run their code without a Jupyter kernel."""
+    random_string.return_value = "rnd"
+
+    notebook_path = os.path.join(EXAMPLES_DIR, "serving/sklearn/iris.ipynb")
+    overrides = {"abs_working_dir": "/kale", "step_executor": "in-process"}
+    processor = NotebookProcessor(notebook_path, overrides)
+    pipeline = processor.run()
+    imports_and_functions = processor.get_imports_and_functions()
+
+    dsl_script_path = Compiler(pipeline, imports_and_functions).compile()
+
+    source = open(dsl_script_path).read()
+    compile(source, dsl_script_path, "exec")
+    assert (source.count("import run_code_in_process as _kale_run_code")
+            == len(list(pipeline.steps)))
+    assert "import run_code as _kale_run_code" not in source
+
+
+def test_notebook_to_dsl_parallel_branches(tmp_path, code_cell):
+    """Test that independent steps do not wait for each other."""
+    notebook = nbformat.v4.new_notebook()
+    notebook.cells = [
+        code_cell("a = 1", "step:root"),
+        code_cell("b = a + 1", "step:left", "prev:root"),
+        code_cell("c = a + 2", "step:right", "prev:root"),
+        code_cell("d = 3", "step:other", "prev:root"),
+        code_cell("print(b + c + d)", "step:join", "prev:left", "prev:right",
+                  "prev:other"),
+    ]
+    notebook_path = str(tmp_path / "branches.ipynb")
+    nbformat.write(notebook, notebook_path)
+    overrides = {"abs_working_dir": "/kale", "pipeline_name": "branches",
+                 "experiment_name": "branches"}
+    processor = NotebookProcessor(notebook_path, overrides)
+    pipeline = processor.run()
+
+    dsl = Compiler(pipeline, processor.get_imports_and_functions()
+                   ).generate_dsl()
+
+    afters = sorted(line.strip() for line in dsl.splitlines()
+                    if "_task.after(" in line)
+    assert afters == ["join_task.after(left_task)",
+                      "join_task.after(other_task)",
+                      "join_task.after(right_task)",
+                      "left_task.after(root_task)",
+                      "other_task.after(root_task)",
+                      "right_task.after(root_task)"]
+
+
+def test_notebook_to_dsl_fuse_steps(tmp_path, code_cell):
+    """Test that linear chains of steps compile to single components."""
+    notebook = nbformat.v4.new_notebook()
+    notebook.cells = [
+        code_cell("import math", "imports"),
+        code_cell("a = 1", "step:load"),
+        code_cell("b = math.sqrt(a)", "step:clean", "prev:load"),
+        code_cell("c = b + 1", "step:train", "prev:clean"),
+        code_cell("print(c)", "step:left", "prev:train"),
+        code_cell("print(b + c)", "step:right", "prev:train"),
+    ]
+    notebook_path = str(tmp_path / "chain.ipynb")
+    nbformat.write(notebook, notebook_path)
+    overrides = {"abs_working_dir": "/kale", "pipeline_name": "chain",
+                 "experiment_name": "chain", "fuse_steps": True}
+    processor = NotebookProcessor(notebook_path, overrides)
+    pipeline = processor.run()
+
+    assert sorted(pipeline.steps_names) == ["left", "load_to_train", "right"]
+    fused = pipeline.get_step("load_to_train")
+    # `a` never leaves the fused step
+    assert fused.ins == []
+    assert fused.outs == ["b", "c"]
+    # the imports run once, at the beginning of the fused step
+    assert fused.source == ["import math", "a = 1", "b = math.sqrt(a)",
+                            "c = b + 1"]
+    assert sorted(pipeline.successors("load_to_train")) == ["left", "right"]
+
+    dsl = Compiler(pipeline, processor.get_imports_and_functions()
+                   ).generate_dsl()
+    compile(dsl, "chain.py", "exec")
+    assert "def load_to_train_step(" in dsl
+    assert "left_task.after(load_to_train_task)" in dsl
+
+
+def test_notebook_to_dsl_small_values(tmp_path, code_cell):
+    """Test that small values are passed as KFP parameters."""
+    notebook = nbformat.v4.new_notebook()
+    notebook.cells = [
+        code_cell("lr = 0.1\nname = 'iris'\ndata = [1, 2, 3]", "step:load"),
+        code_cell("print(lr)\nepochs = 3", "step:train", "prev:load"),
+        code_cell("print(lr, epochs, name, data)", "step:report",
+                  "prev:train"),
+    ]
+    notebook_path = str(tmp_path / "values.ipynb")
+    nbformat.write(notebook, notebook_path)
+    overrides = {"abs_working_dir": "/kale", "pipeline_name": "values",
+                 "experiment_name": "values", "marshal_small_values": True}
+    processor = NotebookProcessor(notebook_path, overrides)
+    pipeline = processor.run()
+
+    load, train, report = map(pipeline.get_step, ("load", "train", "report"))
+    assert load.value_outs == {"lr": "float", "name": "str"}
+    # `train` does not change `lr`, so `report` reads it from `load`
+    assert train.value_ins == {"lr": "float"}
+    assert train.outs == ["epochs"]
+    assert train.value_outs == {"epochs": "int"}
+    assert report.value_ins == {"lr": "float", "epochs": "int",
+                                "name": "str"}
+
+    dsl = Compiler(pipeline, processor.get_imports_and_functions()
+                   ).generate_dsl()
+    assert ("def report_step(report_html_report: Output[HTML],"
+            " data_artifact: Input[Dataset], epochs_value: int,"
+            " lr_value: float, name_value: str):") in dsl
+    assert 'lr_value=load_task.outputs["lr_value"]' in dsl
+    assert 'epochs_value=train_task.outputs["epochs_value"]' in dsl
+    assert 'data_artifact=load_task.outputs["data_artifact"]' in dsl
+
+    from kfp import compiler
+
+    # KFP reads the source of the components from the DSL file
+    dsl_path = tmp_path / "values.py"
+    dsl_path.write_text(dsl)
+    namespace = runpy.run_path(str(dsl_path), run_name="values")
+    package_path = str(tmp_path / "values.yaml")
+    compiler.Compiler().compile(namespace["auto_generated_pipeline"],
+                                package_path)
+    with open(package_path) as f:
+        assert "NUMBER_DOUBLE" in f.read()
+
+
+def test_notebook_to_dsl_column_projection(tmp_path, code_cell):
+    """Test that function free variables are loaded with all the columns."""
+    notebook = nbformat.v4.new_notebook()
+    notebook.cells = [
+        code_cell("import pandas as pd", "imports"),
+        code_cell("df = pd.DataFrame({'a': [1], 'b': [2]})\n"
+                  "df2 = df.copy()\n"
+                  "def total():\n"
+                  "    return df.sum().sum()", "step:load"),
+        code_cell("print(df['a'])\nprint(total())", "step:use",
+                  "prev:load"),
+        code_cell("print(df2['b'])", "step:other", "prev:load"),
+    ]
+    notebook_path = str(tmp_path / "columns.ipynb")
+    nbformat.write(notebook, notebook_path)
+    overrides = {"abs_working_dir": "/kale", "pipeline_name": "columns",
+                 "experiment_name": "columns",
+                 "marshal_column_projection": True}
+    processor = NotebookProcessor(notebook_path, overrides)
+    pipeline = processor.run()
+
+    compiler = Compiler(pipeline, processor.get_imports_and_functions())
+    use, other = map(compiler.generate_lightweight_component,
+                     map(pipeline.get_step, ("use", "other")))
+    # `total` uses all the columns of `df`
+    assert "columns=" not in use
+    assert ('df2 = _kale_marshal.load("df2_artifact", columns=[\'b\'])'
+            in other)
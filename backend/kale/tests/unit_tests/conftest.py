@@ -31,3 +31,11 @@ def notebook_processor(dummy_nb_config):
     with patch.object(NotebookProcessor, '_read_notebook',
                       lambda _: nbformat.v4.new_notebook()):
         return NotebookProcessor("path/to/nb", dummy_nb_config)
+
+
+@pytest.fixture(autouse=True)
+def compile_cache_dir(tmp_path, monkeypatch):
+    """Keep the compilation cache of every test in a temporary folder."""
+    cache_dir = str(tmp_path / "kale-cache")
+    monkeypatch.setenv("KALE_COMPILE_CACHE_DIR", cache_dir)
+    return cache_dir
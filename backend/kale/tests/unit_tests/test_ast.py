@@ -44,6 +44,15 @@ with my_context(param) as ctx:
     res = ctx.use()
 '''
 
+_local_scopes_snippet = '''
+squares = [i ** 2 for i in range(n)]
+fn = lambda a: a + offset
+try:
+    res = fn(squares)
+except ValueError as err:
+    print(err)
+'''
+
 _wrong_code_snippet = '''
 def fun()
     pass
@@ -56,7 +65,9 @@ def fun()
     (_numpy2_snippet, ['a', 'b', 'np', 'os', 'print']),
     (_foos_snippet, ['_test', '_test2']),
     (_class_snippet, ['test']),
-    (_ctx_mngr_snippet, ['my_context', 'param', 'res', 'ctx'])
+    (_ctx_mngr_snippet, ['my_context', 'param', 'res', 'ctx']),
+    (_local_scopes_snippet, ['squares', 'range', 'n', 'fn', 'offset', 'res',
+                             'ValueError', 'print'])
 ])
 def test_get_marshal_candidates(code, target):
     """Tests get_marshal_candidates function."""
@@ -252,3 +263,67 @@ def test_link_fns_to_return_vars():
     }
 
     assert kale_ast.link_fns_to_return_vars(source) == target
+
+
+_columns_snippet = '''
+x = df["a"] + df[["b", "c"]].sum(axis=1)
+print(df2.shape, df2["a"])
+df3["a"] = 1
+df4 = df4["a"]
+def f():
+    return df5["b"]
+%time df6["a"]
+df6["b"]
+'''
+
+
+def test_get_column_projections():
+    """Test that only literal column subscripts are projected."""
+    names = ["df", "df2", "df3", "df4", "df5", "df6", "other"]
+    compare(kale_ast.get_column_projections(_columns_snippet, names),
+            {"df": ["a", "b", "c"], "df4": ["a"], "df5": ["b"]})
+    assert kale_ast.get_column_projections(
+        _columns_snippet + "eval('df')", names) == {}
+    assert kale_ast.get_column_projections(
+        _columns_snippet + "import __main__", names) == {}
+    assert kale_ast.get_column_projections(
+        _columns_snippet + "sys.modules['__main__'].df", names) == {}
+
+
+_values_snippet = '''
+lr = 0.1
+if fast:
+    lr = 0.5
+name = "model"
+name = name.upper()
+epochs: int = 3
+a = b = 4
+for i in range(3):
+    pass
+t = (1, 2)
+big = "%s"
+count = 1
+count += 1
+flag = True
+flag = 1
+inf = 1e999
+
+def f():
+    global g
+    g = 2
+g = 1
+print(lr, epochs)
+''' % ("x" * 2000)
+
+
+def test_get_value_types():
+    """Test that only variables bound to small literals are values."""
+    names = ["lr", "name", "epochs", "a", "b", "i", "t", "big", "count",
+             "flag", "inf", "g", "other"]
+    compare(kale_ast.get_value_types(_values_snippet, names),
+            {"lr": "float", "name": None, "epochs": "int", "a": None,
+             "b": None, "i": None, "t": None, "big": None, "count": None,
+             "flag": None, "inf": None, "g": None})
+    assert kale_ast.get_value_types("x = 1\n%store x", ["x"]) == {"x": None}
+    assert kale_ast.get_value_types("x = 1\nexec('x = [1]')",
+                                    ["x"]) == {"x": None}
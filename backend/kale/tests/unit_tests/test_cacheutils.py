@@ -0,0 +1,36 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2019–2025 The Kale Contributors.
+
+import os
+
+from kale.common import cacheutils
+
+
+def test_store_load(compile_cache_dir):
+    """Test that cached results are restored by key."""
+    key = cacheutils.compute_key("source", ["a", "b"])
+    assert key != cacheutils.compute_key("source", ["a", "c"])
+    assert cacheutils.load("ns", key) is None
+    cacheutils.store("ns", key, {"ins": ["a"]})
+    assert cacheutils.load("ns", key) == {"ins": ["a"]}
+    assert os.listdir(os.path.join(compile_cache_dir, "ns")) == [
+        key + ".json"]
+
+
+def test_disabled(compile_cache_dir, monkeypatch):
+    """Test that nothing is cached when the cache is disabled."""
+    monkeypatch.setenv("KALE_COMPILE_CACHE", "false")
+    cacheutils.store("ns", "key", 1)
+    assert cacheutils.load("ns", "key") is None
+    assert not os.path.exists(compile_cache_dir)
+
+
+def test_prune(compile_cache_dir):
+    """Test that the oldest entries are removed."""
+    for i in range(5):
+        cacheutils.store("ns", "key%d" % i, i)
+        path = os.path.join(compile_cache_dir, "ns", "key%d.json" % i)
+        os.utime(path, (i, i))
+    cacheutils.prune("ns", max_entries=2)
+    assert sorted(os.listdir(os.path.join(compile_cache_dir, "ns"))) == [
+        "key3.json", "key4.json"]
@@ -2,9 +2,13 @@
 # Copyright (c) 2019–2025 The Kale Contributors.
 
 import pytest
+import nbformat
+
+from unittest import mock
 
-import kale.common.flakeutils
 from kale import Pipeline, Step
+from kale.common import scopeutils
+from kale.processors import nbprocessor
 
 
 @pytest.mark.parametrize("code,target", [
@@ -14,9 +18,9 @@ from kale import Pipeline, Step
     ('a = b\nfoo(b)', ['b', 'foo']),
     ('foo(b)', ['foo', 'b'])
 ])
-def test_pyflakes_report(code, target):
-    """Tests pyflakes_report function."""
-    res = kale.common.flakeutils.pyflakes_report(code)
+def test_get_undefined_names(code, target):
+    """Tests the detection of the names a step misses."""
+    res = scopeutils.get_undefined_names(code)
     assert sorted(res) == sorted(target)
 
 
@@ -49,6 +53,10 @@ def foo():
         source_code,
         imports_and_functions
     )
+    # star imports could define any name
+    assert {"foo": (set(), {})} == (
+        notebook_processor._detect_fns_free_variables(source_code,
+                                                      "from math import *"))
 
 
 def _prepend_to_source(source, prefix):
@@ -261,6 +269,20 @@ def foo(x):
     assert pipeline.get_step("step3").parameters == {"y": (5, 'int')}
 
 
+def test_dependencies_detection_with_magic_parameters(notebook_processor,
+                                                      dummy_nb_config):
+    """Test that parameters used just by magic commands are detected."""
+    pipeline = Pipeline(dummy_nb_config)
+    pipeline.pipeline_parameters = {"lr": (0.1, 'float'), "epochs": (5, 'int')}
+    pipeline.add_step(Step(name="step1",
+                           source=["%env LR={lr}\nprint('train')"]))
+
+    notebook_processor.pipeline = pipeline
+    notebook_processor.dependencies_detection()
+    assert pipeline.get_step("step1").ins == []
+    assert pipeline.get_step("step1").parameters == {"lr": (0.1, 'float')}
+
+
 def test_dependencies_detection_with_try_except(notebook_processor,
                                                 dummy_nb_config):
     """Test dependencies are detected with functions inside try."""
@@ -452,3 +474,107 @@ def result():
     assert (sorted(pipeline.get_step("step_f").ins)
             == ['bar', 'foo', 'result', 'x', 'y'])
     assert sorted(pipeline.get_step("step_f").outs) == []
+
+
+def test_dependencies_detection_analyzes_steps_once(notebook_processor,
+                                                    dummy_nb_config):
+    """Test that every step is analyzed once, however many descendants."""
+    pipeline = Pipeline(dummy_nb_config)
+    pipeline.add_step(Step(name="step0", source=["x = 5"]))
+    for i in range(1, 6):
+        pipeline.add_step(Step(name="step%d" % i, source=[
+            "def foo%d():\n    return x\ny%d = foo%d()" % (i, i, i)]))
+        pipeline.add_edge("step%d" % (i - 1), "step%d" % i)
+    pipeline.add_step(Step(name="last", source=["print(y1, y5, foo3())"]))
+    pipeline.add_edge("step5", "last")
+
+    notebook_processor.pipeline = pipeline
+    with mock.patch.object(nbprocessor, "StepAnalysis",
+                           wraps=nbprocessor.StepAnalysis) as analysis:
+        notebook_processor.dependencies_detection()
+    assert analysis.call_count == 7
+    assert sorted(pipeline.get_step("last").ins) == ["foo3", "x", "y1", "y5"]
+    assert sorted(pipeline.get_step("step1").outs) == ["y1"]
+    assert sorted(pipeline.get_step("step3").outs) == ["foo3", "x"]
+
+
+def test_dependencies_detection_cached(notebook_processor, dummy_nb_config):
+    """Test that recompiling analyzes just the steps that changed."""
+    def _pipeline(step2_source):
+        pipeline = Pipeline(dummy_nb_config)
+        pipeline.add_step(Step(name="step1", source=["x = 5\ny = 6"]))
+        pipeline.add_step(Step(name="step2", source=[step2_source]))
+        pipeline.add_step(Step(name="step3", source=["print(z)"]))
+        pipeline.add_edge("step1", "step2")
+        pipeline.add_edge("step2", "step3")
+        return pipeline
+
+    detect = mock.Mock(wraps=notebook_processor._detect_in_dependencies)
+    with mock.patch.object(notebook_processor, "_detect_in_dependencies",
+                           detect):
+        notebook_processor.pipeline = _pipeline("z = x")
+        notebook_processor.dependencies_detection()
+        assert detect.call_count == 3
+
+        notebook_processor.pipeline = pipeline = _pipeline("z = x + y")
+        notebook_processor.dependencies_detection()
+        assert detect.call_count == 4
+    assert sorted(pipeline.get_step("step1").outs) == ["x", "y"]
+    assert sorted(pipeline.get_step("step2").ins) == ["x", "y"]
+    assert sorted(pipeline.get_step("step3").ins) == ["z"]
+
+
+def test_dependencies_detection_analyzes_prelude_once(tmp_path, code_cell,
+                                                      dummy_nb_config):
+    """Test that the functions of the prelude are analyzed once."""
+    notebook = nbformat.v4.new_notebook()
+    notebook.cells = [
+        code_cell("import math", "imports"),
+        code_cell("def area(r):\n    return math.pi * r ** 2\n"
+                  "def scaled(r):\n    return area(r) * scale", "functions"),
+        code_cell("scale = 2", "step:step1"),
+        code_cell("print(scaled(1))", "step:step2", "prev:step1"),
+        code_cell("def double(r):\n    return 2 * area(r)\nprint(double(2))",
+                  "step:step3", "prev:step2"),
+    ]
+    notebook_path = str(tmp_path / "prelude.ipynb")
+    nbformat.write(notebook, notebook_path)
+    processor = nbprocessor.NotebookProcessor(notebook_path, dummy_nb_config)
+
+    analyzed = []
+    detect = processor._detect_fns_free_variables
+
+    def _detect(*args, **kwargs):
+        fns = detect(*args, **kwargs)
+        analyzed.extend(fns)
+        return fns
+
+    with mock.patch.object(processor, "_detect_fns_free_variables",
+                           _detect):
+        processor.to_pipeline()
+    assert sorted(analyzed) == ["area", "double", "scaled"]
+    pipeline = processor.pipeline
+    assert pipeline.get_step("step2").ins == ["scale"]
+    assert pipeline.get_step("step3").fns_free_variables["double"] == (
+        {"scale"}, {})
+    assert pipeline.get_step("step3").fns_free_variables["scaled"] == (
+        {"scale"}, {})
+
+
+def test_assign_metrics_reuses_analyses(notebook_processor,
+                                        dummy_nb_config):
+    """Test that metrics are assigned using the steps' analyses."""
+    pipeline = Pipeline(dummy_nb_config)
+    pipeline.add_step(Step(name="step1", source=["acc = 0.9"]))
+    pipeline.add_step(Step(name="step2", source=["loss = 0.1"]))
+    pipeline.add_edge("step1", "step2")
+
+    notebook_processor.pipeline = pipeline
+    notebook_processor.dependencies_detection()
+    with mock.patch.object(nbprocessor.astutils, "get_marshal_candidates",
+                           side_effect=AssertionError):
+        notebook_processor.assign_metrics({"acc": "acc", "loss": "loss"})
+    assert pipeline.get_step("step1").metrics
+    assert pipeline.get_step("step2").metrics
+    assert '"acc": acc' in pipeline.get_step("step1").source[-1]
+    assert '"loss": loss' in pipeline.get_step("step2").source[-1]
@@ -28,3 +28,40 @@ def test_get_ordered_ancestors():
 
     ancs = ["C", "D", "E", "B", "A"]
     assert graphutils.get_ordered_ancestors(g, "R") == ancs
+
+
+def test_ancestor_index():
+    """Test that the index returns the same ancestors as the BFS."""
+    g = nx.DiGraph()
+    g.add_edges_from([("A", "B"), ("B", "C"), ("B", "D"), ("B", "E"),
+                      ("C", "R"), ("D", "R"), ("E", "R"), ("A", "R")])
+    index = graphutils.AncestorIndex(g)
+    for node in g.nodes():
+        assert (index.get_ordered_ancestors(node)
+                == graphutils.get_ordered_ancestors(g, node))
+    # results are memoized, but the caller gets its own list
+    ancs = index.get_ordered_ancestors("R")
+    assert ancs == ["A", "C", "D", "E", "B"]
+    ancs.clear()
+    assert index.get_ordered_ancestors("R") == ["A", "C", "D", "E", "B"]
+
+
+def test_get_ordered_ancestors_long_chain():
+    """Test the ancestors of a node at the end of a long chain."""
+    g = nx.DiGraph()
+    nx.add_path(g, range(5000))
+    assert graphutils.get_ordered_ancestors(g, 4999) == list(range(4998,
+                                                                   -1, -1))
+
+
+def test_get_linear_chains():
+    """Test the maximal linear chains of a DAG."""
+    g = nx.DiGraph()
+    g.add_edges_from([("A", "B"), ("B", "C"), ("C", "D"), ("C", "E"),
+                      ("D", "F"), ("E", "F"), ("F", "G"), ("G", "H")])
+    assert graphutils.get_linear_chains(g) == [["A", "B", "C"],
+                                               ["F", "G", "H"]]
+    # chains break where two nodes cannot be joined
+    assert graphutils.get_linear_chains(
+        g, lambda u, v: (u, v) != ("B", "C")) == [["A", "B"],
+                                                  ["F", "G", "H"]]
@@ -42,3 +42,56 @@ def test_run_code():
     # test magic command
     code = ("%%time\nprint('Some dull code')", )
     ju.run_code(code)
+
+
+@mock.patch('kale.common.jputils.process_outputs', new=lambda x: x)
+def test_run_code_streams_and_fails(capsys):
+    """Test that outputs are streamed and errors fail the execution."""
+    pool = ju.KernelPool()
+    cells = ju.run_code(("print('streamed')", ), pool=pool)
+    assert "streamed" in capsys.readouterr().out
+    assert cells[0].outputs[0]["text"] == "streamed\n"
+
+    with pytest.raises(SystemExit):
+        ju.run_code(("1 / 0", "print('unreachable')"), pool=pool)
+    assert "ZeroDivisionError" in capsys.readouterr().err
+
+
+@mock.patch('kale.common.jputils.process_outputs', new=lambda x: x)
+def test_run_code_kernel_reuse():
+    """Test that reused kernels are warm and start from a clean namespace."""
+    pool = ju.KernelPool(reuse=True)
+    try:
+        ju.run_code(("a = 3", ), pool=pool)
+        kernel = pool._idle.queue[0]
+        cells = ju.run_code(("print('a' in dir())", ), pool=pool)
+        assert cells[0].outputs[0]["text"] == "False\n"
+        assert pool._idle.queue[0] is kernel
+    finally:
+        pool.shutdown()
+
+
+@mock.patch('kale.common.jputils.process_outputs', new=lambda x: x)
+def test_run_code_in_process(capsys):
+    """Test that code runs in this process, recording the cells' outputs."""
+    cells = ju.run_code_in_process((
+        "a = 3\nprint(a)",
+        "%%time\nb = a + 1",
+        "b",
+        "from IPython.display import HTML, display\n"
+        "display(HTML('<b>bold</b>'))",
+    ))
+    assert "3\n" in capsys.readouterr().out
+    assert cells[0].outputs == [{"output_type": "stream", "name": "stdout",
+                                 "text": "3\n"}]
+    assert cells[2].outputs[0]["output_type"] == "execute_result"
+    assert cells[2].outputs[0]["data"]["text/plain"] == "4"
+    assert cells[3].outputs[0]["data"]["text/html"] == "<b>bold</b>"
+
+    # every run starts from a fresh namespace
+    cells = ju.run_code_in_process(("print('a' in dir())", ))
+    assert cells[0].outputs[0]["text"] == "False\n"
+
+    with pytest.raises(SystemExit):
+        ju.run_code_in_process(("1 / 0", "print('unreachable')"))
+    assert "ZeroDivisionError" in capsys.readouterr().err
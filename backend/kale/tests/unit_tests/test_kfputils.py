@@ -86,3 +86,29 @@ def test_update_uimetadata_from_not_empty(podutils, workflowutils, tmpdir):
         'source': 'minio://mlpipeline/artifacts/test_wk/test_pod/test.tgz'
     }]}
     assert updated == target
+
+
+def test_generate_mlpipeline_metrics_merge(tmpdir):
+    """Test that metrics can be merged with the ones already written."""
+    filepath = os.path.join(tmpdir, 'mlpipeline-metrics.json')
+    with mock.patch('kale.common.kfputils.KFP_UI_METRICS_FILE_PATH',
+                    filepath):
+        kfputils.generate_mlpipeline_metrics({'accuracy': 0.9, 'loss': 1})
+        kfputils.generate_mlpipeline_metrics({'loss': 0.5, 'time': 2},
+                                             merge=True)
+        metrics = json.loads(open(filepath).read())['metrics']
+        assert {m['name']: m['numberValue'] for m in metrics} == {
+            'accuracy': 0.9, 'loss': 0.5, 'time': 2}
+
+        kfputils.generate_mlpipeline_metrics({'time': 3})
+        metrics = json.loads(open(filepath).read())['metrics']
+        assert [m['name'] for m in metrics] == ['time']
+
+
+def test_write_output_parameter(tmpdir):
+    """Test the output parameters are written the way KFP parses them."""
+    for value, target in [(3, "3"), (0.5, "0.5"), (True, "true"),
+                          ("it's", "it's")]:
+        path = os.path.join(tmpdir, "outputs", "value")
+        kfputils.write_output_parameter(value, path)
+        assert open(path).read() == target
@@ -0,0 +1,629 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2019–2025 The Kale Contributors.
+
+import os
+import json
+import pickle
+import pytest
+
+from unittest import mock
+
+from kale import marshal
+from kale.marshal import backend as marshal_backend, compression, stats
+
+
+@pytest.fixture
+def data_dir(tmpdir):
+    """Set the marshal data directory to a temporary folder."""
+    old_data_dir = marshal.get_data_dir()
+    marshal.set_data_dir(str(tmpdir))
+    yield str(tmpdir)
+    marshal.set_data_dir(old_data_dir)
+
+
+@pytest.fixture
+def content_addressed():
+    """Enable the content-addressed store for a single test."""
+    marshal.set_content_addressed(True)
+    yield
+    marshal.set_content_addressed(False)
+
+
+def _blobs(data_dir):
+    return os.listdir(os.path.join(data_dir, marshal_backend.BLOBS_DIR_NAME))
+
+
+def _ls(data_dir):
+    """List the saved objects, skipping Kale's hidden folders."""
+    return sorted(f for f in os.listdir(data_dir) if not f.startswith("."))
+
+
+def test_save_load(data_dir):
+    """Test that objects are restored from the data directory."""
+    path = marshal.save({"a": 1}, "obj")
+    assert path == os.path.join(data_dir, "obj.dillpkl")
+    assert marshal.load("obj") == {"a": 1}
+
+
+def test_content_addressed_dedup(data_dir, content_addressed):
+    """Test that identical objects are stored just once."""
+    # generic objects are hashed while they are written, not serialized
+    # once more just to be hashed
+    with mock.patch("dill.dumps", side_effect=AssertionError):
+        marshal.save({"a": 1}, "obj1")
+        marshal.save({"a": 1}, "obj2")
+        marshal.save({"a": 1}, "obj1")
+    assert len(_blobs(data_dir)) == 1
+    assert os.path.islink(os.path.join(data_dir, "obj1.dillpkl"))
+    assert marshal.load("obj1") == marshal.load("obj2") == {"a": 1}
+
+    # a new content is stored in a new blob and the name is re-linked
+    marshal.save({"a": 2}, "obj1")
+    assert len(_blobs(data_dir)) == 2
+    assert marshal.load("obj1") == {"a": 2}
+    assert marshal.load("obj2") == {"a": 1}
+
+
+def test_content_addressed_overwrite_does_not_touch_blob(data_dir):
+    """Test that a plain save replaces the link instead of the blob."""
+    marshal.set_content_addressed(True)
+    marshal.save([1, 2], "obj1")
+    marshal.save([1, 2], "obj2")
+    marshal.set_content_addressed(False)
+
+    marshal.save([3], "obj1")
+    assert not os.path.islink(os.path.join(data_dir, "obj1.dillpkl"))
+    assert marshal.load("obj1") == [3]
+    assert marshal.load("obj2") == [1, 2]
+
+
+def test_content_addressed_numpy(data_dir, content_addressed):
+    """Test that numpy arrays are hashed by their buffers."""
+    np = pytest.importorskip("numpy")
+    from kale.marshal import backends
+    arr = np.arange(12).reshape(3, 4)
+    with mock.patch.object(backends.NumpyBackend, "save", autospec=True,
+                           side_effect=backends.NumpyBackend.save) as save:
+        marshal.save(arr, "arr1")
+        marshal.save(arr.copy(), "arr2")
+        marshal.save(arr.T, "arr3")
+    # identical arrays are hashed in memory and written just once
+    assert save.call_count == 2
+    assert len(_blobs(data_dir)) == 2
+    np.testing.assert_array_equal(marshal.load("arr2"), arr)
+    np.testing.assert_array_equal(marshal.load("arr3"), arr.T)
+
+
+def test_content_addressed_pandas(data_dir, content_addressed):
+    """Test that DataFrames with the same content share a blob."""
+    pd = pytest.importorskip("pandas")
+    df = pd.DataFrame({"a": [1, 2], "b": ["x", "y"]})
+    marshal.save(df, "df1")
+    marshal.save(df.copy(), "df2")
+    marshal.save(df.rename(columns={"b": "c"}), "df3")
+    assert len(_blobs(data_dir)) == 2
+    pd.testing.assert_frame_equal(marshal.load("df2"), df)
+
+
+def test_content_addressed_pandas_object_columns(data_dir,
+                                                 content_addressed):
+    """Test that object columns are not hashed by their string values."""
+    pd = pytest.importorskip("pandas")
+    df1 = pd.DataFrame({"a": pd.Series([1], dtype=object)})
+    df2 = pd.DataFrame({"a": pd.Series(["1"], dtype=object)})
+    marshal.save(df1, "df1")
+    marshal.save(df2, "df2")
+    assert len(_blobs(data_dir)) == 2
+    assert marshal.load("df1")["a"][0] == 1
+    assert marshal.load("df2")["a"][0] == "1"
+
+
+def test_content_addressed_numpy_structured(data_dir, content_addressed):
+    """Test that structured arrays are hashed with their field names."""
+    np = pytest.importorskip("numpy")
+    arr1 = np.zeros(2, dtype=[("a", "i8"), ("b", "i8")])
+    arr2 = np.zeros(2, dtype=[("c", "i8"), ("d", "i8")])
+    marshal.save(arr1, "arr1")
+    marshal.save(arr2, "arr2")
+    assert len(_blobs(data_dir)) == 2
+    assert marshal.load("arr1").dtype.names == ("a", "b")
+    assert marshal.load("arr2").dtype.names == ("c", "d")
+
+
+@pytest.fixture
+def mmap_mode():
+    """Enable memory mapping for a single test."""
+    marshal.set_mmap_mode("r")
+    yield
+    marshal.set_mmap_mode(None)
+
+
+@pytest.fixture
+def dataframe_format():
+    """Change the data frame format for a single test."""
+    yield marshal.set_dataframe_format
+    marshal.set_dataframe_format("feather")
+
+
+def test_set_mmap_mode_invalid():
+    """Test that only numpy's mmap modes are accepted."""
+    with pytest.raises(ValueError):
+        marshal.set_mmap_mode("rw")
+
+
+def test_mmap_numpy(data_dir, mmap_mode):
+    """Test that numpy arrays are loaded as memory maps."""
+    np = pytest.importorskip("numpy")
+    arr = np.arange(100, dtype="float32").reshape(10, 10)
+    marshal.save(arr, "arr")
+    res = marshal.load("arr")
+    assert isinstance(res, np.memmap)
+    np.testing.assert_array_equal(res[2:4], arr[2:4])
+
+
+def test_mmap_numpy_writable_content_addressed(data_dir, content_addressed):
+    """Test that writable memory maps do not write to shared blobs."""
+    np = pytest.importorskip("numpy")
+    arr = np.zeros(4)
+    marshal.save(arr, "arr1")
+    marshal.save(arr, "arr2")
+    marshal.set_mmap_mode("r+")
+    try:
+        res = marshal.load("arr1")
+        res[0] = 1
+        res.flush()
+    finally:
+        marshal.set_mmap_mode(None)
+    assert not os.path.islink(os.path.join(data_dir, "arr1.npy"))
+    assert marshal.load("arr1")[0] == 1
+    np.testing.assert_array_equal(marshal.load("arr2"), arr)
+
+
+@pytest.mark.parametrize("name", [None, "values"])
+def test_mmap_pandas(data_dir, mmap_mode, name):
+    """Test that pandas objects use the zero-copy columnar format."""
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+    df = pd.DataFrame({"a": range(5), "b": list("abcde")},
+                      index=pd.Index(list("vwxyz"), name="idx"))
+    assert marshal.save(df, "df").endswith("df.feather")
+    res = marshal.load("df")
+    pd.testing.assert_frame_equal(res, df)
+    # numeric columns point directly to the memory-mapped file
+    assert not res["a"].values.flags.writeable
+
+    series = pd.Series([1.0, 2.0], name=name)
+    marshal.save(series, "series")
+    pd.testing.assert_series_equal(marshal.load("series"), series)
+
+
+def test_mmap_pandas_replaces_pickle(data_dir, dataframe_format):
+    """Test that switching format does not leave ambiguous files around."""
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+    df = pd.DataFrame({"a": [1, 2]})
+    dataframe_format("pickle")
+    marshal.save(df, "df")
+    assert _ls(data_dir) == ["df.pdpkl"]
+    dataframe_format("feather")
+    marshal.set_mmap_mode("r")
+    try:
+        marshal.save(df, "df")
+    finally:
+        marshal.set_mmap_mode(None)
+    assert _ls(data_dir) == ["df.feather"]
+    pd.testing.assert_frame_equal(marshal.load("df"), df)
+
+
+@pytest.mark.parametrize("fmt,compression,ext", [
+    ("feather", None, "feather"),
+    ("feather", "zstd", "feather"),
+    ("parquet", None, "parquet"),
+    ("parquet", "snappy", "parquet"),
+    ("pickle", None, "pdpkl"),
+])
+def test_dataframe_formats(data_dir, dataframe_format, fmt, compression, ext):
+    """Test that data frames are saved using the configured format."""
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+    dataframe_format(fmt, compression)
+    df = pd.DataFrame({"a": range(5), "b": list("abcde"), "c": 1.5},
+                      index=pd.Index(list("vwxyz"), name="idx"))
+    assert marshal.save(df, "df") == os.path.join(data_dir, "df." + ext)
+    pd.testing.assert_frame_equal(marshal.load("df"), df)
+    pd.testing.assert_frame_equal(marshal.load("df", columns=["c", "a"]),
+                                  df[["c", "a"]])
+
+    series = pd.Series([1.0, 2.0], name="values")
+    marshal.save(series, "series")
+    pd.testing.assert_series_equal(
+        marshal.load("series", columns=["values"]), series)
+
+
+def test_set_dataframe_format_invalid():
+    """Test that codecs must be supported by the format."""
+    with pytest.raises(ValueError):
+        marshal.set_dataframe_format("csv")
+    with pytest.raises(ValueError):
+        marshal.set_dataframe_format("feather", "snappy")
+
+
+def test_dataframe_pickle_fallback(data_dir, content_addressed):
+    """Test that frames Arrow cannot convert are pickled."""
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+    df = pd.DataFrame({"a": [1, "x"], "b": [1, 2]})
+    path = marshal.save(df, "df")
+    assert path == os.path.join(data_dir, "df.pdpkl")
+    assert os.path.islink(path)
+    assert _blobs(data_dir)[0].endswith(".pdpkl")
+    pd.testing.assert_frame_equal(marshal.load("df"), df)
+    pd.testing.assert_frame_equal(marshal.load("df", columns=["b"]),
+                                  df[["b"]])
+
+    marshal.save(df.astype(str), "df")
+    assert _ls(data_dir) == ["df.feather"]
+
+
+def _pandas_round_trip_cases():
+    pd = pytest.importorskip("pandas")
+    return {
+        "object_ints": pd.DataFrame({"a": pd.Series([1, 2], dtype=object)}),
+        "list_cells": pd.DataFrame({"a": [[1, 2], [3]]}),
+        "dict_cells": pd.DataFrame({"a": [{"x": 1}, {"y": 2}]}),
+        "object_index": pd.DataFrame({"a": [1, 2]},
+                                     index=pd.Index([1, "x"], dtype=object)),
+        "timestamp_name": pd.Series([1.0],
+                                    name=pd.Timestamp("2020-01-01")),
+        "tuple_name": pd.Series([1.0], name=("a", "b")),
+    }
+
+
+@pytest.mark.parametrize("name", ["object_ints", "list_cells", "dict_cells",
+                                  "object_index", "timestamp_name",
+                                  "tuple_name"])
+def test_dataframe_pickle_round_trip(data_dir, name):
+    """Test that objects Arrow would not restore exactly are pickled."""
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+    obj = _pandas_round_trip_cases()[name]
+    assert marshal.save(obj, name).endswith(".pdpkl")
+    res = marshal.load(name)
+    if isinstance(obj, pd.Series):
+        pd.testing.assert_series_equal(res, obj, check_exact=True)
+        assert type(res.name) is type(obj.name)
+    else:
+        pd.testing.assert_frame_equal(res, obj, check_exact=True)
+        # e.g., lists must not come back as numpy arrays
+        assert list(map(type, res["a"])) == list(map(type, obj["a"]))
+
+
+def test_lazy_load(data_dir):
+    """Test that lazy inputs are restored on first use."""
+    marshal.save({"a": [1, 2]}, "obj")
+    with mock.patch.object(marshal_backend.MarshalBackend, "load",
+                           autospec=True,
+                           side_effect=marshal_backend.MarshalBackend.load
+                           ) as load:
+        obj = marshal.load("obj", lazy=True)
+        assert load.call_count == 0
+        assert isinstance(obj, dict)
+        assert obj["a"] == [1, 2]
+        assert "a" in obj and len(obj) == 1
+        assert obj == {"a": [1, 2]}
+    assert load.call_count == 1
+    assert marshal.unwrap(obj) == {"a": [1, 2]}
+    assert type(marshal.unwrap(obj)) is dict
+
+
+def test_lazy_load_operators(data_dir):
+    """Test that operators are forwarded to the restored object."""
+    np = pytest.importorskip("numpy")
+    marshal.save(3, "three")
+    marshal.save(np.arange(3), "arr")
+    three = marshal.load("three", lazy=True)
+    arr = marshal.load("arr", lazy=True)
+    assert three + 1 == 1 + three == 4
+    assert three * three == 9
+    np.testing.assert_array_equal(arr * three, [0, 3, 6])
+    np.testing.assert_array_equal(np.asarray(arr), [0, 1, 2])
+    assert np.sum(arr) == 3
+    three += 1
+    assert three == 4 and type(three) is int
+
+
+def test_lazy_load_missing(data_dir):
+    """Test that missing objects are reported without waiting for usage."""
+    with pytest.raises(SystemExit):
+        marshal.load("missing", lazy=True)
+
+
+def test_lazy_save_unused(data_dir):
+    """Test that unused lazy objects are not restored to be saved back."""
+    marshal.save([1, 2], "obj")
+    obj = marshal.load("obj", lazy=True)
+    with mock.patch.object(marshal_backend.MarshalBackend, "save",
+                           autospec=True) as save:
+        assert marshal.save(obj, "obj") == os.path.join(data_dir,
+                                                        "obj.dillpkl")
+    assert save.call_count == 0
+
+    marshal.save(obj, "obj2")
+    obj.append(3)
+    marshal.save(obj, "obj")
+    assert marshal.load("obj") == [1, 2, 3]
+    assert marshal.load("obj2") == [1, 2]
+
+
+def test_save_load_many(data_dir):
+    """Test that multiple objects are marshalled concurrently."""
+    import threading
+
+    threads = set()
+    save = marshal_backend.MarshalBackend.save
+
+    def _save(self, obj, path):
+        threads.add(threading.current_thread().name)
+        return save(self, obj, path)
+
+    objs = {"obj%d" % i: list(range(i)) for i in range(8)}
+    with mock.patch.object(marshal_backend.MarshalBackend, "save",
+                           autospec=True, side_effect=_save):
+        paths = marshal.save_many(objs)
+    assert list(paths) == list(objs)
+    assert all(t.startswith("kale-marshal") for t in threads)
+    assert marshal.load_many(list(objs)) == objs
+
+
+def test_save_load_many_not_concurrency_safe(data_dir):
+    """Test that unsafe backends run in the calling thread."""
+    import threading
+
+    backend = marshal.get_backend({})
+    with mock.patch.object(type(backend), "concurrency_safe", False), \
+            mock.patch.object(marshal_backend.MarshalBackend, "load",
+                              autospec=True,
+                              side_effect=lambda *args: threading
+                              .current_thread().name):
+        marshal.save_many({"a": 1, "b": 2})
+        loaded = marshal.load_many(["a", "b"])
+    assert set(loaded.values()) == {threading.current_thread().name}
+
+
+def test_save_load_many_errors(data_dir):
+    """Test that failures are reported for every object."""
+    marshal.save(1, "a")
+    with mock.patch.object(marshal_backend.Dispatcher, "_log_load_error",
+                           autospec=True) as log_error, \
+            pytest.raises(SystemExit):
+        marshal.load_many(["a", "missing1", "missing2"])
+    assert [c.args[1] for c in log_error.call_args_list] == ["missing1",
+                                                             "missing2"]
+
+
+def test_marshaller(data_dir):
+    """Test that the Marshaller loads inputs and saves outputs."""
+    marshal.save_many({"a": 1, "b": 2})
+    marshaller = marshal.Marshaller(
+        func=lambda a, b, c: (a + b + c, a * b * c), ins=["a", "b", "c"],
+        outs=["d", "e"], parameters={"c": marshal.decorator.PipelineParam(
+            "int", 3)}, marshal_dir=data_dir)
+    marshaller()
+    assert marshal.load_many(["d", "e"]) == {"d": 6, "e": 6}
+
+
+def test_dispatch_obj_type_mro():
+    """Test that objects are dispatched using all their base classes."""
+    np = pytest.importorskip("numpy")
+
+    class Array(np.ndarray):
+        pass
+
+    class SubArray(Array):
+        pass
+
+    backend = marshal.get_backend(np.zeros(1).view(SubArray))
+    assert backend.display_name == "numpy"
+    assert marshal.get_backend(lambda: 1).display_name == "function"
+    assert marshal.get_backend(object()).name == "Default backend"
+
+
+def test_dispatch_obj_type_cache():
+    """Test that backends are resolved once per type and reset on register."""
+    dispatcher = marshal_backend.Dispatcher()
+    dispatcher.register(marshal.backends.FunctionBackend)
+    with mock.patch.object(dispatcher, "_resolve_obj_type",
+                           wraps=dispatcher._resolve_obj_type) as resolve:
+        for i in range(3):
+            assert dispatcher.get_backend(i).name == "Default backend"
+        assert resolve.call_count == 1
+
+        class IntBackend(marshal_backend.MarshalBackend):
+            name = "Int backend"
+            obj_type_regex = r"int"
+
+        dispatcher.register(IntBackend)
+        assert dispatcher.get_backend(1).name == "Int backend"
+        assert resolve.call_count == 2
+
+
+def test_index(data_dir, content_addressed):
+    """Test that saved objects are indexed and loaded without scanning."""
+    path = marshal.save([1, 2], "obj")
+    entry = marshal_backend.read_index_entry("obj")
+    assert entry["file"] == "obj.dillpkl"
+    assert entry["file_type"] == "dillpkl"
+    assert entry["size"] == os.path.getsize(path)
+    assert entry["checksum"] == _blobs(data_dir)[0].split(".")[0]
+
+    with mock.patch("os.listdir", side_effect=AssertionError):
+        assert marshal.load("obj") == [1, 2]
+
+
+def test_index_fallback(data_dir):
+    """Test that loads scan the data directory without a valid index."""
+    np = pytest.importorskip("numpy")
+    marshal.save({"a": 1}, "obj")
+    assert marshal_backend.read_index_entry("obj")["checksum"] is None
+    os.remove(marshal_backend._get_index_path("obj"))
+    assert marshal.load("obj") == {"a": 1}
+
+    # the indexed file is gone, e.g. replaced by hand
+    marshal.save({"a": 1}, "arr")
+    os.remove(os.path.join(data_dir, "arr.dillpkl"))
+    np.save(os.path.join(data_dir, "arr.npy"), np.ones(2))
+    np.testing.assert_array_equal(marshal.load("arr"), np.ones(2))
+
+
+@pytest.fixture
+def codec():
+    """Change the compression codec for a single test."""
+    yield marshal.set_codec
+    marshal.set_codec(None)
+
+
+@pytest.mark.parametrize("name,lib", [
+    ("gzip", "gzip"),
+    ("zstd", "zstandard"),
+    ("lz4", "lz4.frame"),
+])
+def test_codecs(data_dir, codec, name, lib):
+    """Test that objects are compressed and decompressed transparently."""
+    pytest.importorskip(lib)
+    codec(name)
+    obj = {"a": ["kale"] * 1000}
+    path = marshal.save(obj, "obj")
+    assert compression.detect(path) == name
+    assert os.path.getsize(path) < len(pickle.dumps(obj))
+    assert marshal_backend.read_index_entry("obj")["codec"] == name
+    # the codec is detected when loading
+    codec(None)
+    assert marshal.load("obj") == obj
+    marshal.save(obj, "obj")
+    assert marshal_backend.read_index_entry("obj")["codec"] is None
+    assert marshal.load("obj") == obj
+
+
+def test_codecs_pandas_pickle(data_dir, codec, dataframe_format):
+    """Test that pickled data frames can be compressed."""
+    pd = pytest.importorskip("pandas")
+    codec("gzip")
+    dataframe_format("pickle")
+    df = pd.DataFrame({"a": range(100)})
+    assert compression.detect(marshal.save(df, "df")) == "gzip"
+    pd.testing.assert_frame_equal(marshal.load("df"), df)
+
+
+def test_codecs_missing_lib(data_dir, codec):
+    """Test that objects are written uncompressed without the codec lib."""
+    codec("zstd")
+    with mock.patch.object(compression.ZstdCodec, "writer",
+                           side_effect=ImportError):
+        path = marshal.save([1, 2], "obj")
+    assert compression.detect(path) is None
+    assert marshal.load("obj") == [1, 2]
+    with pytest.raises(ValueError):
+        marshal.set_codec("bz2")
+
+
+def test_chunked(data_dir, content_addressed):
+    """Test that generators are saved and restored chunk by chunk."""
+    np = pytest.importorskip("numpy")
+
+    def _chunks():
+        for i in range(3):
+            yield np.full(4, i)
+
+    path = marshal.save(_chunks(), "chunks")
+    assert path == os.path.join(data_dir, "chunks.chunks")
+    chunks = marshal.load("chunks")
+    assert isinstance(chunks, marshal.chunked.ChunkedArtifact)
+    assert len(chunks) == 3
+    for _ in range(2):  # chunks can be iterated multiple times
+        for chunk, expected in zip(chunks, _chunks()):
+            np.testing.assert_array_equal(chunk, expected)
+
+    # saving a restored artifact copies the chunks
+    marshal.save(chunks, "chunks2")
+    np.testing.assert_array_equal(marshal.load("chunks2")[2], np.full(4, 2))
+
+
+def test_chunked_pandas_reader(data_dir, tmpdir):
+    """Test that pandas readers are consumed chunk by chunk."""
+    pd = pytest.importorskip("pandas")
+    df = pd.DataFrame({"a": range(10), "b": list("abcdefghij")})
+    csv_path = str(tmpdir.join("data.csv"))
+    df.to_csv(csv_path, index=False)
+    with pd.read_csv(csv_path, chunksize=4) as reader:
+        marshal.save(reader, "reader")
+    chunks = marshal.load("reader")
+    assert len(chunks) == 3
+    pd.testing.assert_frame_equal(pd.concat(chunks), df)
+
+
+def test_chunked_failure(data_dir):
+    """Test that a failing generator does not leave partial artifacts."""
+    def _chunks():
+        yield [1]
+        raise RuntimeError
+
+    with pytest.raises(SystemExit):
+        marshal.save(_chunks(), "chunks")
+    assert _ls(data_dir) == []
+
+
+@pytest.fixture
+def io_stats():
+    """Collect marshalling I/O statistics for a single test."""
+    stats.reset()
+    stats.set_enabled(True)
+    yield
+    stats.set_enabled(False)
+    stats.reset()
+
+
+def test_io_stats(data_dir, io_stats, codec, tmpdir):
+    """Test that saves and loads are timed and reported."""
+    codec("gzip")
+    marshal.save({"a": ["kale"] * 1000}, "obj")
+    marshal.load("obj")
+    with pytest.raises(SystemExit):
+        marshal.load("missing")
+
+    save, load = stats.get_records()
+    assert save["operation"] == "save" and load["operation"] == "load"
+    for record in (save, load):
+        assert record["name"] == "obj"
+        assert record["backend"] == "generic"
+        assert record["file_type"] == "dillpkl"
+        assert record["bytes"] == os.path.getsize(
+            os.path.join(data_dir, "obj.dillpkl"))
+        # streamed objects split the time spent serializing and writing
+        assert record["io_time"] > 0 and record["serialize_time"] >= 0
+        assert record["total_time"] == pytest.approx(
+            record["io_time"] + record["serialize_time"])
+        assert record["throughput"] > 0
+
+    metrics_path = str(tmpdir.join("mlpipeline-metrics.json"))
+    with mock.patch("kale.common.kfputils.KFP_UI_METRICS_FILE_PATH",
+                    metrics_path):
+        report_path = stats.write_report("step")
+    assert report_path == os.path.join(data_dir, ".kale.stats", "step.json")
+    with open(report_path) as f:
+        report = json.load(f)
+    assert report["step"] == "step"
+    assert len(report["artifacts"]) == 2
+    assert report["summary"]["save_count"] == 1
+    assert report["summary"]["load_bytes"] == load["bytes"]
+    with open(metrics_path) as f:
+        metrics = {m["name"]: m["numberValue"]
+                   for m in json.load(f)["metrics"]}
+    assert metrics["marshal-save-bytes"] == save["bytes"]
+
+
+def test_io_stats_disabled(data_dir):
+    """Test that nothing is recorded unless statistics are enabled."""
+    stats.reset()
+    marshal.save(1, "obj")
+    marshal.load("obj")
+    assert stats.get_records() == []
@@ -4,7 +4,10 @@
 import pytest
 import nbformat
 
+from unittest import mock
+
 from kale import Pipeline, Step, NotebookConfig
+from kale.processors import nbprocessor
 
 
 def test_merge_code(dummy_nb_config):
@@ -138,3 +141,69 @@ def test_get_pipeline_metrics_source_raises(notebook_processor):
                                          r" the Notebook\..*"):
         notebook_processor.notebook = notebook
         notebook_processor.get_pipeline_metrics_source()
+
+
+@pytest.mark.parametrize("tag,target", [
+    ("skip", nbprocessor.SKIP_TAG),
+    ("imports", nbprocessor.IMPORT_TAG),
+    ("functions", nbprocessor.FUNCTIONS_TAG),
+    ("prev:step1", nbprocessor.PREV_TAG),
+    ("block:step1", nbprocessor.BLOCK_TAG),
+    ("step:step1", nbprocessor.STEP_TAG),
+    ("step:", nbprocessor.STEP_TAG),
+    ("pipeline-parameters", nbprocessor.PIPELINE_PARAMETERS_TAG),
+    ("pipeline-metrics", nbprocessor.PIPELINE_METRICS_TAG),
+    ("annotation:a.b/c:value", nbprocessor.ANNOTATION_TAG),
+    ("label:key:value", nbprocessor.LABEL_TAG),
+    ("limit:nvidia.com/gpu:2", nbprocessor.LIMITS_TAG),
+    ("random_value", None),
+    ("step:Step1", None),
+    ("skipped", None),
+    (0, None),
+])
+def test_classify_tag(tag, target):
+    """Test that every tag matches the right definition of the language."""
+    assert nbprocessor.classify_tag(tag) == target
+
+
+def test_notebook_tags_classified_once(notebook_processor):
+    """Test that the consumers of the tags share a single classification."""
+    notebook = nbformat.v4.new_notebook()
+    cells = [
+        ("import os", {"tags": ["imports"]}),
+        ("def f():\n    pass", {"tags": ["functions"]}),
+        ("a = 1", {"tags": ["pipeline-parameters"]}),
+        ("b = a", {"tags": ["step:test"]}),
+        ("print(b)", {"tags": ["pipeline-metrics"]}),
+    ]
+    notebook.cells = [nbformat.v4.new_code_cell(source=s, metadata=m)
+                      for (s, m) in cells]
+    notebook_processor.notebook = notebook
+    with mock.patch.object(nbprocessor, "CellTags",
+                           wraps=nbprocessor.CellTags) as cell_tags:
+        assert (notebook_processor.get_imports_and_functions()
+                == "import os\ndef f():\n    pass")
+        assert notebook_processor.get_pipeline_parameters_source() == "a = 1"
+        assert notebook_processor.get_pipeline_metrics_source() == "print(b)"
+        assert cell_tags.call_count == len(cells)
+
+        # replacing the cells invalidates the classification
+        notebook.cells = notebook.cells[2:]
+        assert notebook_processor.get_imports_and_functions() == "\n"
+        assert cell_tags.call_count == len(cells) + 3
+
+
+def test_reserved_source_ignores_invalid_tags(notebook_processor):
+    """Test that invalid tags only fail the parsing of the steps."""
+    notebook = nbformat.v4.new_notebook()
+    cells = [
+        ("1", {"tags": ["pipeline-parameters"]}),
+        ("1", {"tags": ["random_value"]}),
+        ("0", {"tags": ["prev:test"]}),
+    ]
+    notebook.cells = [nbformat.v4.new_code_cell(source=s, metadata=m)
+                      for (s, m) in cells]
+    notebook_processor.notebook = notebook
+    assert notebook_processor.get_pipeline_parameters_source() == "1\n1"
+    with pytest.raises(ValueError, match="Unrecognized tag"):
+        notebook_processor._get_notebook_tags().cells[1][1].parsed
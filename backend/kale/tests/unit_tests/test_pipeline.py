@@ -0,0 +1,43 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2019–2025 The Kale Contributors.
+
+from unittest import mock
+
+import networkx as nx
+
+from kale import Pipeline, Step
+
+
+def test_topological_order_memoized(dummy_nb_config):
+    """Test that the steps are sorted once per change to the graph."""
+    pipeline = Pipeline(dummy_nb_config)
+    for name in ("c", "b", "a"):
+        pipeline.add_step(Step(name=name, source=[]))
+    pipeline.add_edge("a", "b")
+    pipeline.add_edge("b", "c")
+
+    with mock.patch("kale.pipeline.nx.topological_sort",
+                    wraps=nx.topological_sort) as topological_sort:
+        version = pipeline.version
+        assert pipeline.steps_names == ["a", "b", "c"]
+        assert [s.name for s in pipeline.steps] == ["a", "b", "c"]
+        assert pipeline.pipeline_dependencies_tasks == {
+            "a": [], "b": ["a"], "c": ["b"]}
+        assert topological_sort.call_count == 1
+
+        # views are copies, changing them does not affect the pipeline
+        pipeline.steps_names.append("d")
+        pipeline.pipeline_dependencies_tasks["c"].append("a")
+        assert pipeline.steps_names == ["a", "b", "c"]
+        assert pipeline.pipeline_dependencies_tasks["c"] == ["b"]
+
+        pipeline.remove_edge("b", "c")
+        pipeline.add_edge("c", "a")
+        assert pipeline.version == version + 2
+        steps_names = pipeline.steps_names
+        assert steps_names.index("c") < steps_names.index("a")
+        assert topological_sort.call_count == 2
+
+        pipeline.remove_node("b")
+        assert pipeline.steps_names == ["c", "a"]
+        assert topological_sort.call_count == 3
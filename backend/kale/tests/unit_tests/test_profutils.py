@@ -0,0 +1,52 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2019–2025 The Kale Contributors.
+
+import pytest
+
+from kale.common import profutils
+
+
+@pytest.fixture
+def profiling():
+    """Enable profiling for a single test."""
+    profutils.reset()
+    profutils.set_enabled(True)
+    yield
+    profutils.set_enabled(False)
+    profutils.reset()
+
+
+def test_phase_nested(profiling):
+    """Test that nested phases are not accounted to the enclosing self."""
+    @profutils.profiled("inner")
+    def _inner():
+        return 42
+
+    with profutils.phase("outer"):
+        assert _inner() == 42
+        assert _inner() == 42
+
+    timings = profutils.get_timings()
+    assert timings["outer"]["calls"] == 1
+    assert timings["inner"]["calls"] == 2
+    assert (timings["outer"]["total"]
+            == pytest.approx(timings["outer"]["self"]
+                             + timings["inner"]["total"]))
+    report = profutils.format_report()
+    assert "outer" in report and "inner" in report
+
+
+def test_phase_exception(profiling):
+    """Test that a phase that raises is still accounted."""
+    with pytest.raises(ValueError):
+        with profutils.phase("failing"):
+            raise ValueError
+    assert profutils.get_timings()["failing"]["calls"] == 1
+
+
+def test_disabled():
+    """Test that nothing is recorded when profiling is disabled."""
+    profutils.reset()
+    with profutils.phase("ignored"):
+        pass
+    assert profutils.get_timings() == {}
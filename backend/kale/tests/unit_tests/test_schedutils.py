@@ -0,0 +1,119 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2019–2025 The Kale Contributors.
+
+import os
+import time
+
+import pytest
+
+from kale import Pipeline, Step
+from kale.common import schedutils
+
+
+def _record(name):
+    """Record the start and end times of a step to `times/<name>`."""
+    os.makedirs("times", exist_ok=True)
+    start = time.time()
+    time.sleep(.5)
+    with open(os.path.join("times", name), "w") as f:
+        f.write("%f %f" % (start, time.time()))
+
+
+def _root():
+    print("root output")
+    return 2
+
+
+def _left(x):
+    _record("left")
+    return x + 1
+
+
+def _right(x):
+    _record("right")
+    return x * 3
+
+
+def _join(a, b):
+    with open("result", "w") as f:
+        f.write(str(a + b))
+
+
+def _fail(x):
+    raise RuntimeError("step failed")
+
+
+def _get_times(name):
+    with open(os.path.join("times", name)) as f:
+        return [float(t) for t in f.read().split()]
+
+
+@pytest.fixture
+def pipeline(dummy_nb_config, tmp_path, monkeypatch):
+    """A diamond shaped pipeline, running in a temporary folder."""
+    monkeypatch.chdir(tmp_path)
+    pipeline = Pipeline(dummy_nb_config)
+    pipeline.add_step(Step(name="root", source=_root, outs=["x"]))
+    pipeline.add_step(Step(name="left", source=_left, ins=["x"],
+                           outs=["a"]))
+    pipeline.add_step(Step(name="right", source=_right, ins=["x"],
+                           outs=["b"], limits={"cpu": "500m"}))
+    pipeline.add_step(Step(name="join", source=_join, ins=["a", "b"]))
+    pipeline.add_edges_from([("root", "left"), ("root", "right"),
+                             ("left", "join"), ("right", "join")])
+    return pipeline
+
+
+@pytest.mark.parametrize("quantity, cpu", [
+    ("2", 2.), ("0.5", .5), ("500m", .5),
+])
+def test_parse_k8s_cpu(quantity, cpu):
+    """Test the parsing of K8s CPU quantities."""
+    assert schedutils.parse_k8s_cpu(quantity) == cpu
+
+
+def test_get_step_resources():
+    """Test that steps reserve their limits, up to the whole budget."""
+    budget = {"cpu": 4., "memory": 2. ** 31}
+    step = Step(name="a", source=[], limits={"cpu": "8", "memory": "1Gi"})
+    assert schedutils.get_step_resources(step, budget) == {
+        "cpu": 4., "memory": 2. ** 30}
+    step = Step(name="a", source=[])
+    assert schedutils.get_step_resources(step, {"cpu": 4.}) == {"cpu": 1.}
+
+
+def test_run_pipeline_parallel(pipeline):
+    """Test that independent steps run at the same time."""
+    schedutils.run_pipeline(pipeline, max_workers=2, budget={"cpu": 2.})
+    with open("result") as f:
+        assert f.read() == "9"
+    left, right = _get_times("left"), _get_times("right")
+    assert left[0] < right[1] and right[0] < left[1]
+    with open(os.path.join(schedutils.LOGS_DIR, "root.log")) as f:
+        assert "root output" in f.read()
+
+
+def test_run_pipeline_budget(pipeline):
+    """Test that steps do not run together beyond the budget."""
+    schedutils.run_pipeline(pipeline, max_workers=2, budget={"cpu": 1.})
+    with open("result") as f:
+        assert f.read() == "9"
+    left, right = _get_times("left"), _get_times("right")
+    assert left[1] <= right[0] or right[1] <= left[0]
+
+
+def test_run_pipeline_failure(pipeline):
+    """Test that a failed step stops the run and raises its error."""
+    pipeline.get_step("left").source = _fail
+    with pytest.raises(RuntimeError, match="step failed"):
+        schedutils.run_pipeline(pipeline, max_workers=2,
+                                budget={"cpu": 2.})
+    assert not os.path.exists("result")
+
+
+def test_run_pipeline_serial(pipeline):
+    """Test that a single worker runs the steps in this process."""
+    schedutils.run_pipeline(pipeline, max_workers=1)
+    with open("result") as f:
+        assert f.read() == "9"
+    assert not os.path.exists(schedutils.LOGS_DIR)
@@ -0,0 +1,73 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2019–2025 The Kale Contributors.
+
+import pytest
+
+from kale.common import scopeutils
+
+
+@pytest.mark.parametrize("code,target", [
+    ('', []),
+    ('a = b', ['b']),
+    ('print(x)\nx = 1', ['x']),
+    ('def f():\n    return y\ny = 1', []),
+    ('x = 1\ndef f():\n    print(x)\n    x = 2', []),
+    # comprehension variables are local to the comprehension
+    ('[i for i in range(3)]\nprint(i)', ['i']),
+    ('{k: v for k, v in d.items() if k in keys}', ['d', 'keys']),
+    ('[y := k for k in range(2)]\nprint(y)', []),
+    # context managers bind their targets in the current scope
+    ('with open(p) as fh:\n    d = fh.read()\nprint(d, fh)', ['p']),
+    # exception aliases are deleted at the end of the handler
+    ('try:\n    pass\nexcept ValueError as e:\n    print(e)\nprint(e)',
+     ['e']),
+    ('try:\n    z\nexcept NameError:\n    z = 1', []),
+    ('class A:\n    x = 1\n    def f(self):\n        return x', ['x']),
+    ('f = lambda a, b=c: a + b + d', ['c', 'd']),
+    ('def f(a: T = D) -> R:\n    return a', ['D', 'R', 'T']),
+    ('def outer():\n    v = 1\n    def inner():\n        nonlocal v\n'
+     '        v += w\n    return inner', ['w']),
+    ('def g():\n    global G\n    G = 1\ng()\nprint(G)', []),
+    ('import a.b\nimport c.d as e\nfrom f import g as h\nprint(a, e, h, g)',
+     ['g']),
+    ('from os import *\nprint(path)', []),
+    ('match p:\n    case [x, *rest]:\n        print(x, rest)\n'
+     '    case {"k": v, **kw}:\n        print(v, kw)', ['p']),
+    ('x: int\nprint(x)', ['x']),
+    ('del zz', ['zz']),
+    ('x = 1\ndel x\nprint(x)', ['x']),
+    ('x = y = 1\ndel x, y\nx = 2\nprint(x, y)', ['y']),
+    ('class A:\n    x = 1\n    del x\n    print(x)', ['x']),
+    # deletions that might not run are not tracked
+    ('x = 1\nif c:\n    del x\nprint(x)', ['c']),
+    ('def f():\n    x = 1\n    del x\n    print(x)', []),
+    ('print(__file__, __name__)', []),
+])
+def test_get_undefined_names(code, target):
+    """Test the detection of the names a piece of code misses."""
+    assert sorted(scopeutils.get_undefined_names(code)) == target
+
+
+def test_analyze_scopes():
+    """Test the names a piece of code defines and references."""
+    analysis = scopeutils.analyze_scopes('''
+import numpy as np
+with open(path) as f:
+    data = [line.split() for line in f]
+try:
+    arr = np.array(data)
+except ValueError as e:
+    print(e)
+def fn(x):
+    y = x
+''')
+    assert analysis.defined == {"np", "f", "data", "arr", "fn"}
+    # exception aliases are not available after the handler
+    assert analysis.referenced == {"open", "path", "f", "np", "data",
+                                   "ValueError", "print"}
+    assert analysis.undefined == {"path"}
+
+    # the result can be modified without affecting the cached analysis
+    analysis.undefined.add("x")
+    assert scopeutils.get_undefined_names("a = b") == {"b"}
+    assert scopeutils.get_undefined_names("a = b") == {"b"}